@@ -0,0 +1,251 @@
+"""
+Бенчмарк горячих путей CRUD.
+
+Запуск (из корня репозитория):
+    poetry run python -m benchmarks.run --sizes 1000 10000 --output bench.json
+
+Для каждого размера таблицы запускается отдельный процесс во временном
+каталоге: строится синтетическая таблица (str/int/bool), затем по очереди
+меряются операции core и parser. Результат — JSON с пропускной
+способностью, p50/p99 задержки и пиковым RSS процесса на размер.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_OPS = 200
+SEED = 20240101
+SETUP_BATCH_ROWS = 10_000
+# Операции, стоимость которых растёт с размером таблицы (полный проход или
+# перезапись файла), выполняются реже: не больше SCAN_BUDGET_ROWS строк
+# суммарно на операцию, но не меньше MIN_SCAN_OPS раз.
+SCAN_BUDGET_ROWS = 5_000_000
+MIN_SCAN_OPS = 5
+
+TABLE = "bench"
+COLUMNS = ["name:str", "age:int", "active:bool"]
+
+PARSE_SAMPLES = (
+    'insert into bench values ("user 42", 42, true)',
+    'insert into bench values ("a", 1, true), ("b, c", 2, false)',
+    "select from bench",
+    "select from bench where age = 42 limit 10 offset 5",
+    'update bench set name="x", age=3 where ID = 17',
+    'delete from bench where name = "user 42"',
+)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.worker is not None:
+        result = _run_size(args.worker, args.ops, args.format)
+        json.dump(result, sys.stdout)
+        return
+
+    report = {"meta": _meta(args), "results": []}
+    for size in args.sizes:
+        print(f"benchmark: {size} rows...", file=sys.stderr)
+        report["results"].extend(_spawn_worker(size, args.ops, args.format))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="CRUD benchmark for primitive_db")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--ops", type=int, default=DEFAULT_OPS)
+    parser.add_argument("--format", default="log", help="table storage format")
+    parser.add_argument("--output", help="write JSON report to file")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _meta(args):
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "ops": args.ops,
+        "format": args.format,
+        "seed": SEED,
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def _spawn_worker(size, ops, table_format):
+    """Прогнать один размер в отдельном процессе, чтобы RSS не смешивался."""
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--worker", str(size)]
+        + ["--ops", str(ops), "--format", table_format],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=_worker_env(),
+        cwd=ROOT_DIR,
+    )
+    return json.loads(out.stdout)
+
+
+def _worker_env():
+    env = dict(os.environ)
+    src = os.path.join(ROOT_DIR, "src")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+    return env
+
+
+def _run_size(size, ops, table_format):
+    from primitive_db import core, parser
+    from primitive_db.decorators import create_cacher
+
+    rng = random.Random(SEED)
+    results = []
+    scan_ops = max(MIN_SCAN_OPS, min(ops, SCAN_BUDGET_ROWS // size))
+
+    origin = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, _quiet():
+        os.chdir(workdir)
+        cacher = create_cacher()
+        no_cache = create_cacher(max_entries=0)
+
+        started = time.perf_counter()
+        core.create_table(TABLE, COLUMNS, table_format)
+        for first in range(0, size, SETUP_BATCH_ROWS):
+            count = min(SETUP_BATCH_ROWS, size - first)
+            core.insert_rows(
+                TABLE, [_synthetic_row(first + i) for i in range(count)], cacher
+            )
+        setup_seconds = time.perf_counter() - started
+
+        def random_id():
+            return rng.randint(1, size)
+
+        scenarios = [
+            (
+                "parse_command",
+                ops * len(PARSE_SAMPLES),
+                lambda i: parser.parse_command(PARSE_SAMPLES[i % len(PARSE_SAMPLES)]),
+            ),
+            (
+                "insert_row",
+                ops,
+                lambda i: core.insert_row(TABLE, list(_synthetic_row(i)), cacher),
+            ),
+            (
+                "select_by_id",
+                ops,
+                lambda i: core.select_rows(TABLE, {"ID": random_id()}, no_cache),
+            ),
+            (
+                "select_scan",
+                scan_ops,
+                lambda i: core.select_rows(
+                    TABLE, {"name": f"user {random_id()}"}, no_cache
+                ),
+            ),
+            (
+                "select_cached",
+                ops,
+                lambda i: core.select_rows(TABLE, {"age": 42}, cacher),
+            ),
+            (
+                "update_by_id",
+                scan_ops,
+                lambda i: core.update_rows(
+                    TABLE, {"age": i % 100}, {"ID": random_id()}, cacher
+                ),
+            ),
+            (
+                "delete_by_id",
+                scan_ops,
+                # __wrapped__ пропускает подтверждение y/n из confirm_action.
+                lambda i: core.delete_rows.__wrapped__(
+                    TABLE, {"ID": random_id()}, cacher
+                ),
+            ),
+        ]
+
+        for name, count, func in scenarios:
+            latencies = _measure(func, count)
+            results.append(_summary(size, name, latencies))
+        os.chdir(origin)
+
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for item in results:
+        item["setup_seconds"] = round(setup_seconds, 3)
+        item["peak_rss_kb"] = peak_rss_kb
+    return results
+
+
+def _synthetic_row(i):
+    return (f"user {i}", i % 100, i % 2 == 0)
+
+
+def _measure(func, count):
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _summary(size, name, latencies):
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        "rows": size,
+        "op": name,
+        "ops": len(ordered),
+        "throughput_ops_s": round(len(ordered) / total, 2) if total else None,
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 4),
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 4),
+    }
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    pos = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[pos]
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Скрыть вывод команд core (таблицы и сообщения)."""
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            yield
+
+
+if __name__ == "__main__":
+    main()
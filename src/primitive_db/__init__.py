@@ -1 +1,3 @@
-__all__ = []
+from primitive_db.connection import Connection, Cursor, connect
+
+__all__ = ["Connection", "Cursor", "connect"]
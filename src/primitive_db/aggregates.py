@@ -0,0 +1,106 @@
+from primitive_db.constants import AGG_AVG, AGG_COUNT, AGG_MAX, AGG_MIN, AGG_SUM
+
+# Агрегат — пара (функция, столбец); столбец None означает count(*).
+
+
+def label(func, column):
+    """Имя столбца результата: count(*), sum(age), ..."""
+    return f"{func}({column or '*'})"
+
+
+def aggregate(rows, specs, group_by=()):
+    """
+    Посчитать агрегаты за один проход по строкам.
+
+    Для каждой группы (кортеж значений столбцов group_by) хранится только
+    состояние агрегатов, поэтому память — O(число групп). Возвращает
+    словарь {ключ группы: [значение агрегата, ...]}. Без group_by всегда
+    есть ровно одна группа () — даже для пустой выборки.
+    """
+    steps = [_STEPS[func](column) for func, column in specs]
+    initial = [_initial(func) for func, _ in specs]
+    groups = {}
+    if not group_by:
+        groups[()] = list(initial)
+    if len(group_by) == 1:
+        (column,) = group_by
+
+        def group_key(row):
+            return (row[column],)
+    else:
+
+        def group_key(row):
+            return tuple(row[name] for name in group_by)
+
+    for row in rows:
+        key = group_key(row)
+        state = groups.get(key)
+        if state is None:
+            state = groups[key] = list(initial)
+        for pos, step in enumerate(steps):
+            state[pos] = step(state[pos], row)
+    return {
+        key: [_finish(func, value) for (func, _), value in zip(specs, state)]
+        for key, state in groups.items()
+    }
+
+
+def _initial(func):
+    if func in (AGG_COUNT, AGG_SUM):
+        return 0
+    if func == AGG_AVG:
+        return (0, 0)
+    return None
+
+
+def _finish(func, value):
+    if func == AGG_AVG:
+        total, count = value
+        return total / count if count else None
+    return value
+
+
+def _count_step(column):
+    def step(state, row):
+        return state + 1
+
+    return step
+
+
+def _sum_step(column):
+    def step(state, row):
+        return state + row[column]
+
+    return step
+
+
+def _avg_step(column):
+    def step(state, row):
+        return (state[0] + row[column], state[1] + 1)
+
+    return step
+
+
+def _min_step(column):
+    def step(state, row):
+        value = row[column]
+        return value if state is None or value < state else state
+
+    return step
+
+
+def _max_step(column):
+    def step(state, row):
+        value = row[column]
+        return value if state is None or value > state else state
+
+    return step
+
+
+_STEPS = {
+    AGG_COUNT: _count_step,
+    AGG_SUM: _sum_step,
+    AGG_AVG: _avg_step,
+    AGG_MIN: _min_step,
+    AGG_MAX: _max_step,
+}
@@ -0,0 +1,131 @@
+import json
+import sys
+
+from primitive_db import engine, metrics, results
+from primitive_db.constants import BATCH_MAX_STATEMENTS
+from primitive_db.core import begin, commit, recover, shutdown
+from primitive_db.decorators import create_cacher, set_confirm_answer
+from primitive_db.utils import in_transaction
+
+# Команды, которые собираются в неявную транзакцию пакета, и команды,
+# которые её не прерывают (чтения видят записи пакета). Перед любой другой
+# командой (DDL, begin/commit/rollback, загрузка файлов) пакет фиксируется.
+_BATCHED_KINDS = ("insert", "update", "delete")
+_BATCH_SAFE_KINDS = ("empty", "help", "select", "explain", "list_tables")
+
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+class _Batch:
+    """
+    Неявная транзакция, объединяющая подряд идущие записи скрипта: журнал
+    сбрасывается на диск один раз на пакет, а не на каждую команду.
+
+    Результаты команд пакета придерживаются до фиксации: если она не
+    удалась, каждая успешная запись пакета выводится с ошибкой фиксации,
+    так что по выводу видно, какие строки не сохранены.
+
+    Пакет не открывается внутри транзакции, начатой самим скриптом
+    (begin), и фиксируется после BATCH_MAX_STATEMENTS записей, чтобы не
+    держать блокировки таблиц и изменения в памяти слишком долго.
+    """
+
+    def __init__(self, cacher, write):
+        self.cacher = cacher
+        self.write = write
+        self.active = False
+        self.statements = 0
+        self.pending = []
+
+    def prepare(self, kind):
+        """Зафиксировать или открыть пакет перед командой вида kind."""
+        if kind in _BATCHED_KINDS:
+            if self.active and self.statements >= BATCH_MAX_STATEMENTS:
+                self.flush()
+            if not self.active and not in_transaction():
+                with results.capture():
+                    begin()
+                self.active = True
+            if self.active:
+                self.statements += 1
+        elif kind not in _BATCH_SAFE_KINDS:
+            self.flush()
+
+    def emit(self, lineno, kind, result):
+        """Вывести результат команды или придержать его до фиксации пакета."""
+        if self.active:
+            self.pending.append((lineno, kind, result))
+        else:
+            self.write(lineno, result)
+
+    def flush(self):
+        """Зафиксировать пакет и вывести придержанные результаты."""
+        if not self.active:
+            return
+        self.active = False
+        self.statements = 0
+        with results.capture() as outcome:
+            commit(self.cacher)
+        pending, self.pending = self.pending, []
+        for lineno, kind, result in pending:
+            if not outcome.ok and result.ok and kind in _BATCHED_KINDS:
+                result = _commit_failure(outcome)
+            self.write(lineno, result)
+
+
+def _commit_failure(outcome):
+    """Результат записи, которая выполнилась, но не была зафиксирована."""
+    result = results.CommandResult()
+    result.error = outcome.error
+    result.exception = outcome.exception
+    return result
+
+
+def run_batch(stream, assume_yes=False, out=None):
+    """
+    Выполнить команды из потока строк подряд, без заставки и вопросов.
+
+    На каждую непустую команду в out (по умолчанию stdout) выводится строка
+    JSON: номер строки скрипта и результат (см. results.CommandResult).
+    Без assume_yes опасные команды (drop_table, delete) отменяются с
+    ошибкой. Команды после ошибки выполняются дальше; exit завершает
+    скрипт. Возвращает код завершения: 0 или 1, если были ошибки.
+    """
+    out = sys.stdout if out is None else out
+    failures = []
+
+    def write(lineno, result):
+        data = {"line": lineno} if lineno is not None else {}
+        data.update(result.to_dict())
+        out.write(_json_encoder.encode(data) + "\n")
+        if not result.ok:
+            failures.append(lineno)
+
+    set_confirm_answer("y" if assume_yes else "n")
+    with results.capture() as result:
+        recover()
+    if result.messages or not result.ok:
+        write(None, result)
+
+    cacher = create_cacher()
+    batch = _Batch(cacher, write)
+    for lineno, line in enumerate(stream, start=1):
+        keep = True
+        kind = None
+        with results.capture() as result, metrics.command() as current:
+            cmd = engine.parse_line(line.rstrip("\r\n"))
+            if cmd is not None:
+                kind = cmd.get("kind")
+                batch.prepare(kind)
+                keep = engine.execute_command(cmd, cacher, current)
+        if kind != "empty":
+            batch.emit(lineno, kind, result)
+        if not keep:
+            break
+    batch.flush()
+
+    with results.capture() as result:
+        shutdown()
+    if result.messages or not result.ok:
+        write(None, result)
+    return 1 if failures else 0
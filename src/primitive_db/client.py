@@ -0,0 +1,130 @@
+import json
+import socket
+
+import prompt
+
+from primitive_db.constants import (
+    CLIENT_PIPELINE_DEPTH,
+    CMD_EXIT,
+    MSG_CLIENT_CONNECTED,
+    MSG_MULTILINE_COMMAND,
+    MSG_SERVER_CLOSED,
+    PROMPT_TEXT,
+    SERVER_HOST,
+    SERVER_PORT,
+)
+from primitive_db.exceptions import StorageError, ValidationError
+
+_ENCODING = "utf-8"
+
+
+class Client:
+    """
+    Клиент сервера (database serve).
+
+    execute() отправляет одну команду и возвращает ответ — словарь с ключами
+    ok, messages и, если есть, columns/rows и error. pipeline() отправляет
+    много команд пачками по CLIENT_PIPELINE_DEPTH, не дожидаясь ответа на
+    каждую, и возвращает ответы по порядку.
+    """
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, timeout=None):
+        try:
+            self._sock = socket.create_connection((host, port), timeout)
+        except OSError as exc:
+            raise StorageError(f"Нет соединения с {host}:{port}: {exc}") from exc
+        self._reader = self._sock.makefile("r", encoding=_ENCODING, newline="\n")
+
+    def execute(self, command):
+        return self.pipeline([command])[0]
+
+    def pipeline(self, commands):
+        responses = []
+        batch = []
+        for command in commands:
+            if "\n" in command or "\r" in command:
+                raise ValidationError(MSG_MULTILINE_COMMAND)
+            batch.append(command)
+            if len(batch) >= CLIENT_PIPELINE_DEPTH:
+                responses.extend(self._roundtrip(batch))
+                batch = []
+        if batch:
+            responses.extend(self._roundtrip(batch))
+        return responses
+
+    def close(self):
+        self._reader.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _roundtrip(self, batch):
+        payload = "".join(f"{command}\n" for command in batch)
+        try:
+            self._sock.sendall(payload.encode(_ENCODING))
+            responses = []
+            for _ in batch:
+                line = self._reader.readline()
+                if not line:
+                    raise StorageError(MSG_SERVER_CLOSED)
+                responses.append(json.loads(line))
+        except OSError as exc:
+            raise StorageError(f"Ошибка соединения: {exc}") from exc
+        return responses
+
+
+def run_client(host=SERVER_HOST, port=SERVER_PORT):
+    """Интерактивный цикл: команды отправляются на сервер, ответы выводятся."""
+    try:
+        client = Client(host, port)
+    except StorageError as exc:
+        print(f"Ошибка: {exc}")
+        return
+    print(MSG_CLIENT_CONNECTED.format(host=host, port=port))
+    with client:
+        while True:
+            try:
+                line = prompt.string(PROMPT_TEXT)
+            except (EOFError, KeyboardInterrupt):
+                print()
+                break
+            try:
+                response = client.execute(line)
+            except (StorageError, ValidationError) as exc:
+                print(f"Ошибка: {exc}")
+                if isinstance(exc, StorageError):
+                    break
+                continue
+            print_response(response)
+            if line.lower().split()[:1] == [CMD_EXIT]:
+                break
+
+
+def print_response(response):
+    """Вывести ответ сервера: сообщения, таблицу строк и ошибку."""
+    for message in response["messages"]:
+        print(message)
+    if "columns" in response:
+        _print_table(response["columns"], response["rows"])
+    if not response["ok"]:
+        print(response["error"])
+
+
+def _print_table(columns, rows):
+    from prettytable import PrettyTable
+
+    table = PrettyTable()
+    table.field_names = columns
+    for row in rows:
+        table.add_row([_to_display(value) for value in row])
+    print(table)
+
+
+def _to_display(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
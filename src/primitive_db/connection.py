@@ -0,0 +1,227 @@
+import os
+from collections import OrderedDict
+from itertools import islice
+
+from primitive_db import metrics, results
+from primitive_db.constants import (
+    MSG_ALREADY_CONNECTED,
+    MSG_CONNECTION_CLOSED,
+    STATEMENT_CACHE_SIZE,
+)
+from primitive_db.core import begin, commit, recover, rollback, shutdown
+from primitive_db.decorators import create_cacher, set_confirm_answer
+from primitive_db.engine import execute_command
+from primitive_db.exceptions import DBError, StorageError, ValidationError
+from primitive_db.parser import bind_params, parse_command
+from primitive_db.utils import in_transaction, set_database_dir
+
+# Открытое соединение или None. Директория базы, транзакция и кэши таблиц
+# общие для процесса (см. utils), поэтому соединение в процессе одно.
+_connection = None
+
+# Команды, которые executemany выполняет одной транзакцией.
+_WRITE_KINDS = ("insert", "update", "delete")
+
+
+class Cursor:
+    """
+    Результат команды: columns — столбцы выборки (None, если команда строк
+    не возвращала), строки — кортежи значений (итерация, fetchone,
+    fetchmany, fetchall), rowcount — число записанных или выбранных строк
+    (-1, если команда строк не касалась), lastrowid — ID последней
+    добавленной строки, messages — сообщения команды.
+    """
+
+    def __init__(self, result):
+        self.columns = result.columns
+        self.messages = result.messages
+        self.lastrowid = result.lastrowid
+        rows = result.rows if result.rows is not None else []
+        if result.rowcount is not None:
+            self.rowcount = result.rowcount
+        else:
+            self.rowcount = len(rows) if result.rows is not None else -1
+        self._rows = iter(rows)
+
+    def __iter__(self):
+        return self._rows
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=1):
+        return list(islice(self._rows, size))
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class Connection:
+    """
+    Соединение с базой внутри процесса (см. connect).
+
+    Каталог, буферы таблиц и кэш select сохраняются между вызовами, а
+    разобранные команды запоминаются по тексту (до STATEMENT_CACHE_SIZE),
+    поэтому повторные execute с новыми параметрами строку не разбирают.
+    Значения передаются через params на места "?" без кавычек.
+
+    Как и в интерактивном режиме, запись фиксируется сразу, если не
+    начата транзакция (begin() или команда begin). Ошибки выбрасываются
+    исключениями DBError. Соединение не потокобезопасно.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+        self._cacher = create_cacher()
+        self._statements = OrderedDict()
+
+    def execute(self, command, params=()):
+        """Выполнить команду и вернуть Cursor с её результатом."""
+        self._check_open()
+        with results.capture() as result, metrics.command() as current:
+            with metrics.phase(metrics.PHASE_PARSE):
+                cmd = bind_params(self._parse(command), params)
+            execute_command(cmd, self._cacher, current)
+        _raise_error(result)
+        return Cursor(result)
+
+    def executemany(self, command, seq_of_params):
+        """
+        Выполнить команду для каждого набора параметров.
+
+        Записи выполняются одной транзакцией: начатой ранее или своей,
+        которая фиксируется в конце и отменяется при ошибке. Строки insert
+        добавляются одной пачкой. rowcount результата — сумма по командам.
+        """
+        self._check_open()
+        template = self._parse(command)
+        cmds = [bind_params(template, params) for params in seq_of_params]
+        if template["kind"] == "insert" and cmds:
+            rows_raw = [row for cmd in cmds for row in cmd["rows_raw"]]
+            cmds = [dict(template, rows_raw=rows_raw)]
+
+        total = results.CommandResult()
+        own = template["kind"] in _WRITE_KINDS and not in_transaction()
+        if own:
+            self._call(begin)
+        try:
+            for cmd in cmds:
+                with results.capture() as result, metrics.command() as current:
+                    execute_command(cmd, self._cacher, current)
+                _raise_error(result)
+                total.messages.extend(result.messages)
+                if result.rowcount is not None:
+                    total.rowcount = (total.rowcount or 0) + result.rowcount
+                    total.lastrowid = result.lastrowid or total.lastrowid
+        except BaseException:
+            if own:
+                with results.capture():
+                    rollback(self._cacher)
+            raise
+        if own:
+            self._call(commit, self._cacher)
+        return Cursor(total)
+
+    def begin(self):
+        self._check_open()
+        self._call(begin)
+
+    def commit(self):
+        """Зафиксировать начатую транзакцию; без неё ничего не делает."""
+        self._check_open()
+        if in_transaction():
+            self._call(commit, self._cacher)
+
+    def rollback(self):
+        """Отменить начатую транзакцию; без неё ничего не делает."""
+        self._check_open()
+        if in_transaction():
+            self._call(rollback, self._cacher)
+
+    def close(self):
+        """
+        Закрыть соединение: незафиксированная транзакция отменяется,
+        журнал очищается контрольной точкой.
+        """
+        global _connection
+        if self.closed:
+            return
+        self.closed = True
+        _connection = None
+        try:
+            self._call(shutdown)
+        finally:
+            set_confirm_answer(None)
+            set_database_dir("")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        """Зафиксировать транзакцию, если блок завершился без ошибки, и закрыть."""
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            self.close()
+
+    def _parse(self, command):
+        cmd = self._statements.get(command)
+        if cmd is not None:
+            self._statements.move_to_end(command)
+            return cmd
+        cmd = parse_command(command)
+        self._statements[command] = cmd
+        if len(self._statements) > STATEMENT_CACHE_SIZE:
+            self._statements.popitem(last=False)
+        return cmd
+
+    def _call(self, func, *args):
+        with results.capture() as result:
+            func(*args)
+        _raise_error(result)
+
+    def _check_open(self):
+        if self.closed:
+            raise StorageError(MSG_CONNECTION_CLOSED)
+
+
+def _raise_error(result):
+    """Выбросить ошибку результата: исходное исключение или DBError."""
+    if result.ok:
+        return
+    if result.exception is not None:
+        raise result.exception
+    raise DBError(result.error)
+
+
+def connect(path="."):
+    """
+    Открыть базу в директории path (создаётся при необходимости) и вернуть
+    Connection.
+
+    Транзакции, оставшиеся в журнале после сбоя, восстанавливаются.
+    Подтверждения опасных команд (drop_table, delete) не запрашиваются:
+    вызывающий код выполняет их явно.
+    """
+    global _connection
+    path = os.fspath(path)
+    if _connection is not None:
+        raise ValidationError(MSG_ALREADY_CONNECTED.format(path=_connection.path))
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError as exc:
+        raise StorageError(f"Нет доступа к базе: {path}: {exc}") from exc
+
+    set_database_dir(path)
+    set_confirm_answer("y")
+    connection = Connection(path)
+    try:
+        connection._call(recover)
+    except BaseException:
+        set_confirm_answer(None)
+        set_database_dir("")
+        raise
+    _connection = connection
+    return connection
@@ -8,6 +8,19 @@ CMD_EXIT = "exit"
 CMD_CREATE_TABLE = "create_table"
 CMD_LIST_TABLES = "list_tables"
 CMD_DROP_TABLE = "drop_table"
+CMD_CREATE_INDEX = "create_index"
+CMD_EXPLAIN = "explain"
+CMD_CONVERT_TABLE = "convert_table"
+CMD_CACHE_STATS = "cache_stats"
+CMD_BULK_INSERT = "bulk_insert"
+CMD_IMPORT = "import"
+CMD_EXPORT = "export"
+CMD_STATS = "stats"
+CMD_PROFILE = "profile"
+CMD_TRACE = "trace"
+CMD_BEGIN = "begin"
+CMD_COMMIT = "commit"
+CMD_ROLLBACK = "rollback"
 
 KW_INSERT = "insert"
 KW_SELECT = "select"
@@ -19,10 +32,139 @@ KW_FROM = "from"
 KW_VALUES = "values"
 KW_WHERE = "where"
 KW_SET = "set"
+KW_TO = "to"
+KW_LIMIT = "limit"
+KW_OFFSET = "offset"
+KW_FORMAT = "format"
+KW_AND = "and"
+KW_OR = "or"
+KW_IN = "in"
+KW_LIKE = "like"
+KW_USING = "using"
+KW_ORDER = "order"
+KW_BY = "by"
+KW_ASC = "asc"
+KW_DESC = "desc"
+KW_GROUP = "group"
+KW_JOIN = "join"
+KW_ON = "on"
+
+# Место для значения, передаваемого отдельно (Connection.execute с params).
+PARAM_PLACEHOLDER = "?"
+
+AGG_COUNT = "count"
+AGG_SUM = "sum"
+AGG_MIN = "min"
+AGG_MAX = "max"
+AGG_AVG = "avg"
+AGGREGATE_FUNCS = (AGG_COUNT, AGG_SUM, AGG_MIN, AGG_MAX, AGG_AVG)
+# Агрегаты, применимые только к числовым (int) столбцам.
+NUMERIC_AGGREGATES = (AGG_SUM, AGG_AVG)
 
 STORAGE_DIR = "data"
 META_FILE = "db_meta.json"
 TABLE_FILE_EXT = ".json"
+LOG_FILE_EXT = ".jsonl"
+COLUMNAR_FILE_EXT = ".col"
+INDEX_FILE_EXT = ".idx"
+
+TABLE_FORMAT_LOG = "log"
+TABLE_FORMAT_COLUMNAR = "columnar"
+TABLE_FORMATS = (TABLE_FORMAT_LOG, TABLE_FORMAT_COLUMNAR)
+STORAGE_BACKEND = TABLE_FORMAT_LOG
+
+# Столбцовый формат: строк в одном сегменте при перезаписи и число
+# сегментов (дописанных вставками), после которого файл уплотняется.
+COLUMNAR_SEGMENT_ROWS = 65536
+COLUMNAR_MAX_SEGMENTS = 64
+# Столбцы int столбцового формата хранятся как int64.
+COLUMNAR_INT_MIN = -(2**63)
+COLUMNAR_INT_MAX = 2**63 - 1
+
+# Бюджет кэша разобранных таблиц и индексов (по размеру их файлов).
+TABLE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Журнал упреждающей записи (WAL): по строке на зафиксированную
+# транзакцию. Строка пишется до изменения файлов таблиц и сбрасывается на
+# диск (fsync, если включён WAL_FSYNC) один раз на commit. Журнал
+# очищается контрольной точкой, когда становится больше WAL_CHECKPOINT_BYTES.
+WAL_FILE = "db_wal.jsonl"
+WAL_FSYNC = True
+WAL_CHECKPOINT_BYTES = 16 * 1024 * 1024
+
+# Блокировки между процессами (fcntl.flock) — файлы в STORAGE_DIR. Запись
+# в таблицу держит <таблица>.lock до фиксации транзакции; журнал и
+# метаданные меняются под общей блокировкой каталога. Порядок захвата —
+# таблицы, затем каталог. Чтения блокировок не берут. Ожидание занятой
+# блокировки ограничено LOCK_TIMEOUT_SECONDS.
+LOCK_FILE_EXT = ".lock"
+CATALOG_LOCK_NAME = ".catalog"
+LOCK_TIMEOUT_SECONDS = 10
+LOCK_POLL_SECONDS = 0.01
+
+# Бюджет памяти сортировки order by (примерный объём строк). Если
+# подходящих строк больше, отсортированные серии сбрасываются во временные
+# файлы в STORAGE_DIR и сливаются; за один проход слияния открывается не
+# больше SORT_MERGE_FAN_IN серий.
+SORT_MEMORY_BYTES = 64 * 1024 * 1024
+SORT_MERGE_FAN_IN = 64
+SORT_RUN_PREFIX = ".sort-"
+
+# Сетевой режим (database serve / connect): адрес по умолчанию, наибольшая
+# длина строки команды и число команд, которые клиент отправляет разом, не
+# дожидаясь ответов.
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 7433
+SERVER_LINE_LIMIT = 16 * 1024 * 1024
+CLIENT_PIPELINE_DEPTH = 256
+
+# Пакетный режим (database -f): подряд идущие insert/update/delete
+# фиксируются одной транзакцией не больше чем из BATCH_MAX_STATEMENTS команд.
+BATCH_MAX_STATEMENTS = 1000
+
+# Библиотечный режим (primitive_db.connect): сколько разобранных команд
+# соединение хранит, чтобы повторные execute не разбирали текст заново.
+STATEMENT_CACHE_SIZE = 256
+
+# Границы кэша результатов select: число записей и примерный объём строк.
+SELECT_CACHE_MAX_ENTRIES = 128
+SELECT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Больше стольких пар за раз sorted-индекс не вставляет по одной (bisect),
+# а сливает с уже упорядоченными парами сортировкой.
+SORTED_INDEX_INSERT_MAX = 64
+
+# Модель стоимости планировщика select (в условных единицах на строку):
+# проверка строки при просмотре (список строк и столбцовая таблица через
+# mmap), чтение строки по ID из индекса и сортировка (на строку и log2 n).
+PLAN_SCAN_ROW_COST = 1.0
+PLAN_COLUMNAR_SCAN_ROW_COST = 0.25
+PLAN_FETCH_ROW_COST = 4.0
+PLAN_SORT_ROW_COST = 0.5
+# Вставка строки в хеш-таблицу стороны построения hash join.
+PLAN_HASH_BUILD_ROW_COST = 1.0
+# Доли строк, которые по умолчанию оставляют сравнения <, >, ... и like.
+PLAN_RANGE_SELECTIVITY = 1 / 3
+PLAN_LIKE_SELECTIVITY = 0.1
+# Размер выборки для оценки числа различных значений столбца.
+STATS_SAMPLE_ROWS = 1000
+
+# Размер пачки строк, записываемой за один раз при bulk_insert и import.
+BULK_INSERT_BATCH_ROWS = 10000
+# Размер пачки строк, записываемой за один раз при export.
+EXPORT_CHUNK_ROWS = 10000
+
+# Число строк на странице вывода select.
+RENDER_PAGE_ROWS = 100
+
+TRANSFER_FORMAT_CSV = "csv"
+TRANSFER_FORMAT_JSONL = "jsonl"
+CSV_FILE_EXT = ".csv"
+JSONL_FILE_EXTS = (".jsonl", ".ndjson")
+
+INDEX_KIND_HASH = "hash"
+INDEX_KIND_SORTED = "sorted"
+INDEX_KINDS = (INDEX_KIND_HASH, INDEX_KIND_SORTED)
 
 ID_COL_NAME = "ID"
 ID_COL_TYPE = "int"
@@ -36,33 +178,113 @@ MSG_TABLE_CREATED = 'Таблица "{table}" успешно создана со
 MSG_TABLE_EXISTS = 'Ошибка: Таблица "{table}" уже существует.'
 MSG_TABLE_NOT_EXISTS = 'Ошибка: Таблица "{table}" не существует.'
 MSG_NO_TABLES = "Таблиц нет."
+MSG_TABLE_CONVERTED = 'Таблица "{table}" переведена в формат {format}.'
+MSG_TABLE_FORMAT_SAME = 'Таблица "{table}" уже хранится в формате {format}.'
+MSG_UNKNOWN_FORMAT = "Неизвестный формат таблицы: {format}. Допустимо: {allowed}"
+
+MSG_INDEX_CREATED = 'Индекс по столбцу "{column}" таблицы "{table}" успешно создан.'
+MSG_INDEX_EXISTS = 'Ошибка: Индекс "{column}" таблицы "{table}" уже существует.'
+MSG_UNKNOWN_INDEX_KIND = "Неизвестный вид индекса: {kind}. Допустимо: {allowed}"
 
 MSG_ROW_INSERTED = 'Запись с ID={id} успешно добавлена в таблицу "{table}".'
+MSG_ROWS_INSERTED = 'Добавлено записей: {count} в таблицу "{table}" (ID {ids}).'
+MSG_EXPORTED = 'Экспортировано записей: {count} из таблицы "{table}" в {path}.'
 MSG_UPDATED = 'Обновлено записей: {count} в таблице "{table}".'
 MSG_DELETED = 'Удалено записей: {count} из таблицы "{table}".'
 
 MSG_OPERATION_CANCELED = "Операция отменена."
+
+MSG_TXN_BEGUN = "Транзакция начата."
+MSG_TXN_COMMITTED = "Транзакция зафиксирована (изменено таблиц: {count})."
+MSG_TXN_ROLLED_BACK = "Транзакция отменена."
+MSG_TXN_ABORTED = "Незафиксированная транзакция отменена."
+MSG_TXN_ACTIVE = "Транзакция уже начата."
+MSG_TXN_NOT_ACTIVE = "Нет начатой транзакции."
+MSG_TXN_FORBIDDEN = "Команда {command} недоступна внутри транзакции."
+MSG_RECOVERED = "Восстановлено из журнала транзакций: {count}."
+MSG_SERVER_STARTED = "Сервер принимает команды на {host}:{port} (остановка: Ctrl+C)."
+MSG_SERVER_STOPPED = "Сервер остановлен."
+MSG_CLIENT_CONNECTED = "Подключено к серверу {host}:{port}."
+MSG_SERVER_CLOSED = "Сервер закрыл соединение."
+MSG_MULTILINE_COMMAND = "Команда должна занимать одну строку."
+MSG_LINE_TOO_LONG = "Ошибка: Команда длиннее {limit} байт не выполнена."
+MSG_ALREADY_CONNECTED = "В процессе уже открыто соединение с базой: {path}"
+MSG_CONNECTION_CLOSED = "Соединение закрыто."
 MSG_CONFIRM_TEMPLATE = 'Вы уверены, что хотите выполнить "{action}"? [y/n]: '
 
-MSG_TIME_TEMPLATE = "Функция {name} выполнилась за {seconds:.3f} секунд"
+MSG_NO_STATS = "Статистики пока нет."
+MSG_STATS_SAVED = "Статистика сохранена в {path}."
+MSG_PROFILE_ON = "Профилирование (cProfile) включено."
+MSG_PROFILE_OFF = "Профилирование выключено."
+MSG_PROFILE_SAVED = "Профиль сохранён в {path}."
+MSG_PROFILE_NOT_RUNNING = "Профилирование не включено."
+MSG_TRACE_ON = "Учёт памяти (tracemalloc) включён."
+MSG_TRACE_OFF = "Учёт памяти выключен."
+MSG_STATS_RESET = "Статистика сброшена."
+
+MSG_EXPLAIN_TABLE = 'План select для таблицы "{table}" (строк: {rows}):'
+MSG_EXPLAIN_ACCESS = "  доступ: {access}; кандидатов {candidates}, стоимость {cost:.1f}"
+MSG_EXPLAIN_ALTERNATIVE = (
+    "  отвергнут: {access}; кандидатов {candidates}, стоимость {cost:.1f}"
+)
+MSG_EXPLAIN_ORDER = "  порядок: {order}, {direction}; итоговая стоимость {cost:.1f}"
+MSG_EXPLAIN_ROWS = "  строк: оценка {estimated}, фактически {actual} ({ms:.3f} мс)"
+MSG_EXPLAIN_CACHED = "  кэш select: результат уже сохранён, таблица не читалась бы"
+EXPLAIN_ACCESS_LABELS = {
+    "scan": "полный просмотр",
+    "id": 'первичный индекс "ID"',
+    "hash": 'hash-индекс "{column}"',
+    "sorted": 'sorted-индекс "{column}"',
+}
+EXPLAIN_ORDER_LABELS = {
+    "id": "по ID",
+    "index": 'обход sorted-индекса "{column}"',
+    "sort": 'сортировка по "{column}"',
+}
+EXPLAIN_DIRECTIONS = ("по возрастанию", "по убыванию")
 
 MSG_CACHE_HIT = "Кэш: использован сохранённый результат."
 MSG_CACHE_MISS = "Кэш: вычисление результата."
+MSG_CACHE_STATS = (
+    "Кэш select: попаданий {hits}, промахов {misses}, вытеснено {evictions}, "
+    "обновлено на месте {patches}; записей {entries}/{max_entries}, "
+    "объём ~{bytes}/{max_bytes} байт."
+)
 
 HELP_TEXT = """
 ***Процесс работы с таблицей и данными***
 Функции:
-<command> create_table <имя_таблицы> <столбец1:тип> <столбец2:тип> ...
+<command> create_table <имя_таблицы> <столбец1:тип> ... [format=log|columnar]
+<command> convert_table <имя_таблицы> log|columnar
 <command> list_tables
 <command> drop_table <имя_таблицы>
+<command> create_index <имя_таблицы> <столбец> [using hash|sorted]
 
 <command> insert into <имя_таблицы> values (<v1>, <v2>, ...)
+<command> insert into <имя_таблицы> values (<v1>, ...), (<v1>, ...), ...
+<command> bulk_insert <имя_таблицы> <файл>
+<command> import <имя_таблицы> from <файл.csv|файл.jsonl>
+<command> export <имя_таблицы> [where <столбец> = <значение>] to <файл.csv|файл.jsonl>
 <command> select from <имя_таблицы>
 <command> select from <имя_таблицы> where <столбец> = <значение>
+<command> select from <имя_таблицы> [where ...] [limit <N>] [offset <M>]
+<command> select <столбец1>, <столбец2>, ... from <имя_таблицы> [where ...]
+<command> select from <имя_таблицы> [where ...] order by <столбец> [asc|desc]
+<command> select count(*), sum(<столбец>), ... from <имя_таблицы> [group by <столбец>]
+<command> select ... from <т1> join <т2> on <т1.столбец> = <т2.столбец> [where ...]
+<command> explain select ...
 <command> update <имя_таблицы> set <столбец>=<значение> where <столбец>=<значение>
 <command> delete from <имя_таблицы> where <столбец> = <значение>
+<command> begin | commit | rollback
+
+Условие where: =, !=, <, <=, >, >=, in (...), like "шаблон%", and, or, скобки.
+Агрегаты: count(*), count, sum, avg, min, max; group by — один или несколько столбцов.
 
 Общие команды:
+<command> cache_stats
+<command> stats [json [<файл>] | reset]
+<command> profile on|off|dump <файл>
+<command> trace on|off
 <command> exit
 <command> help
 """.strip()
@@ -1,25 +1,121 @@
+import json
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from primitive_db import (
+    aggregates,
+    indexes,
+    metrics,
+    planner,
+    predicates,
+    results,
+    sorting,
+    transfer,
+)
 from primitive_db.constants import (
+    AGG_COUNT,
+    AGG_MAX,
+    AGG_MIN,
+    BULK_INSERT_BATCH_ROWS,
+    CMD_CONVERT_TABLE,
+    CMD_CREATE_INDEX,
+    CMD_CREATE_TABLE,
+    CMD_DROP_TABLE,
+    COLUMNAR_INT_MAX,
+    COLUMNAR_INT_MIN,
+    EXPLAIN_ACCESS_LABELS,
+    EXPLAIN_DIRECTIONS,
+    EXPLAIN_ORDER_LABELS,
+    EXPORT_CHUNK_ROWS,
     ID_COL_NAME,
     ID_COL_TYPE,
+    INDEX_KIND_HASH,
+    INDEX_KIND_SORTED,
+    INDEX_KINDS,
     MSG_CACHE_HIT,
     MSG_CACHE_MISS,
+    MSG_CACHE_STATS,
     MSG_DELETED,
+    MSG_EXPLAIN_ACCESS,
+    MSG_EXPLAIN_ALTERNATIVE,
+    MSG_EXPLAIN_CACHED,
+    MSG_EXPLAIN_ORDER,
+    MSG_EXPLAIN_ROWS,
+    MSG_EXPLAIN_TABLE,
+    MSG_EXPORTED,
+    MSG_INDEX_CREATED,
+    MSG_INDEX_EXISTS,
+    MSG_NO_STATS,
     MSG_NO_TABLES,
+    MSG_PROFILE_NOT_RUNNING,
+    MSG_PROFILE_OFF,
+    MSG_PROFILE_ON,
+    MSG_PROFILE_SAVED,
+    MSG_RECOVERED,
     MSG_ROW_INSERTED,
+    MSG_ROWS_INSERTED,
+    MSG_STATS_RESET,
+    MSG_STATS_SAVED,
+    MSG_TABLE_CONVERTED,
     MSG_TABLE_CREATED,
     MSG_TABLE_EXISTS,
+    MSG_TABLE_FORMAT_SAME,
     MSG_TABLE_NOT_EXISTS,
+    MSG_TRACE_OFF,
+    MSG_TRACE_ON,
+    MSG_TXN_ABORTED,
+    MSG_TXN_ACTIVE,
+    MSG_TXN_BEGUN,
+    MSG_TXN_COMMITTED,
+    MSG_TXN_FORBIDDEN,
+    MSG_TXN_NOT_ACTIVE,
+    MSG_TXN_ROLLED_BACK,
+    MSG_UNKNOWN_FORMAT,
+    MSG_UNKNOWN_INDEX_KIND,
     MSG_UPDATED,
+    NUMERIC_AGGREGATES,
+    RENDER_PAGE_ROWS,
+    STORAGE_BACKEND,
+    TABLE_FORMAT_COLUMNAR,
+    TABLE_FORMATS,
     VALID_TYPES,
 )
 from primitive_db.decorators import confirm_action, handle_db_errors, log_time
-from primitive_db.exceptions import NotFoundError, ValidationError
+from primitive_db.exceptions import (
+    DBError,
+    NotFoundError,
+    ParseError,
+    StorageError,
+    ValidationError,
+)
+from primitive_db.parser import parse_values_line
 from primitive_db.utils import (
+    append_table_rows,
+    begin_transaction,
+    checkpoint,
+    commit_transaction,
+    convert_table_file,
+    create_table_file,
     delete_table_file,
+    get_table_format,
+    in_transaction,
+    iter_table_rows,
     load_metadata,
     load_table_data,
+    lock_table,
+    lock_wal_tables,
+    log_dropped_table,
+    mapped_table,
+    mark_applied,
+    read_wal,
+    rollback_transaction,
     save_metadata,
     save_table_data,
+    table_lock,
+    table_locked,
+    table_stamp,
+    transaction_tables,
 )
 
 
@@ -37,21 +133,24 @@ def list_tables():
 
 
 @handle_db_errors
-def create_table(table_name, columns):
-    """Создать таблицу с указанными столбцами."""
-    metadata = load_metadata()
-
-    if table_name in metadata:
-        raise ValidationError(MSG_TABLE_EXISTS.format(table=table_name))
-
+def create_table(table_name, columns, table_format=STORAGE_BACKEND):
+    """Создать таблицу с указанными столбцами в выбранном формате хранения."""
+    _ensure_no_transaction(CMD_CREATE_TABLE)
+    _check_table_format(table_format)
     parsed_cols = _parse_columns(columns)
     full_cols = [{"name": ID_COL_NAME, "type": ID_COL_TYPE}] + parsed_cols
 
-    metadata[table_name] = {
-        "columns": full_cols,
-        "last_id": 0,
-    }
-    save_metadata(metadata)
+    with table_lock(table_name):
+        metadata = load_metadata()
+        if table_name in metadata:
+            raise ValidationError(MSG_TABLE_EXISTS.format(table=table_name))
+
+        create_table_file(table_name, full_cols, table_format)
+        metadata[table_name] = {
+            "columns": full_cols,
+            "last_id": 0,
+        }
+        save_metadata(metadata)
 
     cols_str = ", ".join([f'{c["name"]}:{c["type"]}' for c in full_cols])
     print(MSG_TABLE_CREATED.format(table=table_name, cols=cols_str))
@@ -62,18 +161,66 @@ def create_table(table_name, columns):
 @handle_db_errors
 def drop_table(table_name, cacher):
     """Удалить таблицу и связанный файл данных."""
-    metadata = load_metadata()
+    _ensure_no_transaction(CMD_DROP_TABLE)
+    with table_lock(table_name):
+        metadata = load_metadata()
+        if table_name not in metadata:
+            raise NotFoundError(MSG_TABLE_NOT_EXISTS.format(table=table_name))
+
+        # Граница в журнале: при восстановлении прежние записи о таблице не
+        # попадут в новую таблицу с тем же именем.
+        log_dropped_table(table_name)
+        schema = metadata.pop(table_name)
+        save_metadata(metadata)
+
+        delete_table_file(table_name)
+        indexes.drop_indexes(table_name, schema)
+    planner.forget(table_name)
+    cacher.invalidate(table_name)
 
-    if table_name not in metadata:
-        raise NotFoundError(MSG_TABLE_NOT_EXISTS.format(table=table_name))
+    print(f'Таблица "{table_name}" успешно удалена.')
+    return None
 
-    metadata.pop(table_name, None)
-    save_metadata(metadata)
 
-    delete_table_file(table_name)
-    cacher.invalidate(table_name)
+@handle_db_errors
+def convert_table(table_name, table_format):
+    """Перевести существующую таблицу в другой формат хранения."""
+    _ensure_no_transaction(CMD_CONVERT_TABLE)
+    _check_table_format(table_format)
+    with table_lock(table_name):
+        schema = _get_schema(load_metadata(), table_name)
+        if get_table_format(table_name) == table_format:
+            print(MSG_TABLE_FORMAT_SAME.format(table=table_name, format=table_format))
+            return None
+
+        convert_table_file(table_name, schema["columns"], table_format)
+    print(MSG_TABLE_CONVERTED.format(table=table_name, format=table_format))
+    return None
 
-    print(f'Таблица "{table_name}" успешно удалена.')
+
+@handle_db_errors
+def create_index(table_name, column, kind=INDEX_KIND_HASH):
+    """Построить индекс по столбцу таблицы: hash (равенства) или sorted."""
+    _ensure_no_transaction(CMD_CREATE_INDEX)
+    if kind not in INDEX_KINDS:
+        allowed = ", ".join(INDEX_KINDS)
+        raise ValidationError(MSG_UNKNOWN_INDEX_KIND.format(kind=kind, allowed=allowed))
+    with table_lock(table_name):
+        metadata = load_metadata()
+        schema = _get_schema(metadata, table_name)
+        _type_of_column(schema["columns"], column)
+
+        table_indexes = schema.setdefault("indexes", {})
+        if column in table_indexes:
+            raise ValidationError(
+                MSG_INDEX_EXISTS.format(table=table_name, column=column)
+            )
+
+        indexes.create_index(table_name, column, load_table_data(table_name), kind)
+        table_indexes[column] = kind
+        save_metadata(metadata)
+
+    print(MSG_INDEX_CREATED.format(table=table_name, column=column))
     return None
 
 
@@ -81,80 +228,636 @@ def drop_table(table_name, cacher):
 @handle_db_errors
 def insert_row(table_name, values_raw, cacher):
     """Добавить строку в таблицу."""
-    metadata = load_metadata()
-    schema = _get_schema(metadata, table_name)
-
-    cols = schema["columns"]
-    expected = len(cols) - 1
-    if len(values_raw) != expected:
-        raise ValidationError(
-            f"Ожидается значений: {expected}, получено: {len(values_raw)}"
-        )
+    rows = _insert_batch(table_name, [values_raw], cacher)
+    results.set_rowcount(1, rows[0][ID_COL_NAME])
+    print(MSG_ROW_INSERTED.format(id=rows[0][ID_COL_NAME], table=table_name))
+    return None
 
-    values = [_coerce_value(v, cols[i + 1]["type"]) for i, v in enumerate(values_raw)]
 
-    rows = load_table_data(table_name)
-    new_id = int(schema["last_id"]) + 1
-    schema["last_id"] = new_id
+@log_time
+@handle_db_errors
+def insert_rows(table_name, rows_raw, cacher):
+    """Добавить несколько строк одной пачкой."""
+    rows = _insert_batch(table_name, rows_raw, cacher)
+    _print_inserted(table_name, len(rows), rows[:1], rows[-1:])
+    return None
 
-    row = {ID_COL_NAME: new_id}
-    for i, col in enumerate(cols[1:]):
-        row[col["name"]] = values[i]
 
-    rows.append(row)
-    save_table_data(table_name, rows)
+@log_time
+@handle_db_errors
+def bulk_insert(table_name, path, cacher):
+    """
+    Загрузить строки из файла: по одному кортежу значений на строку файла.
+
+    Строки проверяются и записываются пачками по BULK_INSERT_BATCH_ROWS;
+    ошибка в строке файла останавливает загрузку, уже записанные пачки
+    сохраняются.
+    """
+    _get_schema(load_metadata(), table_name)
+    _insert_stream(table_name, _read_values_lines(path), cacher)
+    return None
 
-    metadata[table_name] = schema
-    save_metadata(metadata)
 
-    cacher.invalidate(table_name)
-    print(MSG_ROW_INSERTED.format(id=new_id, table=table_name))
+@log_time
+@handle_db_errors
+def import_rows(table_name, path, cacher):
+    """
+    Импортировать строки из CSV (с заголовком) или JSON Lines.
+
+    Файл читается потоково и записывается пачками по BULK_INSERT_BATCH_ROWS,
+    столбцы сопоставляются по именам, ID из файла не используется.
+    """
+    schema = _get_schema(load_metadata(), table_name)
+    names = [col["name"] for col in schema["columns"][1:]]
+    _insert_stream(table_name, transfer.read_rows(path, names), cacher)
     return None
 
 
 @log_time
 @handle_db_errors
-def select_rows(table_name, where, cacher):
-    """Выбрать строки таблицы по условию (или все)."""
+def export_rows(table_name, where_clause, path):
+    """Экспортировать строки таблицы (все или по условию) в CSV или JSON Lines."""
     metadata = load_metadata()
     schema = _get_schema(metadata, table_name)
+    cols = schema["columns"]
+
+    typed_where = _prepare_where(cols, where_clause)
+
+    rows = iter_table_rows(table_name)
+    if typed_where:
+        rows = filter(predicates.compile_where(typed_where), rows)
+
+    names = [col["name"] for col in cols]
+    count = transfer.write_rows(path, names, rows, EXPORT_CHUNK_ROWS)
+    print(MSG_EXPORTED.format(count=count, table=table_name, path=path))
+    return None
+
+
+def _read_values_lines(path):
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            for lineno, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield lineno, parse_values_line(line)
+                except ParseError as exc:
+                    raise ValidationError(f"Строка {lineno}: {exc}") from exc
+    except OSError as exc:
+        raise StorageError(f"Ошибка чтения файла: {path}: {exc}") from exc
+
+
+def _insert_stream(table_name, numbered_rows, cacher):
+    """
+    Записать поток пар (номер строки файла, значения) пачками.
+
+    В памяти одновременно находится не больше одной пачки; ошибка
+    останавливает загрузку, уже записанные пачки сохраняются.
+    """
+    count = 0
+    first = []
+    last = []
+    try:
+        for chunk in transfer.chunked(numbered_rows, BULK_INSERT_BATCH_ROWS):
+            linenos = [lineno for lineno, _ in chunk]
+            rows_raw = [values for _, values in chunk]
+            rows = _insert_batch(table_name, rows_raw, cacher, linenos)
+            count += len(rows)
+            first = first or rows[:1]
+            last = rows[-1:]
+    except DBError:
+        if count:
+            _print_inserted(table_name, count, first, last)
+        raise
+    _print_inserted(table_name, count, first, last)
+
+
+def _insert_batch(table_name, rows_raw, cacher, linenos=None):
+    """
+    Проверить и записать пачку строк одной записью на диск.
+
+    Все значения приводятся к типам столбцов до записи, поэтому ошибка в
+    любой строке отменяет всю пачку. Пачка получает непрерывный блок ID;
+    last_id читается под блокировкой таблицы, поэтому параллельные вставки
+    других процессов не получают тех же ID.
+    """
+    with _autocommit([table_name], cacher):
+        metadata = load_metadata()
+        schema = _get_schema(metadata, table_name)
+
+        cols = schema["columns"]
+        data_cols = cols[1:]
+        expected = len(data_cols)
+        columnar = _is_columnar(table_name)
+
+        first_id = int(schema["last_id"]) + 1
+        rows = []
+        for offset, values_raw in enumerate(rows_raw):
+            try:
+                if len(values_raw) != expected:
+                    raise ValidationError(
+                        f"Ожидается значений: {expected}, получено: {len(values_raw)}"
+                    )
+                row = {ID_COL_NAME: first_id + offset}
+                for col, value in zip(data_cols, values_raw):
+                    row[col["name"]] = _coerce_value(value, col["type"], columnar)
+            except ValidationError as exc:
+                if linenos is None:
+                    raise
+                raise ValidationError(f"Строка {linenos[offset]}: {exc}") from exc
+            rows.append(row)
+
+        if not rows:
+            return rows
+
+        # Строки и новый last_id фиксируются одной записью журнала, поэтому
+        # после сбоя они не расходятся.
+        schema["last_id"] = first_id + len(rows) - 1
+        metadata[table_name] = schema
+        save_metadata(metadata)
+        append_table_rows(table_name, rows)
+        indexes.on_insert(table_name, schema, rows)
+
+    cacher.on_insert(table_name, rows)
+    return rows
+
+
+def _print_inserted(table_name, count, first, last):
+    ids = "-"
+    if first and last:
+        ids = f"{first[0][ID_COL_NAME]}..{last[0][ID_COL_NAME]}"
+    results.set_rowcount(count, last[0][ID_COL_NAME] if last else None)
+    print(MSG_ROWS_INSERTED.format(count=count, table=table_name, ids=ids))
 
-    key = _select_cache_key(table_name, where)
-    rows = cacher(key, lambda: _select_impl(table_name, where))
-    if cacher.was_hit:
+
+@log_time
+@handle_db_errors
+def select_rows(
+    table_name,
+    where,
+    cacher,
+    limit=None,
+    offset=0,
+    columns=None,
+    order_by=None,
+    descending=False,
+):
+    """
+    Выбрать строки таблицы по условию (или все), с limit/offset.
+
+    columns — список выводимых столбцов (None — все), order_by — столбец
+    сортировки (None — порядок ID). При промахе кэша строки выводятся
+    постранично по мере нахождения, сканирование останавливается, как
+    только набрано limit строк.
+    """
+    metadata = load_metadata()
+    schema = _get_schema(metadata, table_name)
+    shown = _projected_columns(schema["columns"], columns)
+    where = _prepare_where(schema["columns"], where)
+    order = _select_order(schema["columns"], order_by, descending)
+
+    key = _select_cache_key(table_name, where, limit, offset, columns, order)
+    _sync_cache(cacher, [table_name])
+    rows = cacher.lookup(key)
+    if rows is not None:
         print(MSG_CACHE_HIT)
-    else:
-        print(MSG_CACHE_MISS)
+        _print_rows(shown, rows)
+        return None
+
+    print(MSG_CACHE_MISS)
+    found = []
+    stream = _select_impl(table_name, schema, where, limit, offset, columns, order)
+    _print_rows(shown, _collect(stream, found))
 
-    _print_rows(schema["columns"], rows)
+    # Результат с limit/offset или сортировкой зависит от соседних строк,
+    # поэтому точечно не обновляется и сбрасывается при любой записи.
+    patchable = limit is None and not offset and order is None
+    match = predicates.compile_where(where) if patchable else None
+    cacher.store(key, found, match=match, project=_projector(columns))
     return None
 
 
 @log_time
 @handle_db_errors
-def update_rows(table_name, set_clause, where_clause, cacher):
-    """Обновить строки таблицы по условию."""
+def aggregate_rows(
+    table_name,
+    where,
+    cacher,
+    columns,
+    specs,
+    group_by=(),
+    limit=None,
+    offset=0,
+    order_by=None,
+    descending=False,
+):
+    """
+    Посчитать агрегаты (count, sum, avg, min, max) по всей выборке или по
+    группам group_by за один проход; specs — пары (функция, столбец).
+
+    columns — выводимые столбцы: столбцы group_by и метки агрегатов
+    ("sum(age)"). Группы выводятся по возрастанию ключа или по order_by.
+    """
     metadata = load_metadata()
     schema = _get_schema(metadata, table_name)
     cols = schema["columns"]
+    where = _prepare_where(cols, where)
+    group_by = list(group_by)
+    for name in group_by:
+        _type_of_column(cols, name)
+    for func, column in specs:
+        if column is None:
+            continue
+        if _type_of_column(cols, column) != "int" and func in NUMERIC_AGGREGATES:
+            raise ValidationError(f'{func} применим только к int: "{column}"')
+
+    agg_labels = [aggregates.label(func, column) for func, column in specs]
+    shown = columns or group_by
+    for name in shown:
+        if name not in agg_labels and name not in group_by:
+            raise ValidationError(
+                f'Столбец "{name}" должен быть в group by или внутри агрегата.'
+            )
+    if order_by is not None and order_by not in shown:
+        raise ValidationError(f'order by: столбца "{order_by}" нет в результате.')
+
+    key = (
+        table_name,
+        predicates.cache_key(where),
+        limit,
+        offset,
+        tuple(shown),
+        (order_by, bool(descending)),
+        tuple(group_by),
+    )
+    _sync_cache(cacher, [table_name])
+    rows = cacher.lookup(key)
+    if rows is None:
+        print(MSG_CACHE_MISS)
+        with metrics.phase(metrics.PHASE_FILTER):
+            groups = _aggregate_impl(table_name, schema, where, specs, group_by)
+        rows = [
+            dict(zip(group_by, group)) | dict(zip(agg_labels, values))
+            for group, values in sorted(groups.items())
+        ]
+        if order_by is not None:
+            rows.sort(key=lambda row: row[order_by], reverse=descending)
+        stop = None if limit is None else offset + limit
+        rows = rows[offset:stop]
+        # Итог зависит от всех строк таблицы, поэтому сбрасывается при записи.
+        cacher.store(key, rows)
+    else:
+        print(MSG_CACHE_HIT)
+    _print_rows([{"name": name} for name in shown], rows)
+    return None
 
-    _ensure_columns_exist(cols, set_clause)
-    _ensure_columns_exist(cols, where_clause)
 
-    typed_set = _coerce_clause(cols, set_clause)
-    typed_where = _coerce_clause(cols, where_clause)
+def _aggregate_impl(table_name, schema, where, specs, group_by):
+    """Группы {ключ: [значения агрегатов]}: по индексам или одним проходом."""
+    rows, mapped = _table_source(table_name)
+    plan = planner.plan_query(table_name, schema, rows, where)
+    if not group_by:
+        values = _aggregate_from_indexes(table_name, schema, rows, where, plan, specs)
+        if values is not None:
+            return {(): values}
+    names = None
+    if mapped is not None:
+        # Столбцовая таблица декодирует только нужные агрегатам столбцы.
+        names = list(dict.fromkeys(group_by + [col for _, col in specs if col]))
+    stream = _execute_plan(table_name, rows, mapped, where, plan, None, 0, names)
+    return aggregates.aggregate(stream, specs, group_by)
+
+
+def _aggregate_from_indexes(table_name, schema, rows, where, plan, specs):
+    """
+    Ответить без прохода по строкам, если это возможно: count(*) — по числу
+    строк таблицы или кандидатов hash/sorted-индекса, покрывающего всё
+    условие; min/max — по краям sorted-индекса столбца. Иначе None.
+    """
+    access = plan.access
+    exact = access.kind in (planner.ACCESS_HASH, planner.ACCESS_SORTED)
+    if where is None:
+        count = len(rows)
+    elif exact and set(access.nodes) == set(predicates.conjuncts(where)):
+        count = access.rows
+    else:
+        return None
+    values = []
+    for func, column in specs:
+        if func == AGG_COUNT:
+            values.append(count)
+            continue
+        if func not in (AGG_MIN, AGG_MAX) or not count:
+            return None
+        if indexes.indexed_columns(schema).get(column) != INDEX_KIND_SORTED:
+            return None
+        if where is not None and access.column != column:
+            return None
+        buffer, spans = indexes.sorted_spans(
+            table_name, column, rows, where, force=True
+        )
+        if func == AGG_MIN:
+            values.append(buffer.values[spans[0][0]])
+        else:
+            values.append(buffer.values[spans[-1][1] - 1])
+    return values
 
-    rows = load_table_data(table_name)
-    count = 0
-    for row in rows:
-        if _row_matches(row, typed_where):
-            for key, value in typed_set.items():
-                row[key] = value
-            count += 1
 
-    save_table_data(table_name, rows)
-    cacher.invalidate(table_name)
+@log_time
+@handle_db_errors
+def join_rows(
+    table_name,
+    join_table,
+    on,
+    where,
+    cacher,
+    columns=None,
+    limit=None,
+    offset=0,
+    order_by=None,
+    descending=False,
+):
+    """
+    Соединить две таблицы по равенству столбцов (hash join).
+
+    Столбцы результата называются "<таблица>.<столбец>"; в списке select,
+    where, on и order by имя без таблицы допустимо, если оно однозначно.
+    Условия where, касающиеся одной таблицы, проверяются при её чтении.
+    """
+    metadata = load_metadata()
+    tables = (table_name, join_table)
+    if table_name == join_table:
+        raise ValidationError("join таблицы с самой собой не поддерживается.")
+    schemas = [_get_schema(metadata, name) for name in tables]
+    joined = _join_columns(tables, schemas)
+    types = {col["name"]: col["type"] for col in joined}
+
+    def qualify(name):
+        return _qualify_column(tables, schemas, name)
+
+    keys = [qualify(name) for name in on]
+    if keys[0].split(".", 1)[0] == keys[1].split(".", 1)[0]:
+        raise ValidationError("Условие on должно связывать столбцы двух таблиц.")
+    if keys[0].split(".", 1)[0] != table_name:
+        keys.reverse()
+    if types[keys[0]] != types[keys[1]]:
+        raise ValidationError(f"Типы столбцов join не совпадают: {keys[0]}, {keys[1]}")
+
+    shown = joined
+    if columns is not None:
+        shown = _projected_columns(joined, [qualify(name) for name in columns])
+    tree = predicates.rename_columns(predicates.from_dict(where), qualify)
+    tree = _prepare_where(joined, tree)
+    order = None
+    if order_by is not None:
+        order = (qualify(order_by), bool(descending))
+
+    key = (
+        tables,
+        tuple(keys),
+        predicates.cache_key(tree),
+        limit,
+        offset,
+        tuple(col["name"] for col in shown),
+        order,
+    )
+    _sync_cache(cacher, tables)
+    rows = cacher.lookup(key)
+    if rows is not None:
+        print(MSG_CACHE_HIT)
+        _print_rows(shown, rows)
+        return None
+
+    print(MSG_CACHE_MISS)
+    stream = _join_impl(tables, schemas, keys, tree)
+    top = None if limit is None else offset + limit
+    if order is not None:
+        column = order[0]
+
+        def key(row):
+            return row[column]
+
+        stream = sorting.sort_rows(stream, key, reverse=order[1], limit=top)
+    if columns is not None:
+        names = [col["name"] for col in shown]
+        stream = ({name: row[name] for name in names} for row in stream)
+    stop = None if limit is None else offset + limit
+    found = []
+    _print_rows(shown, _collect(islice(stream, offset, stop), found))
+    # Строки join не несут общего ID, поэтому результат сбрасывается при
+    # любой записи в одну из таблиц.
+    cacher.store(key, found)
+    return None
+
+
+def _join_columns(tables, schemas):
+    """Описания столбцов результата join: "<таблица>.<столбец>"."""
+    return [
+        {"name": f"{table}.{col['name']}", "type": col["type"]}
+        for table, schema in zip(tables, schemas)
+        for col in schema["columns"]
+    ]
+
+
+def _qualify_column(tables, schemas, name):
+    """Полное имя столбца join ("<таблица>.<столбец>") по полному или короткому."""
+    if "." in name:
+        table, column = name.split(".", 1)
+        if table not in tables:
+            raise NotFoundError(f'Таблица "{table}" не участвует в join.')
+        _type_of_column(schemas[tables.index(table)]["columns"], column)
+        return name
+    owners = [
+        table
+        for table, schema in zip(tables, schemas)
+        if any(col["name"] == name for col in schema["columns"])
+    ]
+    if not owners:
+        raise NotFoundError(f'Столбец "{name}" не найден.')
+    if len(owners) > 1:
+        raise ValidationError(
+            f'Столбец "{name}" есть в обеих таблицах, укажите таблицу.'
+        )
+    return f"{owners[0]}.{name}"
+
+
+def _join_impl(tables, schemas, keys, where):
+    """
+    Лениво выдавать соединённые строки в порядке стороны, читаемой потоком.
+
+    Листья where на верхнем уровне and, относящиеся к одной таблице,
+    переносятся в её чтение; остальные проверяются на соединённой строке.
+    В памяти держится только сторона построения (или её hash-индекс).
+    """
+    pushed = [[], []]
+    residual = []
+    for node in predicates.conjuncts(where):
+        owners = {name.split(".", 1)[0] for name in predicates.columns(node)}
+        if len(owners) == 1:
+            side = tables.index(owners.pop())
+            prefix = len(tables[side]) + 1
+            pushed[side].append(predicates.rename_columns(node, lambda n: n[prefix:]))
+        else:
+            residual.append(node)
+    side_where = [
+        predicates.combine(predicates.NODE_AND, nodes) if nodes else None
+        for nodes in pushed
+    ]
+    columns = [name.split(".", 1)[1] for name in keys]
+    sources = [_table_source(table) for table in tables]
+    sides = [
+        (tables[i], schemas[i], sources[i][0], side_where[i], columns[i])
+        for i in (0, 1)
+    ]
+    plan = planner.plan_join(sides)
+
+    build, probe = plan.build, 1 - plan.build
+    if plan.use_index:
+        matches = _indexed_side(sources[build][1], *sides[build])
+    else:
+        matches = _hashed_side(*sides[build])
+    probe_rows = _select_impl(tables[probe], schemas[probe], side_where[probe])
+    match = predicates.compile_where(
+        predicates.combine(predicates.NODE_AND, residual) if residual else None
+    )
+    prefixes = [f"{table}." for table in tables]
+    for row in probe_rows:
+        for other in matches(row[columns[probe]]):
+            pair = (row, other) if probe == 0 else (other, row)
+            joined = {
+                prefix + name: value
+                for prefix, side_row in zip(prefixes, pair)
+                for name, value in side_row.items()
+            }
+            if match(joined):
+                yield joined
+
+
+def _hashed_side(table_name, schema, rows, where, column):
+    """Построить хеш-таблицу {значение: [строка, ...]} по стороне join."""
+    table = {}
+    for row in _select_impl(table_name, schema, where):
+        table.setdefault(row[column], []).append(row)
+
+    def matches(value):
+        return table.get(value, ())
+
+    return matches
+
+
+def _indexed_side(mapped, table_name, schema, rows, where, column):
+    """Искать строки стороны join через её hash-индекс по столбцу join."""
+    index = indexes.load_hash_index(table_name, column, rows)
+    match = predicates.compile_where(where)
+
+    def matches(value):
+        ids = index.get(value, ())
+        if mapped is not None:
+            found = mapped.rows_by_ids(ids)
+        else:
+            found = (rows[pos] for pos in indexes.positions_for_ids(rows, ids))
+        return [row for row in found if match(row)]
+
+    return matches
 
+
+@handle_db_errors
+def explain_select(
+    table_name,
+    where,
+    cacher,
+    limit=None,
+    offset=0,
+    columns=None,
+    order_by=None,
+    descending=False,
+):
+    """
+    Показать план select: выбранный путь доступа, отвергнутые варианты,
+    способ сортировки, оценку числа строк и фактическое число (запрос
+    выполняется без вывода строк и без записи в кэш).
+    """
+    metadata = load_metadata()
+    schema = _get_schema(metadata, table_name)
+    _projected_columns(schema["columns"], columns)
+    where = _prepare_where(schema["columns"], where)
+    order = _select_order(schema["columns"], order_by, descending)
+    key = _select_cache_key(table_name, where, limit, offset, columns, order)
+    _sync_cache(cacher, [table_name])
+
+    started = time.perf_counter()
+    rows, mapped = _table_source(table_name)
+    plan = planner.plan_query(table_name, schema, rows, where, order, limit, offset)
+    stream = _execute_plan(
+        table_name, rows, mapped, where, plan, limit, offset, columns
+    )
+    actual = sum(1 for _ in stream)
+    elapsed = time.perf_counter() - started
+
+    estimated = max(0, plan.estimated_rows - offset)
+    if limit is not None:
+        estimated = min(estimated, limit)
+    print(MSG_EXPLAIN_TABLE.format(table=table_name, rows=plan.table_rows))
+    print(
+        MSG_EXPLAIN_ACCESS.format(
+            access=_access_label(plan.access),
+            candidates=plan.access.rows,
+            cost=plan.access.cost,
+        )
+    )
+    for path in plan.alternatives:
+        print(
+            MSG_EXPLAIN_ALTERNATIVE.format(
+                access=_access_label(path), candidates=path.rows, cost=path.cost
+            )
+        )
+    if plan.order is not None:
+        column, desc = plan.order
+        label = EXPLAIN_ORDER_LABELS[plan.order_method].format(column=column)
+        direction = EXPLAIN_DIRECTIONS[int(desc)]
+        print(
+            MSG_EXPLAIN_ORDER.format(order=label, direction=direction, cost=plan.cost)
+        )
+    print(
+        MSG_EXPLAIN_ROWS.format(estimated=estimated, actual=actual, ms=elapsed * 1000)
+    )
+    if cacher.contains(key):
+        print(MSG_EXPLAIN_CACHED)
+    return None
+
+
+@log_time
+@handle_db_errors
+def update_rows(table_name, set_clause, where_clause, cacher):
+    """Обновить строки таблицы по условию."""
+    with _autocommit([table_name], cacher):
+        metadata = load_metadata()
+        schema = _get_schema(metadata, table_name)
+        cols = schema["columns"]
+
+        _ensure_columns_exist(cols, set_clause)
+        if ID_COL_NAME in set_clause:
+            # ID задаёт порядок строк и хранится в индексах.
+            raise ValidationError('Столбец "ID" изменять нельзя.')
+
+        typed_set = _coerce_clause(cols, set_clause, _is_columnar(table_name))
+        typed_where = _prepare_where(cols, where_clause)
+
+        rows = list(load_table_data(table_name))
+        positions = _matching_positions(table_name, schema, rows, typed_where)
+        changes = []
+        for pos in positions:
+            row = dict(rows[pos])
+            row.update(typed_set)
+            changes.append((rows[pos], row))
+            rows[pos] = row
+        count = len(positions)
+
+        save_table_data(table_name, rows)
+        indexes.on_update(table_name, schema, rows, changes, columns=typed_set)
+    cacher.on_update(table_name, changes)
+
+    results.set_rowcount(count)
     print(MSG_UPDATED.format(count=count, table=table_name))
     return None
 
@@ -164,26 +867,241 @@ def update_rows(table_name, set_clause, where_clause, cacher):
 @handle_db_errors
 def delete_rows(table_name, where_clause, cacher):
     """Удалить строки по условию."""
+    with _autocommit([table_name], cacher):
+        metadata = load_metadata()
+        schema = _get_schema(metadata, table_name)
+        cols = schema["columns"]
+
+        typed_where = _prepare_where(cols, where_clause)
+
+        rows = load_table_data(table_name)
+        positions = set(_matching_positions(table_name, schema, rows, typed_where))
+        kept = [row for pos, row in enumerate(rows) if pos not in positions]
+        removed = [rows[pos] for pos in sorted(positions)]
+        deleted = len(positions)
+
+        save_table_data(table_name, kept)
+        indexes.on_delete(table_name, schema, kept, removed)
+    cacher.on_delete(table_name, removed)
+
+    results.set_rowcount(deleted)
+    print(MSG_DELETED.format(count=deleted, table=table_name))
+    return None
+
+
+@handle_db_errors
+def begin():
+    """Начать транзакцию: изменения копятся в памяти до commit или rollback."""
+    if in_transaction():
+        raise ValidationError(MSG_TXN_ACTIVE)
+    begin_transaction()
+    print(MSG_TXN_BEGUN)
+    return None
+
+
+@log_time
+@handle_db_errors
+def commit(cacher):
+    """
+    Зафиксировать транзакцию: все её операторы попадают в журнал одной
+    записью с одним сбросом на диск, каждый файл пишется один раз.
+    """
+    if not in_transaction():
+        raise ValidationError(MSG_TXN_NOT_ACTIVE)
+    changed = _commit(cacher)
+    print(MSG_TXN_COMMITTED.format(count=len(changed)))
+    return None
+
+
+@handle_db_errors
+def rollback(cacher):
+    """Отменить транзакцию: файлы таблиц не менялись, кэш select сбрасывается."""
+    if not in_transaction():
+        raise ValidationError(MSG_TXN_NOT_ACTIVE)
+    for table_name in rollback_transaction():
+        cacher.invalidate(table_name)
+    print(MSG_TXN_ROLLED_BACK)
+    return None
+
+
+@handle_db_errors
+def recover():
+    """
+    Восстановление после сбоя (при запуске): повторить зафиксированные
+    транзакции из журнала и очистить его.
+
+    Повтор безопасен, даже если транзакция уже успела попасть в файлы:
+    строки записываются целиком по ID, удаляются тоже по ID, а last_id
+    только растёт. Индексы изменённых таблиц перестраиваются.
+    """
+    if next(iter(read_wal()), None) is None:
+        checkpoint()
+        return None
+    with _autocommit(()):
+        # Записи журнала перечитываются под блокировками их таблиц: другие
+        # процессы могли дописать журнал после его первого чтения.
+        records = lock_wal_tables()
+        _replay_wal(records)
+    mark_applied(records)
+    checkpoint()
+    count = sum(1 for record in records if "tables" in record)
+    print(MSG_RECOVERED.format(count=count))
+    return None
+
+
+def _replay_wal(records):
     metadata = load_metadata()
-    schema = _get_schema(metadata, table_name)
-    cols = schema["columns"]
+    tables = {}
+    for record in records:
+        if "dropped" in record:
+            tables.pop(record["dropped"], None)
+            continue
+        for table_name, change in record.get("tables", {}).items():
+            schema = metadata.get(table_name)
+            if schema is None:
+                continue
+            by_id = tables.get(table_name)
+            if by_id is None:
+                by_id = {row[ID_COL_NAME]: row for row in load_table_data(table_name)}
+                tables[table_name] = by_id
+            for row in change["put"]:
+                by_id[row[ID_COL_NAME]] = row
+            for row_id in change["delete"]:
+                by_id.pop(row_id, None)
+            last_id = max([int(schema["last_id"]), change.get("last_id", 0), *by_id])
+            schema["last_id"] = last_id
+
+    for table_name, by_id in tables.items():
+        rows = [by_id[row_id] for row_id in sorted(by_id)]
+        save_table_data(table_name, rows)
+        for column, kind in indexes.indexed_columns(metadata[table_name]).items():
+            indexes.create_index(table_name, column, rows, kind)
+    save_metadata(metadata)
 
-    _ensure_columns_exist(cols, where_clause)
-    typed_where = _coerce_clause(cols, where_clause)
 
-    rows = load_table_data(table_name)
-    kept = []
-    deleted = 0
-    for row in rows:
-        if _row_matches(row, typed_where):
-            deleted += 1
+@handle_db_errors
+def shutdown():
+    """Завершение работы: отменить незафиксированную транзакцию, очистить журнал."""
+    if in_transaction():
+        rollback_transaction()
+        print(MSG_TXN_ABORTED)
+    checkpoint()
+    return None
+
+
+@contextmanager
+def _autocommit(table_names, cacher=None):
+    """
+    Выполнить запись в транзакции: в начатой командой begin или, если её
+    нет, в собственной, которая фиксируется сразу после оператора.
+
+    Таблицы table_names блокируются до фиксации ещё до чтения, поэтому
+    оператор видит последние зафиксированные данные, и записи других
+    процессов не теряются. Кэш select сверяется с таблицей после её
+    блокировки.
+    """
+    own = not in_transaction()
+    if own:
+        begin_transaction()
+    try:
+        for table_name in table_names:
+            if lock_table(table_name) and cacher is not None:
+                cacher.sync(table_name, table_stamp(table_name))
+        yield
+    except BaseException:
+        if own:
+            rollback_transaction()
+        raise
+    if own:
+        _commit(cacher)
+
+
+def _commit(cacher):
+    """Зафиксировать транзакцию; запомнить в кэше select новые отметки таблиц."""
+    touched = transaction_tables()
+    try:
+        stamps = commit_transaction()
+    except DBError:
+        # Кэш select уже видел изменения транзакции.
+        if cacher is not None:
+            for table_name in touched:
+                cacher.invalidate(table_name)
+        raise
+    if cacher is not None:
+        for table_name, stamp in stamps.items():
+            cacher.track(table_name, stamp)
+    return stamps
+
+
+def _sync_cache(cacher, table_names):
+    """
+    Сбросить кэш select для таблиц, которые с прошлого обращения изменил
+    другой процесс (изменилась отметка файла). Таблицы, заблокированные
+    этим процессом, другие не меняют.
+    """
+    for table_name in table_names:
+        if not table_locked(table_name):
+            cacher.sync(table_name, table_stamp(table_name))
+
+
+def _ensure_no_transaction(command):
+    if in_transaction():
+        raise ValidationError(MSG_TXN_FORBIDDEN.format(command=command))
+
+
+def cache_stats(cacher):
+    """Вывести статистику кэша select."""
+    print(MSG_CACHE_STATS.format(**cacher.stats()))
+    return None
+
+
+@handle_db_errors
+def show_stats(action=None, path=None):
+    """Вывести статистику команд по фазам или сохранить её в JSON."""
+    if action == "reset":
+        metrics.reset()
+        print(MSG_STATS_RESET)
+        return None
+    if action == "json":
+        if path:
+            metrics.dump_json(path)
+            print(MSG_STATS_SAVED.format(path=path))
         else:
-            kept.append(row)
+            print(json.dumps(metrics.snapshot(), ensure_ascii=False, indent=2))
+        return None
+    report = metrics.format_report()
+    print(report or MSG_NO_STATS)
+    return None
 
-    save_table_data(table_name, kept)
-    cacher.invalidate(table_name)
 
-    print(MSG_DELETED.format(count=deleted, table=table_name))
+@handle_db_errors
+def set_profiling(action, path=None):
+    """Включить/выключить cProfile или сохранить собранный профиль."""
+    if action == "on":
+        metrics.start_profiling()
+        print(MSG_PROFILE_ON)
+    elif action == "dump":
+        if not metrics.dump_profile(path):
+            print(MSG_PROFILE_NOT_RUNNING)
+        else:
+            print(MSG_PROFILE_SAVED.format(path=path))
+    elif not metrics.profiling_enabled():
+        print(MSG_PROFILE_NOT_RUNNING)
+    else:
+        print(metrics.stop_profiling())
+        print(MSG_PROFILE_OFF)
+    return None
+
+
+@handle_db_errors
+def set_tracing(action):
+    """Включить/выключить учёт пиков памяти по командам (tracemalloc)."""
+    if action == "on":
+        metrics.start_tracing()
+        print(MSG_TRACE_ON)
+    else:
+        metrics.stop_tracing()
+        print(MSG_TRACE_OFF)
     return None
 
 
@@ -207,6 +1125,14 @@ def _parse_columns(columns):
     return parsed
 
 
+def _check_table_format(table_format):
+    if table_format not in TABLE_FORMATS:
+        allowed = ", ".join(TABLE_FORMATS)
+        raise ValidationError(
+            MSG_UNKNOWN_FORMAT.format(format=table_format, allowed=allowed)
+        )
+
+
 def _get_schema(metadata, table_name):
     if table_name not in metadata:
         raise NotFoundError(MSG_TABLE_NOT_EXISTS.format(table=table_name))
@@ -225,26 +1151,55 @@ def _ensure_columns_exist(columns, clause):
         _type_of_column(columns, key)
 
 
-def _coerce_clause(columns, clause):
+def _coerce_clause(columns, clause, columnar=False):
     result = {}
     for key, value in clause.items():
         col_type = _type_of_column(columns, key)
-        result[key] = _coerce_value(value, col_type)
+        result[key] = _coerce_value(value, col_type, columnar)
     return result
 
 
-def _coerce_value(value, expected_type):
+def _is_columnar(table_name):
+    return get_table_format(table_name) == TABLE_FORMAT_COLUMNAR
+
+
+def _prepare_where(columns, where):
+    """
+    Привести where к дереву условий (см. predicates), проверить столбцы и
+    привести значения к типам столбцов. Возвращает None для пустого where.
+    """
+    tree = predicates.from_dict(where)
+    types = {name: _type_of_column(columns, name) for name in predicates.columns(tree)}
+    for node in predicates.leaves(tree):
+        if node[0] == predicates.NODE_LIKE and types[node[1]] != "str":
+            raise ValidationError(f'like применим только к str: "{node[1]}"')
+    return predicates.map_values(
+        tree, lambda name, value: _coerce_value(value, types[name])
+    )
+
+
+def _coerce_value(value, expected_type, columnar=False):
+    """
+    Привести значение к типу столбца. Для столбцовой таблицы (columnar)
+    int проверяется на диапазон int64, в котором он хранится.
+    """
     if expected_type == "int":
         if isinstance(value, bool):
             raise ValidationError("bool нельзя использовать как int")
         if isinstance(value, int):
-            return value
-        if isinstance(value, str):
+            number = value
+        elif isinstance(value, str):
             try:
-                return int(value)
+                number = int(value)
             except ValueError as exc:
                 raise ValidationError(f"Ожидался int, получено: {value}") from exc
-        raise ValidationError(f"Ожидался int, получено: {value}")
+        else:
+            raise ValidationError(f"Ожидался int, получено: {value}")
+        if columnar and not COLUMNAR_INT_MIN <= number <= COLUMNAR_INT_MAX:
+            raise ValidationError(
+                f"Значение вне диапазона int64 столбцовой таблицы: {value}"
+            )
+        return number
 
     if expected_type == "bool":
         if isinstance(value, bool):
@@ -265,52 +1220,269 @@ def _coerce_value(value, expected_type):
     raise ValidationError(f"Неизвестный тип в схеме: {expected_type}")
 
 
-def _select_cache_key(table_name, where):
-    if not where:
-        return (table_name, None, None)
-    col = next(iter(where.keys()))
-    val = where[col]
-    return (table_name, col, _cache_value_key(val))
+def _select_order(columns, order_by, descending):
+    """Пара (столбец, по убыванию) для order by или None."""
+    if order_by is None:
+        return None
+    _type_of_column(columns, order_by)
+    return (order_by, bool(descending))
+
+
+def _access_label(path):
+    return EXPLAIN_ACCESS_LABELS[path.kind].format(column=path.column)
+
 
+def _select_cache_key(
+    table_name, where, limit=None, offset=0, columns=None, order=None
+):
+    projection = None if columns is None else tuple(columns)
+    where_key = predicates.cache_key(predicates.from_dict(where))
+    return (table_name, where_key, limit, offset, projection, order)
+
+
+def _projected_columns(columns, names):
+    """Описания выводимых столбцов в порядке запроса (все, если names пуст)."""
+    if names is None:
+        return columns
+    by_name = {col["name"]: col for col in columns}
+    for name in names:
+        if name not in by_name:
+            raise NotFoundError(f'Столбец "{name}" не найден.')
+    return [by_name[name] for name in names]
+
+
+def _projector(names):
+    """
+    Функция, оставляющая в строке только запрошенные столбцы.
+
+    ID сохраняется всегда: по нему кэш select обновляет результат на месте.
+    """
+    if names is None:
+        return None
+    keep = [ID_COL_NAME] + [name for name in names if name != ID_COL_NAME]
 
-def _cache_value_key(val):
-    if isinstance(val, bool):
-        return ("bool", "true" if val else "false")
-    if isinstance(val, int):
-        return ("int", str(val))
-    return ("str", str(val))
+    def project(row):
+        return {name: row[name] for name in keep}
 
+    return project
 
-def _select_impl(table_name, where):
-    rows = load_table_data(table_name)
-    if not where:
-        return rows
-    return [row for row in rows if _row_matches(row, where)]
 
+def _select_impl(
+    table_name, schema, where, limit=None, offset=0, columns=None, order=None
+):
+    """
+    Лениво выдавать подходящие строки, пропустив offset и не больше limit.
 
-def _row_matches(row, where):
-    for key, value in where.items():
-        if key not in row:
-            return False
-        if row[key] != value:
-            return False
-    return True
+    Если задан columns, строки содержат только эти столбцы и ID; столбцовая
+    таблица декодирует только их. order — пара (столбец, по убыванию) или
+    None для порядка ID. Путь доступа выбирает планировщик.
+    """
+    rows, mapped = _table_source(table_name)
+    plan = planner.plan_query(table_name, schema, rows, where, order, limit, offset)
+    return _execute_plan(table_name, rows, mapped, where, plan, limit, offset, columns)
+
+
+def _table_source(table_name):
+    """Строки таблицы и MappedTable (для столбцовой таблицы, иначе None)."""
+    mapped = mapped_table(table_name)
+    if mapped is not None:
+        return mapped, mapped
+    return load_table_data(table_name), None
+
+
+def _execute_plan(table_name, rows, mapped, where, plan, limit, offset, columns):
+    if plan.order_method is None or plan.order == (ID_COL_NAME, False):
+        matched = _iter_matching_rows(rows, mapped, where, plan.access, columns)
+    else:
+        top = None if limit is None else offset + limit
+        matched = _iter_ordered_rows(table_name, rows, mapped, where, plan, top)
+        project = _projector(columns)
+        if project is not None:
+            matched = map(project, matched)
+    stop = None if limit is None else offset + limit
+    return islice(matched, offset, stop)
+
+
+def _iter_matching_rows(rows, mapped, where, access, columns=None):
+    """Подходящие строки в порядке ID, только столбцы columns и ID."""
+    if mapped is not None:
+        return _scan_mapped(mapped, where, access, columns)
+    if where:
+        positions = _iter_matching_positions(rows, where, access)
+        matched = (rows[pos] for pos in positions)
+    else:
+        matched = iter(rows)
+    project = _projector(columns)
+    if project is not None:
+        matched = map(project, matched)
+    return matched
+
+
+def _iter_ordered_rows(table_name, rows, mapped, where, plan, top=None):
+    """
+    Подходящие строки в порядке столбца order_by (при равенстве — по ID).
+
+    Порядок ID уже есть в таблице: список строк обходится с конца. При
+    обходе sorted-индекса ID берутся из него в нужном порядке (только из
+    диапазона, допустимого условием на этот столбец) и строки читаются по
+    одной, так что с limit таблица не сортируется целиком. Иначе подходящие
+    строки сортируются с ограниченной памятью (см. sorting.sort_rows);
+    top — сколько первых строк понадобится (None — все).
+    """
+    order_by, descending = plan.order
+    if plan.order_method == planner.ORDER_ID and mapped is None:
+        positions = list(_iter_matching_positions(rows, where, plan.access))
+        return (rows[pos] for pos in reversed(positions))
+
+    if plan.order_method != planner.ORDER_INDEX:
+        matched = _iter_matching_rows(rows, mapped, where, plan.access)
+        if order_by == ID_COL_NAME:
+            key = _row_id_key
+        else:
+
+            def key(row):
+                return (row[order_by], row[ID_COL_NAME])
+
+        return sorting.sort_rows(matched, key, reverse=descending, limit=top)
+
+    buffer, spans = indexes.sorted_spans(table_name, order_by, rows, where, force=True)
+    if descending:
+        ids = (
+            row_id
+            for start, stop in reversed(spans)
+            for row_id in reversed(buffer.ids[start:stop])
+        )
+    else:
+        ids = (row_id for start, stop in spans for row_id in buffer.ids[start:stop])
+    if mapped is not None:
+        found = _mapped_rows_in_order(mapped, ids)
+    else:
+        found = _log_rows_in_order(rows, ids)
+    return filter(predicates.compile_where(where), found)
+
+
+def _row_id_key(row):
+    return row[ID_COL_NAME]
+
+
+def _mapped_rows_in_order(mapped, ids):
+    """Строки столбцовой таблицы в порядке ids, пачками по RENDER_PAGE_ROWS."""
+    for chunk in transfer.chunked(ids, RENDER_PAGE_ROWS):
+        by_id = {row[ID_COL_NAME]: row for row in mapped.rows_by_ids(chunk, None)}
+        for row_id in chunk:
+            if row_id in by_id:
+                yield by_id[row_id]
+
+
+def _log_rows_in_order(rows, ids):
+    for row_id in ids:
+        pos = indexes.position_of_id(rows, row_id)
+        if pos is not None:
+            yield rows[pos]
+
+
+def _scan_mapped(mapped, where, access, columns=None):
+    """Строки столбцовой таблицы через mmap: по индексу или сканом столбцов."""
+    names = None
+    if columns is not None:
+        names = [ID_COL_NAME] + [name for name in columns if name != ID_COL_NAME]
+    ids = access.fetch()
+    if ids is None:
+        return mapped.scan(where, names)
+    # Строки по индексу ещё проверяются по where, поэтому столбцы условия
+    # декодируются вместе с выводимыми и отбрасываются после проверки.
+    extra = []
+    if names is not None:
+        extra = [c for c in predicates.columns(where) if c not in names]
+    rows = mapped.rows_by_ids(ids, None if names is None else names + extra)
+    matched = filter(predicates.compile_where(where), rows)
+    if not extra:
+        return matched
+    return ({name: row[name] for name in names} for row in matched)
+
+
+def _collect(rows, sink):
+    for row in rows:
+        sink.append(row)
+        yield row
+
+
+@metrics.timed_phase(metrics.PHASE_FILTER)
+def _matching_positions(table_name, schema, rows, where):
+    """Позиции строк, подходящих под where; по индексу, если он дешевле."""
+    plan = planner.plan_query(table_name, schema, rows, where)
+    return list(_iter_matching_positions(rows, where, plan.access))
+
+
+def _iter_matching_positions(rows, where, access):
+    ids = access.fetch()
+    if ids is None:
+        candidates = range(len(rows))
+    else:
+        candidates = indexes.positions_for_ids(rows, ids)
+    match = predicates.compile_where(where)
+    return (pos for pos in candidates if match(rows[pos]))
 
 
 def _print_rows(columns, rows):
+    """
+    Вывести строки таблицей постранично, по RENDER_PAGE_ROWS строк. При
+    сборе результата (results.capture) строки сохраняются как данные.
+    """
+    field_names = [col["name"] for col in columns]
+    if results.capturing():
+        with metrics.phase(metrics.PHASE_FILTER):
+            results.add_rows(field_names, rows)
+        return
+
     try:
         from prettytable import PrettyTable
     except ImportError as exc:
         raise ValidationError("PrettyTable не установлен") from exc
 
-    field_names = [col["name"] for col in columns]
-    table = PrettyTable()
-    table.field_names = field_names
-
-    for row in rows:
-        table.add_row([_to_display(row.get(name)) for name in field_names])
-
-    print(table)
+    widths = None
+    pages = transfer.chunked(rows, RENDER_PAGE_ROWS)
+
+    while True:
+        # Строки select вычисляются лениво, поэтому получение страницы —
+        # это фаза фильтрации, а её вывод — фаза отрисовки.
+        with metrics.phase(metrics.PHASE_FILTER):
+            page = next(pages, None)
+        if page is None:
+            break
+        with metrics.phase(metrics.PHASE_RENDER):
+            cells = [
+                [_to_display(row.get(name)) for name in field_names] for row in page
+            ]
+            table = PrettyTable()
+            table.field_names = field_names
+            table.add_rows(cells)
+            if widths is None:
+                # Ширины столбцов задаёт первая страница: следующие
+                # дополняются до них, а более длинные значения переносятся,
+                # чтобы все страницы складывались в одну таблицу.
+                widths = _column_widths(field_names, cells)
+                print(table)
+            else:
+                table.min_width = widths
+                table.max_width = widths
+                # Без шапки и верхней границы: её заменяет нижняя граница
+                # прошлой страницы той же ширины.
+                print(table.get_string(header=False).split("\n", 1)[1])
+
+    if widths is None:
+        table = PrettyTable()
+        table.field_names = field_names
+        print(table)
+
+
+def _column_widths(field_names, cells):
+    """Ширина каждого столбца: самая длинная строка заголовка или значения."""
+    widths = {}
+    for index, name in enumerate(field_names):
+        values = [name] + [str(row[index]) for row in cells]
+        widths[name] = max(len(line) for value in values for line in value.split("\n"))
+    return widths
 
 
 def _to_display(value):
@@ -1,42 +1,64 @@
+import sys
 import time
+from collections import OrderedDict
 
 import prompt
 
+from primitive_db import metrics, results
 from primitive_db.constants import (
+    ID_COL_NAME,
     MSG_CONFIRM_TEMPLATE,
     MSG_OPERATION_CANCELED,
-    MSG_TIME_TEMPLATE,
+    SELECT_CACHE_MAX_BYTES,
+    SELECT_CACHE_MAX_ENTRIES,
 )
 from primitive_db.exceptions import DBError
 
+# Fixed answer to confirm_action prompts ("y" or "n") in server and batch
+# modes, where nobody is there to answer; None asks the user.
+_confirm_answer = None
+
+
+def set_confirm_answer(answer):
+    """Answer every confirm_action prompt with answer; None asks the user."""
+    global _confirm_answer
+    _confirm_answer = answer
+
 
 def handle_db_errors(func):
-    """Centralized error handling for DB operations."""
+    """
+    Centralized error handling for DB operations.
+
+    The error is printed, or recorded in the collected command result
+    (see results.capture) together with the exception.
+    """
 
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
         except DBError as e:
-            print(f"Ошибка: {e}")
+            results.error(f"Ошибка: {e}", e)
             return None
-        except FileNotFoundError:
-            print(
+        except FileNotFoundError as e:
+            results.error(
                 "Ошибка: Файл данных не найден. Возможно, база данных не "
-                "инициализирована."
+                "инициализирована.",
+                e,
             )
             return None
         except KeyError as e:
-            print(f"Ошибка: Таблица или столбец {e} не найден.")
+            results.error(f"Ошибка: Таблица или столбец {e} не найден.", e)
             return None
         except ValueError as e:
-            print(f"Ошибка валидации: {e}")
+            results.error(f"Ошибка валидации: {e}", e)
             return None
         except Exception as e:
-            print(f"Произошла непредвиденная ошибка: {e}")
+            results.error(f"Произошла непредвиденная ошибка: {e}", e)
             return None
 
     wrapper.__name__ = getattr(func, "__name__", "wrapper")
     wrapper.__doc__ = getattr(func, "__doc__", None)
+    wrapper.__wrapped__ = func
     return wrapper
 
 
@@ -45,67 +67,248 @@ def confirm_action(action_name):
 
     def decorator(func):
         def wrapper(*args, **kwargs):
-            answer = prompt.string(
-                MSG_CONFIRM_TEMPLATE.format(action=action_name)
-            ).strip()
+            answer = _confirm_answer
+            if answer is None:
+                with metrics.phase(metrics.PHASE_CONFIRM):
+                    answer = prompt.string(
+                        MSG_CONFIRM_TEMPLATE.format(action=action_name)
+                    ).strip()
             if answer.lower() != "y":
-                print(MSG_OPERATION_CANCELED)
+                results.error(MSG_OPERATION_CANCELED)
                 return None
             return func(*args, **kwargs)
 
         wrapper.__name__ = getattr(func, "__name__", "wrapper")
         wrapper.__doc__ = getattr(func, "__doc__", None)
+        wrapper.__wrapped__ = func
         return wrapper
 
     return decorator
 
 
 def log_time(func):
-    """Logs execution time of a function."""
+    """Records execution time of a function in the metrics registry."""
 
     def wrapper(*args, **kwargs):
-        start = time.monotonic()
-        result = func(*args, **kwargs)
-        end = time.monotonic()
-        print(MSG_TIME_TEMPLATE.format(name=func.__name__, seconds=end - start))
-        return result
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.observe_function(func.__name__, time.perf_counter() - start)
 
     wrapper.__name__ = getattr(func, "__name__", "wrapper")
     wrapper.__doc__ = getattr(func, "__doc__", None)
+    wrapper.__wrapped__ = func
     return wrapper
 
 
-def create_cacher():
+def create_cacher(
+    max_entries=SELECT_CACHE_MAX_ENTRIES, max_bytes=SELECT_CACHE_MAX_BYTES
+):
     """
     Closure cache for select results.
 
-    Returns function cache_result(key, value_func) with:
+    Entries are kept in LRU order and bounded both by count and by the
+    approximate size of the cached rows. Results are stored and returned as
+    shared tuples (no copying), so callers must not mutate the row dicts.
+
+    An entry may carry a match(row) predicate equal to the select's where.
+    Writes then patch only the affected entries instead of dropping every
+    key of the table: inserted rows are appended where they match, updated
+    rows are replaced/added/removed according to their old and new values,
+    and deleted rows are filtered out. Entries without a predicate are
+    dropped on any write to their table. An entry may also carry a
+    project(row) function (a select with a column list); rows patched in are
+    passed through it, so they have the same shape as the cached ones.
+    Cached rows must keep their ID for patching to work.
+
+    Other processes may write the same tables. Callers report the version
+    stamp of a table file with sync() before reading the table; when it
+    differs from the one seen last time, the table's entries are dropped.
+    After their own writes they record the new stamp with track().
+
+    Returns function cache_result(key, value_func, match=None) with:
     - cache_result.was_hit: bool of last call
+    - cache_result.lookup(key): cached tuple or None (counts hit/miss)
+    - cache_result.contains(key): whether key is cached (no counting, no LRU)
+    - cache_result.store(key, rows, match=None, project=None): cache an
+      already computed result
     - cache_result.invalidate(table_name): invalidate all keys for table
+    - cache_result.on_insert(table_name, rows)
+    - cache_result.on_update(table_name, changes): changes of (old, new) rows
+    - cache_result.on_delete(table_name, rows)
+    - cache_result.sync(table_name, stamp): drop table keys if stamp changed
+    - cache_result.track(table_name, stamp): remember stamp of own write
+    - cache_result.stats(): dict with hit/miss/eviction counters and usage
     """
 
-    cache = {}
+    cache = OrderedDict()
+    sizes = {}
+    matchers = {}
+    projectors = {}
+    stamps = {}
+    counters = {"hits": 0, "misses": 0, "evictions": 0, "patches": 0, "bytes": 0}
+
+    def cache_result(key, value_func, match=None):
+        value = lookup(key)
+        if value is not None:
+            return value
+        value = tuple(value_func())
+        store(key, value, match)
+        return value
 
-    def cache_result(key, value_func):
+    def lookup(key):
         if key in cache:
+            cache.move_to_end(key)
+            counters["hits"] += 1
             cache_result.was_hit = True
-            return _clone_rows(cache[key])
+            return cache[key]
+        counters["misses"] += 1
         cache_result.was_hit = False
-        value = value_func()
-        cache[key] = _clone_rows(value)
-        return _clone_rows(value)
+        return None
 
-    def invalidate(table_name):
-        to_delete = [
-            k for k in cache if isinstance(k, tuple) and k and k[0] == table_name
+    def contains(key):
+        return key in cache
+
+    def store(key, value, match=None, project=None):
+        value = tuple(value)
+        _drop(key)
+        size = _approx_size(value)
+        if max_entries <= 0 or size > max_bytes:
+            return
+        cache[key] = value
+        sizes[key] = size
+        matchers[key] = match
+        if project is not None:
+            projectors[key] = project
+        counters["bytes"] += size
+        _evict()
+
+    def _evict():
+        while len(cache) > max_entries or counters["bytes"] > max_bytes:
+            _drop(next(iter(cache)))
+            counters["evictions"] += 1
+
+    def _drop(key):
+        cache.pop(key, None)
+        matchers.pop(key, None)
+        projectors.pop(key, None)
+        counters["bytes"] -= sizes.pop(key, 0)
+
+    def _replace(key, value):
+        counters["patches"] += 1
+        size = _approx_size(value)
+        if size > max_bytes:
+            _drop(key)
+            return
+        cache[key] = value
+        counters["bytes"] += size - sizes[key]
+        sizes[key] = size
+
+    def _shaped(key, row):
+        project = projectors.get(key)
+        return row if project is None else project(row)
+
+    def _table_keys(table_name):
+        # A join key starts with a tuple of tables and belongs to each of them.
+        return [
+            k
+            for k in cache
+            if isinstance(k, tuple) and k and _key_has_table(k[0], table_name)
         ]
-        for k in to_delete:
-            cache.pop(k, None)
+
+    def invalidate(table_name):
+        for k in _table_keys(table_name):
+            _drop(k)
+
+    def on_insert(table_name, rows):
+        for key in _table_keys(table_name):
+            match = matchers[key]
+            if match is None:
+                _drop(key)
+                continue
+            added = tuple(_shaped(key, row) for row in rows if match(row))
+            if added:
+                _replace(key, cache[key] + added)
+        _evict()
+
+    def on_update(table_name, changes):
+        for key in _table_keys(table_name):
+            match = matchers[key]
+            if match is None:
+                _drop(key)
+                continue
+            removed = {old[ID_COL_NAME] for old, _ in changes if match(old)}
+            added = [_shaped(key, new) for _, new in changes if match(new)]
+            if not removed and not added:
+                continue
+            kept = [row for row in cache[key] if row[ID_COL_NAME] not in removed]
+            merged = sorted(kept + added, key=_row_id)
+            _replace(key, tuple(merged))
+        _evict()
+
+    def on_delete(table_name, rows):
+        for key in _table_keys(table_name):
+            match = matchers[key]
+            if match is None:
+                _drop(key)
+                continue
+            removed = {row[ID_COL_NAME] for row in rows if match(row)}
+            if removed:
+                kept = tuple(r for r in cache[key] if r[ID_COL_NAME] not in removed)
+                _replace(key, kept)
+
+    def sync(table_name, stamp):
+        if stamps.get(table_name, stamp) != stamp:
+            invalidate(table_name)
+        stamps[table_name] = stamp
+
+    def track(table_name, stamp):
+        stamps[table_name] = stamp
+
+    def stats():
+        return {
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "evictions": counters["evictions"],
+            "patches": counters["patches"],
+            "entries": len(cache),
+            "bytes": counters["bytes"],
+            "max_entries": max_entries,
+            "max_bytes": max_bytes,
+        }
 
     cache_result.was_hit = False
+    cache_result.lookup = lookup
+    cache_result.contains = contains
+    cache_result.store = store
     cache_result.invalidate = invalidate
+    cache_result.on_insert = on_insert
+    cache_result.on_update = on_update
+    cache_result.on_delete = on_delete
+    cache_result.sync = sync
+    cache_result.track = track
+    cache_result.stats = stats
     return cache_result
 
 
-def _clone_rows(rows):
-    return [dict(r) for r in rows]
+def _key_has_table(head, table_name):
+    if isinstance(head, tuple):
+        return table_name in head
+    return head == table_name
+
+
+def _row_id(row):
+    return row[ID_COL_NAME]
+
+
+def _approx_size(rows, sample=32):
+    """Estimate memory held by rows from a sample of them."""
+    size = sys.getsizeof(rows)
+    if not rows:
+        return size
+    picked = rows[:: max(1, len(rows) // sample)][:sample]
+    per_row = sum(
+        sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values()) for r in picked
+    ) / len(picked)
+    return size + int(per_row * len(rows))
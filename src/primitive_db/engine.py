@@ -1,5 +1,6 @@
 import prompt
 
+from primitive_db import metrics, results
 from primitive_db.constants import (
     APP_TITLE,
     HELP_TEXT,
@@ -8,17 +9,35 @@ from primitive_db.constants import (
     PROMPT_TEXT,
 )
 from primitive_db.core import (
+    aggregate_rows,
+    begin,
+    bulk_insert,
+    cache_stats,
+    commit,
+    convert_table,
+    create_index,
     create_table,
     delete_rows,
     drop_table,
+    explain_select,
+    export_rows,
+    import_rows,
     insert_row,
+    insert_rows,
+    join_rows,
     list_tables,
+    recover,
+    rollback,
     select_rows,
+    set_profiling,
+    set_tracing,
+    show_stats,
+    shutdown,
     update_rows,
 )
 from primitive_db.decorators import create_cacher
 from primitive_db.exceptions import ParseError
-from primitive_db.parser import parse_command
+from primitive_db.parser import bind_params, parse_command
 
 
 def run():
@@ -28,6 +47,7 @@ def run():
     print(HELP_TEXT)
     print()
 
+    recover()
     cacher = create_cacher()
 
     while True:
@@ -39,32 +59,68 @@ def run():
         except KeyboardInterrupt:
             print()
             break
-        try:
-            cmd = parse_command(line)
-        except ParseError as exc:
-            print(MSG_INVALID_VALUE.format(value=str(exc)))
-            continue
+        if not execute_line(line, cacher):
+            break
+    shutdown()
 
-        kind = cmd.get("kind")
 
-        if kind == "empty":
-            continue
+def execute_line(line, cacher):
+    """
+    Разобрать и выполнить одну строку команды с замером в статистику.
 
-        if kind == "help":
-            print()
-            print(HELP_TEXT)
-            print()
-            continue
+    Вывод идёт в терминал или, внутри results.capture(), в результат
+    команды. Возвращает False для команды exit.
+    """
+    with metrics.command() as current:
+        cmd = parse_line(line)
+        return cmd is None or execute_command(cmd, cacher, current)
 
-        if kind == "exit":
-            break
 
-        if kind == "unknown":
-            name = cmd.get("name") or "?"
-            print(MSG_UNKNOWN_FUNCTION.format(name=name))
-            continue
+# Служебные команды не попадают в статистику, чтобы не искажать её.
+_UNTIMED_KINDS = ("empty", "help", "exit", "unknown", "stats", "profile", "trace")
+
+
+def parse_line(line):
+    """
+    Разобрать строку команды; при ошибке сообщить о ней и вернуть None.
+    Параметров у строки нет, поэтому место "?" без кавычек — ошибка.
+    """
+    try:
+        with metrics.phase(metrics.PHASE_PARSE):
+            return bind_params(parse_command(line))
+    except ParseError as exc:
+        results.error(MSG_INVALID_VALUE.format(value=str(exc)), exc)
+        return None
+
+
+def execute_command(cmd, cacher, current):
+    """
+    Выполнить разобранную команду; current — замер metrics.command(), в
+    котором она выполняется. Возвращает False для команды exit.
+    """
+    kind = cmd.get("kind")
+
+    if kind == "empty":
+        return True
+
+    if kind == "help":
+        print()
+        print(HELP_TEXT)
+        print()
+        return True
 
-        _dispatch(cmd, cacher)
+    if kind == "exit":
+        return False
+
+    if kind == "unknown":
+        name = cmd.get("name") or "?"
+        results.error(MSG_UNKNOWN_FUNCTION.format(name=name))
+        return True
+
+    if kind not in _UNTIMED_KINDS:
+        current.kind = kind
+    _dispatch(cmd, cacher)
+    return True
 
 
 def _dispatch(cmd, cacher):
@@ -74,20 +130,114 @@ def _dispatch(cmd, cacher):
         list_tables()
         return
 
+    if kind == "cache_stats":
+        cache_stats(cacher)
+        return
+
+    if kind == "stats":
+        show_stats(cmd["action"], cmd["path"])
+        return
+
+    if kind == "profile":
+        set_profiling(cmd["action"], cmd["path"])
+        return
+
+    if kind == "trace":
+        set_tracing(cmd["action"])
+        return
+
+    if kind == "begin":
+        begin()
+        return
+
+    if kind == "commit":
+        commit(cacher)
+        return
+
+    if kind == "rollback":
+        rollback(cacher)
+        return
+
     if kind == "create_table":
-        create_table(cmd["table"], cmd["columns"])
+        create_table(cmd["table"], cmd["columns"], cmd["format"])
+        return
+
+    if kind == "convert_table":
+        convert_table(cmd["table"], cmd["format"])
         return
 
     if kind == "drop_table":
         drop_table(cmd["table"], cacher)
         return
 
+    if kind == "create_index":
+        create_index(cmd["table"], cmd["column"], cmd["index_kind"])
+        return
+
     if kind == "insert":
-        insert_row(cmd["table"], cmd["values_raw"], cacher)
+        rows_raw = cmd["rows_raw"]
+        if len(rows_raw) == 1:
+            insert_row(cmd["table"], rows_raw[0], cacher)
+        else:
+            insert_rows(cmd["table"], rows_raw, cacher)
+        return
+
+    if kind == "bulk_insert":
+        bulk_insert(cmd["table"], cmd["path"], cacher)
+        return
+
+    if kind == "import":
+        import_rows(cmd["table"], cmd["path"], cacher)
+        return
+
+    if kind == "export":
+        export_rows(cmd["table"], cmd["where"], cmd["path"])
+        return
+
+    if kind == "select" and cmd.get("join"):
+        join_rows(
+            cmd["table"],
+            cmd["join"]["table"],
+            cmd["join"]["on"],
+            cmd["where"],
+            cacher,
+            columns=cmd.get("columns"),
+            limit=cmd.get("limit"),
+            offset=cmd.get("offset", 0),
+            order_by=cmd.get("order_by"),
+            descending=cmd.get("descending", False),
+        )
+        return
+
+    grouped = bool(cmd.get("aggregates") or cmd.get("group_by"))
+    if kind == "select" and grouped:
+        aggregate_rows(
+            cmd["table"],
+            cmd["where"],
+            cacher,
+            cmd["columns"],
+            cmd["aggregates"],
+            cmd["group_by"],
+            limit=cmd.get("limit"),
+            offset=cmd.get("offset", 0),
+            order_by=cmd.get("order_by"),
+            descending=cmd.get("descending", False),
+        )
         return
 
-    if kind == "select":
-        select_rows(cmd["table"], cmd["where"], cacher)
+    if kind in ("select", "explain"):
+        query = select_rows if kind == "select" else explain_select
+        # explain агрегатного запроса показывает план поиска строк по where.
+        query(
+            cmd["table"],
+            cmd["where"],
+            cacher,
+            limit=cmd.get("limit"),
+            offset=cmd.get("offset", 0),
+            columns=None if grouped else cmd.get("columns"),
+            order_by=None if grouped else cmd.get("order_by"),
+            descending=cmd.get("descending", False),
+        )
         return
 
     if kind == "update":
@@ -98,4 +248,4 @@ def _dispatch(cmd, cacher):
         delete_rows(cmd["table"], cmd["where"], cacher)
         return
 
-    print(MSG_UNKNOWN_FUNCTION.format(name=kind))
+    results.error(MSG_UNKNOWN_FUNCTION.format(name=kind))
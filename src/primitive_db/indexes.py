@@ -0,0 +1,249 @@
+from bisect import bisect_left
+
+from primitive_db import predicates
+from primitive_db.constants import (
+    ID_COL_NAME,
+    INDEX_KIND_HASH,
+    INDEX_KIND_SORTED,
+    SORTED_INDEX_INSERT_MAX,
+)
+from primitive_db.utils import (
+    SortedIndexBuffer,
+    append_index_entries,
+    delete_index_file,
+    load_hash_buffer,
+    load_index,
+    load_sorted_buffer,
+    save_index_entries,
+    table_locked,
+)
+
+# Операторы, задающие непрерывный диапазон значений sorted-индекса.
+_RANGE_OPS = ("=", "<", "<=", ">", ">=")
+
+
+def indexed_columns(schema):
+    """Вернуть {столбец: вид индекса} для таблицы."""
+    return schema.get("indexes", {})
+
+
+def build_entries(rows, column):
+    """Построить пары [значение, ID] индекса по строкам таблицы."""
+    return [[row.get(column), row[ID_COL_NAME]] for row in rows]
+
+
+def create_index(table_name, column, rows, kind=INDEX_KIND_HASH):
+    """Построить индекс по столбцу и сохранить его рядом с таблицей."""
+    entries = build_entries(rows, column)
+    if kind == INDEX_KIND_SORTED:
+        entries = SortedIndexBuffer(entries)
+    save_index_entries(table_name, column, entries, kind)
+
+
+def load_hash_index(table_name, column, rows):
+    """
+    Загрузить hash-индекс {значение: [ID, ...]}.
+
+    Индекс хранит ровно одну пару на строку таблицы. Если число пар не
+    совпадает с числом строк (например, после сбоя между записью таблицы
+    и индекса), индекс перестраивается по строкам и перезаписывается.
+    Перезаписывает его только процесс, держащий блокировку записи таблицы:
+    у читателя расхождение бывает и тогда, когда другой процесс пишет
+    таблицу прямо сейчас, поэтому он строит индекс только в памяти.
+    """
+    loaded = load_index(table_name, column)
+    if loaded is None or loaded[1] != len(rows):
+        if not table_locked(table_name):
+            return _hash_mapping(build_entries(rows, column))
+        create_index(table_name, column, rows)
+        loaded = load_index(table_name, column)
+    return loaded[0]
+
+
+def load_sorted_index(table_name, column, rows):
+    """
+    Загрузить sorted-индекс (SortedIndexBuffer: values и ids по порядку).
+
+    Как и hash-индекс, перестраивается, если число пар не совпадает с
+    числом строк.
+    """
+    buffer = load_sorted_buffer(table_name, column)
+    if buffer is None or buffer.count != len(rows):
+        if not table_locked(table_name):
+            return SortedIndexBuffer(build_entries(rows, column))
+        create_index(table_name, column, rows, INDEX_KIND_SORTED)
+        buffer = load_sorted_buffer(table_name, column)
+    return buffer
+
+
+def _hash_mapping(entries):
+    """Hash-индекс {значение: [ID, ...]} по парам, без записи в файл."""
+    mapping = {}
+    for value, row_id in entries:
+        mapping.setdefault(value, []).append(row_id)
+    return mapping
+
+
+def on_insert(table_name, schema, new_rows):
+    """Дописать новые строки во все индексы таблицы."""
+    for column, kind in indexed_columns(schema).items():
+        entries = build_entries(new_rows, column)
+        append_index_entries(table_name, column, entries, kind)
+
+
+def on_update(table_name, schema, rows, changes, columns):
+    """
+    Обновить индексы изменённых столбцов после update.
+
+    rows — строки таблицы после изменения, changes — пары (старая, новая)
+    строка. Индексы правятся на месте: старые пары удаляются, новые
+    добавляются.
+    """
+    for column, kind in indexed_columns(schema).items():
+        if column not in columns:
+            continue
+        _patch_index(
+            table_name,
+            column,
+            kind,
+            rows,
+            expected=len(rows),
+            removed=[old for old, _ in changes],
+            added=[new for _, new in changes],
+        )
+
+
+def on_delete(table_name, schema, rows, removed):
+    """Обновить индексы после delete (rows — оставшиеся строки)."""
+    for column, kind in indexed_columns(schema).items():
+        _patch_index(
+            table_name,
+            column,
+            kind,
+            rows,
+            expected=len(rows) + len(removed),
+            removed=removed,
+            added=[],
+        )
+
+
+def _patch_index(table_name, column, kind, rows, expected, removed, added):
+    """
+    Удалить из индекса пары строк removed и добавить пары строк added.
+
+    Индекс перестраивается по rows, если в нём не expected пар (разошёлся
+    с таблицей) или если вставок в sorted-индекс слишком много.
+    """
+    if kind == INDEX_KIND_SORTED:
+        buffer = load_sorted_buffer(table_name, column)
+        too_many = len(removed) + len(added) > SORTED_INDEX_INSERT_MAX
+    else:
+        buffer = load_hash_buffer(table_name, column)
+        too_many = False
+    if buffer is None or buffer.count != expected or too_many:
+        create_index(table_name, column, rows, kind)
+        return
+    buffer = buffer.copy()
+    buffer.remove(build_entries(removed, column))
+    buffer.add(build_entries(added, column))
+    save_index_entries(table_name, column, buffer)
+
+
+def drop_indexes(table_name, schema):
+    """Удалить файлы всех индексов таблицы."""
+    for column in indexed_columns(schema):
+        delete_index_file(table_name, column)
+
+
+def sorted_terms(where, column):
+    """Листья where на верхнем уровне and, которые sorted-индекс учитывает."""
+    return tuple(
+        node
+        for node in predicates.conjuncts(where)
+        if predicates.leaf_column(node) == column
+        and (
+            node[0] == predicates.NODE_IN
+            or node[0] == predicates.NODE_CMP
+            and node[1] in _RANGE_OPS
+        )
+    )
+
+
+def sorted_spans(table_name, column, rows, where, force=False):
+    """
+    Диапазоны sorted-индекса столбца, точно отвечающие листьям sorted_terms.
+
+    Возвращает (буфер, [(start, stop), ...]) — отрезки в порядке значений —
+    или None, если таких листьев в where нет (при force=True тогда
+    возвращается весь индекс, это нужно для order by).
+    """
+    terms = sorted_terms(where, column)
+    if not terms and not force:
+        return None
+    buffer = load_sorted_index(table_name, column, rows)
+    start, stop = 0, buffer.count
+    values = None
+    for node in terms:
+        if node[0] == predicates.NODE_IN:
+            listed = set(node[2])
+            values = listed if values is None else values & listed
+            continue
+        lo, hi = _range_bounds(buffer, node[1], node[3])
+        start, stop = max(start, lo), min(stop, hi)
+    if stop <= start:
+        return buffer, []
+    if values is None:
+        return buffer, [(start, stop)]
+    spans = []
+    for value in sorted(values):
+        lo, hi = buffer.bounds(value, value)
+        lo, hi = max(start, lo), min(stop, hi)
+        if lo < hi:
+            spans.append((lo, hi))
+    return buffer, spans
+
+
+def _range_bounds(buffer, op, value):
+    if op == "=":
+        return buffer.bounds(value, value)
+    if op in ("<", "<="):
+        return buffer.bounds(high=value, high_inclusive=op == "<=")
+    return buffer.bounds(low=value, low_inclusive=op == ">=")
+
+
+def equality_values(node):
+    """Значения, при которых лист условия истинен: для = и in, иначе ()."""
+    if node[0] == predicates.NODE_CMP and node[1] == predicates.OP_EQ:
+        return (node[3],)
+    if node[0] == predicates.NODE_IN:
+        return node[2]
+    return ()
+
+
+def position_of_id(rows, row_id):
+    """
+    Первичный индекс: позиция строки с данным ID или None.
+
+    Строки таблицы всегда упорядочены по ID: insert дописывает строку с
+    новым наибольшим ID, update меняет строки на месте (ID изменить
+    нельзя), delete сохраняет порядок оставшихся. Поэтому позиция ищется
+    двоичным поиском за O(log n) без отдельной структуры на диске.
+    """
+    pos = bisect_left(rows, row_id, key=_row_id)
+    if pos < len(rows) and rows[pos][ID_COL_NAME] == row_id:
+        return pos
+    return None
+
+
+def positions_for_ids(rows, ids):
+    """Позиции строк с указанными ID в порядке возрастания ID."""
+    positions = []
+    for row_id in sorted(ids):
+        pos = position_of_id(rows, row_id)
+        if pos is not None:
+            positions.append(pos)
+    return positions
+
+
+def _row_id(row):
+    return row[ID_COL_NAME]
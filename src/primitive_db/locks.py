@@ -0,0 +1,86 @@
+import os
+import time
+from contextlib import contextmanager
+
+from primitive_db.constants import LOCK_POLL_SECONDS, LOCK_TIMEOUT_SECONDS
+from primitive_db.exceptions import StorageError
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки действуют только внутри процесса.
+    fcntl = None
+
+# Захваченные процессом блокировки: путь -> [дескриптор или None, счётчик].
+# Блокировка flock принадлежит открытому файлу, поэтому повторный захват
+# того же пути в процессе только увеличивает счётчик.
+_held = {}
+
+
+def acquire(path, timeout=LOCK_TIMEOUT_SECONDS):
+    """
+    Захватить исключительную блокировку файла path (создаётся при
+    необходимости). Занятая блокировка ожидается не дольше timeout секунд
+    (0 — одна попытка). Возвращает True или False, если время вышло.
+    """
+    entry = _held.get(path)
+    if entry is not None:
+        entry[1] += 1
+        return True
+    fd = None
+    if fcntl is not None:
+        fd = _lock_file(path, timeout)
+        if fd is None:
+            return False
+    _held[path] = [fd, 1]
+    return True
+
+
+def release(path):
+    """Отпустить блокировку, захваченную acquire (с учётом повторных захватов)."""
+    entry = _held[path]
+    entry[1] -= 1
+    if entry[1]:
+        return
+    del _held[path]
+    if entry[0] is not None:
+        # Закрытие файла снимает блокировку flock.
+        os.close(entry[0])
+
+
+def is_held(path):
+    """Захвачена ли блокировка path этим процессом."""
+    return path in _held
+
+
+@contextmanager
+def hold(path, timeout=LOCK_TIMEOUT_SECONDS):
+    """Держать блокировку path в блоке with; по таймауту — StorageError."""
+    if not acquire(path, timeout):
+        raise StorageError(
+            f"Не удалось получить блокировку за {timeout} с: {path} "
+            "занят другим процессом."
+        )
+    try:
+        yield
+    finally:
+        release(path)
+
+
+def _lock_file(path, timeout):
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    except OSError as exc:
+        raise StorageError(f"Ошибка открытия блокировки: {path}: {exc}") from exc
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                os.close(fd)
+                return None
+            time.sleep(LOCK_POLL_SECONDS)
+        except OSError as exc:
+            os.close(fd)
+            raise StorageError(f"Ошибка блокировки: {path}: {exc}") from exc
@@ -1,9 +1,49 @@
+import argparse
+import sys
+
+from primitive_db.constants import SERVER_HOST, SERVER_PORT
 from primitive_db.engine import run
 
 
-def main():
-    run()
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="database", description="Primitive DB")
+    parser.add_argument(
+        "-f",
+        "--file",
+        type=argparse.FileType("r", encoding="utf-8"),
+        help="выполнить команды из файла (- — из stdin) и вывести JSON Lines",
+    )
+    parser.add_argument(
+        "--yes",
+        action="store_true",
+        help="в пакетном режиме подтверждать drop_table и delete",
+    )
+    modes = parser.add_subparsers(dest="mode")
+    serve_parser = modes.add_parser("serve", help="запустить сервер (asyncio, TCP)")
+    connect_parser = modes.add_parser("connect", help="подключиться к серверу")
+    for mode_parser in (serve_parser, connect_parser):
+        mode_parser.add_argument("--host", default=SERVER_HOST)
+        mode_parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args(argv)
+
+    if args.mode == "serve":
+        from primitive_db.server import serve
+
+        serve(args.host, args.port)
+    elif args.mode == "connect":
+        from primitive_db.client import run_client
+
+        run_client(args.host, args.port)
+    elif args.file is not None or not sys.stdin.isatty():
+        from primitive_db.batch import run_batch
+
+        script = sys.stdin if args.file is None else args.file
+        with script:
+            return run_batch(script, assume_yes=args.yes)
+    else:
+        run()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,281 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from primitive_db.exceptions import StorageError
+
+PHASE_PARSE = "parse"
+PHASE_META_LOAD = "meta_load"
+PHASE_TABLE_LOAD = "table_load"
+PHASE_FILTER = "filter"
+PHASE_SAVE = "save"
+PHASE_RENDER = "render"
+PHASE_CONFIRM = "confirm"
+
+# Границы корзин гистограмм: каждая следующая вдвое больше предыдущей;
+# всё, что больше последней границы, попадает в отдельную корзину.
+# Длительности: от 1 мкс до ~134 с. Память: от 1 Б до 1 ТБ.
+SECONDS_BOUNDS = tuple(1e-6 * 2**i for i in range(28))
+BYTES_BOUNDS = tuple(float(2**i) for i in range(41))
+
+_commands = {}
+_phases = {}
+_functions = {}
+_memory = {}
+_stack = []
+_current = None
+_profiler = None
+
+
+class Histogram:
+    """Гистограмма значений с корзинами по степеням двойки."""
+
+    __slots__ = ("bounds", "count", "total", "min", "max", "buckets")
+
+    def __init__(self, bounds=SECONDS_BOUNDS):
+        self.bounds = bounds
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(bounds) + 1)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.buckets[bisect_left(self.bounds, value)] += 1
+
+    def percentile(self, q):
+        """Оценка перцентиля по верхней границе корзины (не больше max)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for pos, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                bound = self.bounds[pos] if pos < len(self.bounds) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "avg": self.total / self.count if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.50),
+            "p90": self.percentile(0.90),
+            "p99": self.percentile(0.99),
+        }
+
+
+class _Command:
+    __slots__ = ("kind", "phases")
+
+    def __init__(self):
+        self.kind = None
+        self.phases = {}
+
+
+@contextmanager
+def command():
+    """
+    Замер одной команды целиком: общее время, время по фазам и пик памяти.
+
+    Вид команды задаётся внутри блока (cmd.kind = ...), когда он известен
+    после разбора; команды без вида не учитываются.
+    """
+    global _current
+    current = _Command()
+    outer = _current
+    _current = current
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        mem_start = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        elapsed = time.perf_counter() - start
+        _current = outer
+        if current.kind is not None:
+            _record(current, elapsed)
+            if tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1] - mem_start
+                hist = _memory.setdefault(current.kind, Histogram(BYTES_BOUNDS))
+                hist.add(max(0, peak))
+
+
+def _record(current, elapsed):
+    _commands.setdefault(current.kind, Histogram()).add(elapsed)
+    for name, seconds in current.phases.items():
+        _phases.setdefault((current.kind, name), Histogram()).add(seconds)
+
+
+@contextmanager
+def phase(name):
+    """
+    Замер фазы текущей команды (parse, meta_load, table_load, filter, save,
+    render). Время считается исключительно: пока открыта вложенная фаза,
+    внешняя не идёт.
+    """
+    now = time.perf_counter()
+    if _stack:
+        outer = _stack[-1]
+        outer[2] += now - outer[1]
+    frame = [name, now, 0.0]
+    _stack.append(frame)
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        _stack.pop()
+        frame[2] += now - frame[1]
+        if _stack:
+            _stack[-1][1] = now
+        if _current is not None:
+            _current.phases[name] = _current.phases.get(name, 0.0) + frame[2]
+
+
+def timed_phase(name):
+    """Декоратор: выполнить функцию внутри phase(name)."""
+
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        wrapper.__name__ = getattr(func, "__name__", "wrapper")
+        wrapper.__doc__ = getattr(func, "__doc__", None)
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    return decorator
+
+
+def observe_function(name, seconds):
+    """Учесть длительность вызова функции (используется log_time)."""
+    _functions.setdefault(name, Histogram()).add(seconds)
+
+
+def reset():
+    """Сбросить все накопленные метрики."""
+    _commands.clear()
+    _phases.clear()
+    _functions.clear()
+    _memory.clear()
+
+
+def snapshot():
+    """Метрики в виде словаря, пригодного для JSON."""
+    commands = {}
+    for kind, hist in sorted(_commands.items()):
+        item = hist.to_dict()
+        item["phases"] = {
+            name: phase_hist.to_dict()
+            for (phase_kind, name), phase_hist in sorted(_phases.items())
+            if phase_kind == kind
+        }
+        if kind in _memory:
+            item["memory_peak_bytes"] = _memory[kind].to_dict()
+        commands[kind] = item
+    return {
+        "commands": commands,
+        "functions": {name: h.to_dict() for name, h in sorted(_functions.items())},
+        "profiling": profiling_enabled(),
+        "tracing": tracemalloc.is_tracing(),
+    }
+
+
+def dump_json(path):
+    """Записать snapshot() в JSON-файл."""
+    try:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(snapshot(), file, ensure_ascii=False, indent=2)
+    except OSError as exc:
+        raise StorageError(f"Ошибка записи файла: {path}: {exc}") from exc
+
+
+def format_report():
+    """Краткий текстовый отчёт по командам и фазам (в миллисекундах)."""
+    data = snapshot()["commands"]
+    if not data:
+        return ""
+    lines = []
+    for kind, item in data.items():
+        lines.append(
+            f"{kind}: n={item['count']} avg={_ms(item['avg'])} "
+            f"p50={_ms(item['p50'])} p99={_ms(item['p99'])} max={_ms(item['max'])}"
+        )
+        for name, ph in item["phases"].items():
+            lines.append(
+                f"  {name}: avg={_ms(ph['avg'])} p50={_ms(ph['p50'])} "
+                f"p99={_ms(ph['p99'])}"
+            )
+        if "memory_peak_bytes" in item:
+            mem = item["memory_peak_bytes"]
+            lines.append(
+                f"  memory peak: avg={int(mem['avg'])} max={int(mem['max'])} B"
+            )
+    return "\n".join(lines)
+
+
+def _ms(seconds):
+    return f"{(seconds or 0.0) * 1000:.3f}ms"
+
+
+def profiling_enabled():
+    return _profiler is not None
+
+
+def start_profiling():
+    """Включить cProfile для всего последующего выполнения."""
+    global _profiler
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def stop_profiling(limit=20):
+    """Выключить cProfile и вернуть текст с самыми дорогими функциями."""
+    global _profiler
+    if _profiler is None:
+        return ""
+    _profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(_profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+    _profiler = None
+    return out.getvalue()
+
+
+def dump_profile(path):
+    """Сохранить собранный профиль в файл pstats, не выключая профилирование."""
+    if _profiler is None:
+        return False
+    _profiler.create_stats()
+    try:
+        _profiler.dump_stats(path)
+    except OSError as exc:
+        raise StorageError(f"Ошибка записи файла: {path}: {exc}") from exc
+    _profiler.enable()
+    return True
+
+
+def start_tracing():
+    """Включить tracemalloc: у команд появится пик выделенной памяти."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stop_tracing():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
@@ -1,24 +1,73 @@
+import re
 import shlex
 
+from primitive_db import predicates
 from primitive_db.constants import (
+    AGG_COUNT,
+    AGGREGATE_FUNCS,
+    CMD_BEGIN,
+    CMD_BULK_INSERT,
+    CMD_CACHE_STATS,
+    CMD_COMMIT,
+    CMD_CONVERT_TABLE,
+    CMD_CREATE_INDEX,
     CMD_CREATE_TABLE,
     CMD_DROP_TABLE,
     CMD_EXIT,
+    CMD_EXPLAIN,
+    CMD_EXPORT,
     CMD_HELP,
+    CMD_IMPORT,
     CMD_LIST_TABLES,
+    CMD_PROFILE,
+    CMD_ROLLBACK,
+    CMD_STATS,
+    CMD_TRACE,
+    INDEX_KIND_HASH,
+    KW_AND,
+    KW_ASC,
+    KW_BY,
     KW_DELETE,
+    KW_DESC,
+    KW_FORMAT,
     KW_FROM,
+    KW_GROUP,
+    KW_IN,
     KW_INSERT,
     KW_INTO,
+    KW_JOIN,
+    KW_LIKE,
+    KW_LIMIT,
+    KW_OFFSET,
+    KW_ON,
+    KW_OR,
+    KW_ORDER,
     KW_SELECT,
     KW_SET,
+    KW_TO,
     KW_UPDATE,
+    KW_USING,
     KW_VALUES,
     KW_WHERE,
+    PARAM_PLACEHOLDER,
+    STORAGE_BACKEND,
 )
 from primitive_db.exceptions import ParseError
 
 
+class _Param:
+    """Placeholder value of a parsed command, bound later by bind_params."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return PARAM_PLACEHOLDER
+
+
+PARAM = _Param()
+_PARAM_TYPES = (bool, int, str)
+
+
 def parse_command(line):
     """
     Parse input line into command dict.
@@ -30,7 +79,23 @@ def parse_command(line):
 
     head = _first_word(text).lower()
 
-    if head in (CMD_HELP, CMD_EXIT, CMD_CREATE_TABLE, CMD_LIST_TABLES, CMD_DROP_TABLE):
+    if head in (
+        CMD_HELP,
+        CMD_EXIT,
+        CMD_CREATE_TABLE,
+        CMD_LIST_TABLES,
+        CMD_DROP_TABLE,
+        CMD_CREATE_INDEX,
+        CMD_CONVERT_TABLE,
+        CMD_CACHE_STATS,
+        CMD_BULK_INSERT,
+        CMD_STATS,
+        CMD_PROFILE,
+        CMD_TRACE,
+        CMD_BEGIN,
+        CMD_COMMIT,
+        CMD_ROLLBACK,
+    ):
         return _parse_simple(text)
 
     if head == KW_INSERT:
@@ -39,12 +104,28 @@ def parse_command(line):
     if head == KW_SELECT:
         return _parse_select(text)
 
+    if head == CMD_EXPLAIN:
+        query = text[len(CMD_EXPLAIN) :].strip()
+        if _first_word(query).lower() != KW_SELECT:
+            raise ParseError(f"Ожидается: {CMD_EXPLAIN} select ...")
+        cmd = _parse_select(query)
+        if cmd["join"] is not None:
+            raise ParseError(f"{CMD_EXPLAIN} для join не поддерживается")
+        cmd["kind"] = "explain"
+        return cmd
+
     if head == KW_UPDATE:
         return _parse_update(text)
 
     if head == KW_DELETE:
         return _parse_delete(text)
 
+    if head == CMD_IMPORT:
+        return _parse_import(text)
+
+    if head == CMD_EXPORT:
+        return _parse_export(text)
+
     return {"kind": "unknown", "name": head, "raw": text}
 
 
@@ -61,6 +142,44 @@ def _parse_simple(text):
     if cmd == CMD_LIST_TABLES:
         return {"kind": "list_tables"}
 
+    if cmd == CMD_CACHE_STATS:
+        return {"kind": "cache_stats"}
+
+    if cmd in (CMD_BEGIN, CMD_COMMIT, CMD_ROLLBACK):
+        if len(parts) != 1:
+            raise ParseError(f"Ожидается: {cmd}")
+        return {"kind": cmd}
+
+    if cmd == CMD_STATS:
+        usage = f"Ожидается: {CMD_STATS} [json [<file>] | reset]"
+        action = parts[1].lower() if len(parts) > 1 else None
+        if action not in (None, "json", "reset") or len(parts) > 3:
+            raise ParseError(usage)
+        if action != "json" and len(parts) > 2:
+            raise ParseError(usage)
+        path = parts[2] if len(parts) == 3 else None
+        return {"kind": "stats", "action": action, "path": path}
+
+    if cmd == CMD_PROFILE:
+        action = parts[1].lower() if len(parts) > 1 else None
+        if not (
+            (action in ("on", "off") and len(parts) == 2)
+            or (action == "dump" and len(parts) == 3)
+        ):
+            raise ParseError(f"Ожидается: {CMD_PROFILE} on|off|dump <file>")
+        path = parts[2] if action == "dump" else None
+        return {"kind": "profile", "action": action, "path": path}
+
+    if cmd == CMD_TRACE:
+        if len(parts) != 2 or parts[1].lower() not in ("on", "off"):
+            raise ParseError(f"Ожидается: {CMD_TRACE} on|off")
+        return {"kind": "trace", "action": parts[1].lower()}
+
+    if cmd == CMD_BULK_INSERT:
+        if len(parts) != 3:
+            raise ParseError(f"Ожидается: {CMD_BULK_INSERT} <table> <file>")
+        return {"kind": "bulk_insert", "table": parts[1], "path": parts[2]}
+
     if cmd == CMD_DROP_TABLE:
         if len(parts) != 2:
             raise ParseError(f"Ожидается: {CMD_DROP_TABLE} <table_name>")
@@ -71,7 +190,40 @@ def _parse_simple(text):
             raise ParseError(f"Ожидается: {CMD_CREATE_TABLE} <table> <col:type> ...")
         table = parts[1]
         cols = parts[2:]
-        return {"kind": "create_table", "table": table, "columns": cols}
+        table_format = STORAGE_BACKEND
+        option = f"{KW_FORMAT}="
+        if cols[-1].lower().startswith(option):
+            table_format = cols.pop()[len(option) :].lower()
+            if not cols:
+                raise ParseError(
+                    f"Ожидается: {CMD_CREATE_TABLE} <table> <col:type> ..."
+                )
+        return {
+            "kind": "create_table",
+            "table": table,
+            "columns": cols,
+            "format": table_format,
+        }
+
+    if cmd == CMD_CONVERT_TABLE:
+        if len(parts) != 3:
+            raise ParseError(f"Ожидается: {CMD_CONVERT_TABLE} <table> <format>")
+        return {"kind": "convert_table", "table": parts[1], "format": parts[2].lower()}
+
+    if cmd == CMD_CREATE_INDEX:
+        usage = f"Ожидается: {CMD_CREATE_INDEX} <table> <column> [{KW_USING} <kind>]"
+        if len(parts) == 3:
+            kind = INDEX_KIND_HASH
+        elif len(parts) == 5 and parts[3].lower() == KW_USING:
+            kind = parts[4].lower()
+        else:
+            raise ParseError(usage)
+        return {
+            "kind": "create_index",
+            "table": parts[1],
+            "column": parts[2],
+            "index_kind": kind,
+        }
 
     return {"kind": "unknown", "name": cmd, "raw": text}
 
@@ -95,10 +247,77 @@ def _parse_insert(text):
         raise ParseError("Ожидается ключевое слово values")
 
     values_part = text[text.lower().find(KW_VALUES) + len(KW_VALUES) :].strip()
-    inner = _extract_parentheses(values_part)
-    values = [_parse_literal(v) for v in _split_csv_like(inner)]
+    rows = [
+        [_parse_value(v) for v in _split_csv_like(inner)]
+        for inner in _split_tuples(values_part)
+    ]
 
-    return {"kind": "insert", "table": table, "values_raw": values}
+    return {"kind": "insert", "table": table, "rows_raw": rows}
+
+
+def parse_values_line(line):
+    """
+    Parse one tuple of values: "(<v1>, <v2>, ...)" or "<v1>, <v2>, ...".
+    Used by bulk_insert for every line of the input file.
+    """
+    s = line.strip()
+    if s.startswith("("):
+        s = _extract_parentheses(s)
+    if '"' not in s and "'" not in s and "\\" not in s:
+        return [_parse_literal(v) for v in _split_plain(s)]
+    return [_parse_literal(v) for v in _split_csv_like(s)]
+
+
+def bind_params(cmd, params=()):
+    """
+    Substitute params for the "?" placeholders of a parsed command, in the
+    order the placeholders appear in the text.
+
+    The command itself is not modified, so a parsed command can be bound
+    many times; it is returned as is when it has no placeholders.
+    """
+    params = tuple(params)
+    count = 0
+
+    def take(value):
+        nonlocal count
+        if value is not PARAM:
+            return value
+        count += 1
+        if count > len(params):
+            return value
+        param = params[count - 1]
+        if not isinstance(param, _PARAM_TYPES):
+            raise ParseError(
+                f"Неподдерживаемый тип параметра {count}: {type(param).__name__}"
+            )
+        return param
+
+    bound = dict(cmd)
+    if cmd.get("rows_raw") is not None:
+        bound["rows_raw"] = [[take(v) for v in row] for row in cmd["rows_raw"]]
+    if cmd.get("set") is not None:
+        bound["set"] = {col: take(v) for col, v in cmd["set"].items()}
+    if cmd.get("where") is not None:
+        bound["where"] = _bind_condition(cmd["where"], take)
+
+    if count != len(params):
+        raise ParseError(f"Ожидается параметров: {count}, передано: {len(params)}")
+    return bound if count else cmd
+
+
+def _bind_condition(tree, take):
+    kind = tree[0]
+    if kind in (predicates.NODE_AND, predicates.NODE_OR):
+        return (kind, tuple(_bind_condition(child, take) for child in tree[1]))
+    if kind == predicates.NODE_CMP:
+        return predicates.compare(tree[1], tree[2], take(tree[3]))
+    if kind == predicates.NODE_IN:
+        return predicates.in_list(tree[1], [take(v) for v in tree[2]])
+    pattern = take(tree[2])
+    if pattern is not PARAM and not isinstance(pattern, str):
+        raise ParseError("Шаблон like должен быть строкой")
+    return predicates.like(tree[1], pattern)
 
 
 def _parse_select(text):
@@ -106,22 +325,163 @@ def _parse_select(text):
     if not lower.startswith(f"{KW_SELECT} "):
         raise ParseError("Некорректная команда select")
 
-    words = shlex.split(text)
-    if len(words) < 3:
-        raise ParseError("Ожидается: select from <table> [where <col> = <value>]")
-
-    if words[1].lower() != KW_FROM:
-        raise ParseError("Ожидается: select from <table> ...")
+    text, limit, offset = _split_limit_offset(text)
+    text, order_by, descending = _split_order_by(text)
+    text, group_by = _split_group_by(text)
 
-    table = words[2]
+    words = shlex.split(text)
+    from_pos = _index_of_word(words, KW_FROM)
+    if from_pos is None or len(words) < from_pos + 2:
+        raise ParseError("Ожидается: select [<col>, ...] from <table> [where ...]")
+
+    columns, aggregates = _parse_projection(words[1:from_pos])
+    table = words[from_pos + 1]
+    join = None
+    if len(words) > from_pos + 2 and words[from_pos + 2].lower() == KW_JOIN:
+        if aggregates or group_by:
+            raise ParseError("Агрегаты и group by вместе с join не поддерживаются")
+        join = _parse_join(text)
+    cmd = {
+        "kind": "select",
+        "table": table,
+        "where": None,
+        "limit": limit,
+        "offset": offset,
+        "columns": columns,
+        "order_by": order_by,
+        "descending": descending,
+        "aggregates": aggregates,
+        "group_by": group_by,
+        "join": join,
+    }
 
     where_pos = _index_of_word(words, KW_WHERE)
     if where_pos is None:
-        return {"kind": "select", "table": table, "where": None}
+        if len(words) > from_pos + 2 and join is None:
+            raise ParseError("Ожидается: select from <table> [where ...] [limit <N>]")
+        return cmd
+
+    # Match "where" as a whole word: a projected column name may contain it.
+    # A trailing "where" leaves an empty condition, which is rejected below.
+    where_str = text[_WHERE.search(text).end() :].strip()
+    cmd["where"] = _parse_condition(where_str)
+    return cmd
+
+
+def _parse_projection(words):
+    """
+    Column list between select and from: None for none or "*".
 
-    where_str = text[text.lower().find(KW_WHERE) + len(KW_WHERE) :].strip()
-    where = _parse_condition(where_str)
-    return {"kind": "select", "table": table, "where": where}
+    Aggregate items such as "count(*)" or "sum(age)" are returned separately
+    as (func, column) pairs (column is None for "*"); the column list keeps
+    their normalized labels, so the output order follows the query.
+    """
+    raw = " ".join(words).strip()
+    if not raw or raw == "*":
+        return None, []
+    columns = []
+    aggregates = []
+    for name in raw.split(","):
+        name = name.strip()
+        if not name:
+            raise ParseError("Пустое имя столбца в списке select")
+        match = _AGGREGATE.match(name)
+        if match:
+            func, arg = match.group(1).lower(), match.group(2)
+            if func not in AGGREGATE_FUNCS:
+                raise ParseError(f"Неизвестная агрегатная функция: {func}")
+            if arg == "*" and func != AGG_COUNT:
+                raise ParseError(f"{func}(*) не поддерживается, укажите столбец")
+            spec = (func, None if arg == "*" else arg)
+            name = f"{func}({arg})"
+            if spec not in aggregates:
+                aggregates.append(spec)
+        if name not in columns:
+            columns.append(name)
+    return columns, aggregates
+
+
+def _parse_join(text):
+    """Parse "... join <table> on <col> = <col> [where ...]" of a select."""
+    usage = "Ожидается: select ... from <a> join <b> on <a.col> = <b.col> [where ...]"
+    lower = text.lower()
+    join_at = lower.find(f" {KW_JOIN} ")
+    on_at = lower.find(f" {KW_ON} ", join_at)
+    if on_at == -1:
+        raise ParseError(usage)
+    table = text[join_at + len(KW_JOIN) + 2 : on_at].strip()
+    where = _WHERE.search(text, on_at)
+    end = len(text) if where is None else where.start()
+    match = _JOIN_ON.match(text[on_at + len(KW_ON) + 2 : end])
+    if not table or " " in table or match is None:
+        raise ParseError(usage)
+    return {"table": table, "on": (match.group(1), match.group(2))}
+
+
+def _split_group_by(text):
+    """Cut a trailing "group by <col>[, <col> ...]" clause off a query."""
+    match = _GROUP_BY.search(text)
+    if match is None:
+        return text, []
+    names = [name.strip() for name in match.group(1).split(",")]
+    return text[: match.start()], names
+
+
+def _split_limit_offset(text):
+    """Cut trailing "limit N" / "offset M" clauses (in any order) off a query."""
+    limit = None
+    offset = 0
+    seen = set()
+    while True:
+        try:
+            words = shlex.split(text)
+        except ValueError as e:
+            raise ParseError(f"Некорректная команда: {e}") from e
+        if len(words) < 2:
+            break
+        keyword = words[-2].lower()
+        if keyword not in (KW_LIMIT, KW_OFFSET) or keyword in seen:
+            break
+        pos = _find_trailing_keyword(text, keyword, [words[-1]])
+        if pos is None:
+            break
+        if not words[-1].isdigit():
+            raise ParseError(f"Ожидается неотрицательное целое после {keyword}")
+        value = int(words[-1])
+        if keyword == KW_LIMIT:
+            limit = value
+        else:
+            offset = value
+        seen.add(keyword)
+        text = text[:pos]
+    return text, limit, offset
+
+
+def _split_order_by(text):
+    """Cut a trailing "order by <col> [asc|desc]" clause off a query."""
+    try:
+        words = shlex.split(text)
+    except ValueError as e:
+        raise ParseError(f"Некорректная команда: {e}") from e
+    descending = False
+    tail = words[-3:]
+    if words and words[-1].lower() in (KW_ASC, KW_DESC):
+        descending = words[-1].lower() == KW_DESC
+        tail = words[-4:]
+    if len(tail) < 3 or tail[0].lower() != KW_ORDER or tail[1].lower() != KW_BY:
+        return text, None, False
+    pos = _find_trailing_keyword(text, KW_ORDER, tail[1:])
+    if pos is None:
+        return text, None, False
+    return text[:pos], tail[2], descending
+
+
+_AGGREGATE = re.compile(r"^(\w+)\s*\(\s*(\*|[^()\s]+)\s*\)$")
+_WHERE = re.compile(rf"\s{KW_WHERE}(?:\s|$)", re.IGNORECASE)
+_JOIN_ON = re.compile(r"^\s*([^\s=]+)\s*=\s*([^\s=]+)\s*$")
+_GROUP_BY = re.compile(
+    rf"\s+{KW_GROUP}\s+{KW_BY}\s+(\w+(?:\s*,\s*\w+)*)\s*$", re.IGNORECASE
+)
 
 
 def _parse_update(text):
@@ -153,6 +513,8 @@ def _parse_update(text):
 
 def _parse_delete(text):
     words = shlex.split(text)
+    if len(words) == 4 and words[3].lower() == KW_WHERE:
+        raise ParseError("Пустое условие where")
     if len(words) < 5:
         raise ParseError("Ожидается: delete from <table> where <col> = <value>")
 
@@ -171,6 +533,52 @@ def _parse_delete(text):
     return {"kind": "delete", "table": table, "where": where_clause}
 
 
+def _parse_import(text):
+    words = shlex.split(text)
+    if len(words) != 4 or words[2].lower() != KW_FROM:
+        raise ParseError(f"Ожидается: {CMD_IMPORT} <table> from <file>")
+    return {"kind": "import", "table": words[1], "path": words[3]}
+
+
+def _parse_export(text):
+    usage = f"Ожидается: {CMD_EXPORT} <table> [where <col> = <value>] to <file>"
+    words = shlex.split(text)
+    if len(words) < 4 or words[-2].lower() != KW_TO:
+        raise ParseError(usage)
+
+    table = words[1]
+    path = words[-1]
+    if len(words) == 4:
+        return {"kind": "export", "table": table, "where": None, "path": path}
+
+    if words[2].lower() != KW_WHERE:
+        raise ParseError(usage)
+
+    # Whole-word match: the table name may contain "where".
+    where_at = _WHERE.search(text)
+    to_pos = _find_trailing_keyword(text, KW_TO, [path])
+    if to_pos is None or to_pos < where_at.start():
+        raise ParseError(usage)
+    where = _parse_condition(text[where_at.end() : to_pos].strip())
+    return {"kind": "export", "table": table, "where": where, "path": path}
+
+
+def _find_trailing_keyword(text, keyword, tail_words):
+    """Position of the last standalone keyword followed exactly by tail_words."""
+    lower_text = text.lower()
+    needle = f" {keyword} "
+    pos = len(lower_text)
+    while True:
+        pos = lower_text.rfind(needle, 0, pos)
+        if pos == -1:
+            return None
+        try:
+            if shlex.split(text[pos + len(needle) :]) == tail_words:
+                return pos
+        except ValueError:
+            pass
+
+
 def _first_word(text):
     parts = text.strip().split(maxsplit=1)
     return parts[0] if parts else ""
@@ -191,6 +599,65 @@ def _extract_parentheses(text):
     return s[1:-1]
 
 
+def _split_tuples(s):
+    """Split "(...), (...), ..." into the inner text of every tuple."""
+    tuples = []
+    buf = []
+    depth = 0
+    quote = None
+    escape = False
+    expect_comma = False
+
+    for ch in s:
+        if depth == 0:
+            if ch.isspace():
+                continue
+            if ch == "," and expect_comma:
+                expect_comma = False
+                continue
+            if ch == "(" and not expect_comma:
+                depth = 1
+                buf = []
+                continue
+            raise ParseError("Ожидаются скобки: values (<...>), (<...>)")
+
+        if escape:
+            buf.append("\\")
+            buf.append(ch)
+            escape = False
+            continue
+        if ch == "\\":
+            escape = True
+            continue
+        if quote:
+            if ch == quote:
+                quote = None
+            buf.append(ch)
+            continue
+        if ch in ("'", '"'):
+            quote = ch
+            buf.append(ch)
+            continue
+        if ch == ")":
+            depth = 0
+            tuples.append("".join(buf))
+            expect_comma = True
+            continue
+        buf.append(ch)
+
+    if depth != 0 or not tuples or not expect_comma:
+        raise ParseError("Ожидаются скобки: values (<...>), (<...>)")
+    return tuples
+
+
+def _split_plain(s):
+    items = [item.strip() for item in s.split(",")]
+    for it in items:
+        if it == "":
+            raise ParseError("Пустое значение в списке values")
+    return items
+
+
 def _split_csv_like(s):
     items = []
     buf = []
@@ -240,13 +707,125 @@ def _split_csv_like(s):
     return cleaned
 
 
+_CONDITION_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<str>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+      | (?P<op><=|>=|!=|<>|=|<|>)
+      | (?P<punct>[(),])
+      | (?P<word>[^\s()<>=!,"']+)
+    )""",
+    re.VERBOSE,
+)
+
+
 def _parse_condition(s):
-    col, raw = _split_by_equals(s)
-    col = col.strip()
-    if not col:
-        raise ParseError("Пустое имя столбца в where")
-    value = _parse_literal(raw.strip())
-    return {col: value}
+    """
+    Parse a where condition into a predicates tree.
+
+    Grammar: expr := and_expr (OR and_expr)*; and_expr := term (AND term)*;
+    term := "(" expr ")" | col op literal | col IN (literal, ...) |
+    col LIKE literal, with op one of = != <> < <= > >=.
+    """
+    tokens = _tokenize_condition(s)
+    if not tokens:
+        raise ParseError("Пустое условие where")
+    tree, pos = _parse_or(tokens, 0)
+    if pos != len(tokens):
+        raise ParseError(f"Лишнее в условии where: {tokens[pos][1]}")
+    return tree
+
+
+def _tokenize_condition(s):
+    tokens = []
+    pos = 0
+    s = s.rstrip()
+    while pos < len(s):
+        m = _CONDITION_TOKEN.match(s, pos)
+        if m is None or m.end() == pos:
+            raise ParseError(f"Некорректное условие where: {s[pos:].strip()}")
+        tokens.append((m.lastgroup, m.group(m.lastgroup)))
+        pos = m.end()
+    return tokens
+
+
+def _parse_or(tokens, pos):
+    children = []
+    while True:
+        node, pos = _parse_and(tokens, pos)
+        children.append(node)
+        if not _is_keyword(tokens, pos, KW_OR):
+            return predicates.combine(predicates.NODE_OR, children), pos
+        pos += 1
+
+
+def _parse_and(tokens, pos):
+    children = []
+    while True:
+        node, pos = _parse_term(tokens, pos)
+        children.append(node)
+        if not _is_keyword(tokens, pos, KW_AND):
+            return predicates.combine(predicates.NODE_AND, children), pos
+        pos += 1
+
+
+def _parse_term(tokens, pos):
+    if _is_token(tokens, pos, "("):
+        node, pos = _parse_or(tokens, pos + 1)
+        if not _is_token(tokens, pos, ")"):
+            raise ParseError("Ожидается ) в условии where")
+        return node, pos + 1
+
+    if pos >= len(tokens) or tokens[pos][0] != "word":
+        raise ParseError("Ожидается имя столбца в where")
+    col = tokens[pos][1]
+    pos += 1
+    if pos >= len(tokens):
+        raise ParseError(f"Ожидается оператор после {col} в where")
+
+    kind, text = tokens[pos]
+    if kind == "op":
+        op = "!=" if text == "<>" else text
+        value, pos = _parse_condition_literal(tokens, pos + 1)
+        return predicates.compare(op, col, value), pos
+
+    if _is_keyword(tokens, pos, KW_LIKE):
+        pattern, pos = _parse_condition_literal(tokens, pos + 1)
+        if pattern is not PARAM and not isinstance(pattern, str):
+            raise ParseError("Шаблон like должен быть строкой")
+        return predicates.like(col, pattern), pos
+
+    if _is_keyword(tokens, pos, KW_IN):
+        pos += 1
+        if not _is_token(tokens, pos, "("):
+            raise ParseError("Ожидается ( после in")
+        values = []
+        while True:
+            value, pos = _parse_condition_literal(tokens, pos + 1)
+            values.append(value)
+            if _is_token(tokens, pos, ")"):
+                return predicates.in_list(col, values), pos + 1
+            if not _is_token(tokens, pos, ","):
+                raise ParseError("Ожидается , или ) в списке in")
+
+    raise ParseError(f"Неизвестный оператор в where: {text}")
+
+
+def _parse_condition_literal(tokens, pos):
+    if pos >= len(tokens) or tokens[pos][0] not in ("str", "word"):
+        raise ParseError("Ожидается значение в where")
+    return _parse_value(tokens[pos][1]), pos + 1
+
+
+def _is_token(tokens, pos, text):
+    return pos < len(tokens) and tokens[pos] == ("punct", text)
+
+
+def _is_keyword(tokens, pos, keyword):
+    return (
+        pos < len(tokens)
+        and tokens[pos][0] == "word"
+        and tokens[pos][1].lower() == keyword
+    )
 
 
 def _parse_assignments(s):
@@ -257,7 +836,7 @@ def _parse_assignments(s):
         col = col.strip()
         if not col:
             raise ParseError("Пустое имя столбца в set")
-        result[col] = _parse_literal(raw.strip())
+        result[col] = _parse_value(raw.strip())
     return result
 
 
@@ -285,6 +864,13 @@ def _split_by_equals(s):
     raise ParseError('Ожидается знак "="')
 
 
+def _parse_value(token):
+    """A literal of a command, or PARAM for an unquoted placeholder."""
+    if token.strip() == PARAM_PLACEHOLDER:
+        return PARAM
+    return _parse_literal(token)
+
+
 def _parse_literal(token):
     t = token.strip()
     if t == "":
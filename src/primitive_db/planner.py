@@ -0,0 +1,337 @@
+import math
+from itertools import islice
+
+from primitive_db import indexes, predicates
+from primitive_db.constants import (
+    ID_COL_NAME,
+    INDEX_KIND_HASH,
+    INDEX_KIND_SORTED,
+    PLAN_COLUMNAR_SCAN_ROW_COST,
+    PLAN_FETCH_ROW_COST,
+    PLAN_HASH_BUILD_ROW_COST,
+    PLAN_LIKE_SELECTIVITY,
+    PLAN_RANGE_SELECTIVITY,
+    PLAN_SCAN_ROW_COST,
+    PLAN_SORT_ROW_COST,
+    STATS_SAMPLE_ROWS,
+)
+from primitive_db.utils import table_stamp
+
+# Пути доступа к строкам таблицы.
+ACCESS_SCAN = "scan"
+ACCESS_ID = "id"
+ACCESS_HASH = "hash"
+ACCESS_SORTED = "sorted"
+
+# Способы получить строки в порядке order by.
+ORDER_ID = "id"
+ORDER_INDEX = "index"
+ORDER_SORT = "sort"
+
+_stats = {}
+
+
+class TableStats:
+    """Статистика таблицы: число строк и оценка числа различных значений."""
+
+    __slots__ = ("rows", "distinct")
+
+    def __init__(self, rows, distinct):
+        self.rows = rows
+        self.distinct = distinct
+
+
+class AccessPath:
+    """
+    Способ найти строки-кандидаты: полный просмотр или индекс.
+
+    rows — сколько кандидатов даст путь (для индексов — точно), cost —
+    условная стоимость, nodes — листья where, которые путь уже учитывает.
+    fetch() возвращает множество ID кандидатов или None для просмотра.
+    """
+
+    __slots__ = ("kind", "column", "nodes", "rows", "cost", "fetch")
+
+    def __init__(self, kind, column, nodes, rows, cost, fetch):
+        self.kind = kind
+        self.column = column
+        self.nodes = nodes
+        self.rows = rows
+        self.cost = cost
+        self.fetch = fetch
+
+
+class Plan:
+    """Выбранный путь доступа, отвергнутые варианты и способ сортировки."""
+
+    __slots__ = (
+        "access",
+        "alternatives",
+        "table_rows",
+        "estimated_rows",
+        "order",
+        "order_method",
+        "cost",
+    )
+
+    def __init__(self, access, alternatives, table_rows, estimated_rows):
+        self.access = access
+        self.alternatives = alternatives
+        self.table_rows = table_rows
+        self.estimated_rows = estimated_rows
+        self.order = None
+        self.order_method = None
+        self.cost = access.cost
+
+
+class JoinPlan:
+    """
+    План hash join: build — номер стороны (0 или 1), по которой строится
+    хеш-таблица (или берётся её hash-индекс при use_index), другая сторона
+    читается потоком.
+    """
+
+    __slots__ = ("build", "use_index", "cost")
+
+    def __init__(self, build, use_index, cost):
+        self.build = build
+        self.use_index = use_index
+        self.cost = cost
+
+
+def table_stats(table_name, schema, rows):
+    """
+    Статистика таблицы (TableStats), пересчитываемая после её изменения.
+
+    Число строк точное; число различных значений столбца оценивается по
+    выборке из STATS_SAMPLE_ROWS строк.
+    """
+    stamp = table_stamp(table_name)
+    cached = _stats.get(table_name)
+    if cached is not None and cached[0] == stamp and cached[1].rows == len(rows):
+        return cached[1]
+    names = [col["name"] for col in schema["columns"] if col["name"] != ID_COL_NAME]
+    total = len(rows)
+    sample = _sample(rows, names)
+    distinct = {ID_COL_NAME: total}
+    for name in names:
+        distinct[name] = _estimate_distinct([row[name] for row in sample], total)
+    stats = TableStats(total, distinct)
+    _stats[table_name] = (stamp, stats)
+    return stats
+
+
+def forget(table_name):
+    """Сбросить статистику таблицы (после drop_table)."""
+    _stats.pop(table_name, None)
+
+
+def _sample(rows, names):
+    if isinstance(rows, list):
+        step = max(1, len(rows) // STATS_SAMPLE_ROWS)
+        return rows[::step]
+    # Столбцовая таблица читается последовательно: берутся первые строки.
+    return list(islice(rows.scan(None, names), STATS_SAMPLE_ROWS))
+
+
+def _estimate_distinct(values, total):
+    """
+    Оценка числа различных значений по выборке (GEE): значения, которые
+    встретились в выборке один раз, масштабируются на sqrt(total / size).
+    """
+    size = len(values)
+    if not size:
+        return 0
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    if size >= total:
+        return len(counts)
+    singles = sum(1 for n in counts.values() if n == 1)
+    estimate = math.sqrt(total / size) * singles + (len(counts) - singles)
+    return max(len(counts), min(total, round(estimate)))
+
+
+def selectivity(stats, tree):
+    """Оценка доли строк, удовлетворяющих условию (0..1)."""
+    if tree is None:
+        return 1.0
+    kind = tree[0]
+    if kind == predicates.NODE_AND:
+        result = 1.0
+        for child in tree[1]:
+            result *= selectivity(stats, child)
+        return result
+    if kind == predicates.NODE_OR:
+        miss = 1.0
+        for child in tree[1]:
+            miss *= 1.0 - selectivity(stats, child)
+        return 1.0 - miss
+    distinct = max(1, stats.distinct.get(predicates.leaf_column(tree), 1))
+    if kind == predicates.NODE_IN:
+        return min(1.0, len(set(tree[2])) / distinct)
+    if kind == predicates.NODE_LIKE:
+        return PLAN_LIKE_SELECTIVITY
+    if tree[1] == predicates.OP_EQ:
+        return 1.0 / distinct
+    if tree[1] == "!=":
+        return 1.0 - 1.0 / distinct
+    return PLAN_RANGE_SELECTIVITY
+
+
+def plan_query(table_name, schema, rows, where, order=None, limit=None, offset=0):
+    """
+    Выбрать самый дешёвый путь доступа к строкам для where.
+
+    Варианты: полный просмотр, первичный индекс ID, hash- и sorted-индексы
+    по столбцам из листьев where на верхнем уровне and. Индексы дают точное
+    число кандидатов, итоговое число строк оценивается по статистике.
+    order — пара (столбец, по убыванию) или None; для неё выбирается порядок
+    ID, обход sorted-индекса или сортировка найденных строк.
+    """
+    stats = table_stats(table_name, schema, rows)
+    paths = [_scan_path(stats, rows)]
+    paths.extend(_index_paths(table_name, schema, rows, where))
+    paths.sort(key=lambda path: path.cost)
+    access = paths[0]
+
+    # Индекс знает точное число строк для своих листьев; остальная часть
+    # условия оценивается по статистике как независимая.
+    fraction = selectivity(stats, where)
+    estimates = []
+    for path in paths:
+        if path.nodes:
+            covered_tree = predicates.combine(predicates.NODE_AND, path.nodes)
+            covered = max(selectivity(stats, covered_tree), 1e-9)
+            estimates.append(path.rows * min(1.0, fraction / covered))
+    estimated = min(estimates) if estimates else stats.rows * fraction
+    plan = Plan(access, paths[1:], stats.rows, round(estimated))
+    if order is not None:
+        _plan_order(plan, table_name, schema, rows, where, order, limit, offset)
+    return plan
+
+
+def _scan_path(stats, rows):
+    per_row = PLAN_SCAN_ROW_COST
+    if not isinstance(rows, list):
+        per_row = PLAN_COLUMNAR_SCAN_ROW_COST
+    return AccessPath(ACCESS_SCAN, None, (), stats.rows, stats.rows * per_row, _no_ids)
+
+
+def _no_ids():
+    return None
+
+
+def _index_paths(table_name, schema, rows, where):
+    terms = predicates.conjuncts(where)
+    table_indexes = indexes.indexed_columns(schema)
+    for node in terms:
+        values = indexes.equality_values(node)
+        if not values:
+            continue
+        column = predicates.leaf_column(node)
+        if column == ID_COL_NAME:
+            yield _id_path(node, values)
+        elif table_indexes.get(column) == INDEX_KIND_HASH:
+            yield _hash_path(table_name, rows, node, column, values)
+    for column, kind in table_indexes.items():
+        if kind != INDEX_KIND_SORTED:
+            continue
+        spans = indexes.sorted_spans(table_name, column, rows, where)
+        if spans is not None:
+            yield _sorted_path(indexes.sorted_terms(where, column), column, *spans)
+
+
+def _id_path(node, values):
+    ids = {
+        value
+        for value in values
+        if isinstance(value, int) and not isinstance(value, bool)
+    }
+    cost = len(ids) * PLAN_FETCH_ROW_COST
+    return AccessPath(ACCESS_ID, ID_COL_NAME, (node,), len(ids), cost, lambda: ids)
+
+
+def _hash_path(table_name, rows, node, column, values):
+    index = indexes.load_hash_index(table_name, column, rows)
+    found = [index.get(value, ()) for value in set(values)]
+    count = sum(len(ids) for ids in found)
+
+    def fetch():
+        ids = set()
+        for part in found:
+            ids.update(part)
+        return ids
+
+    cost = count * PLAN_FETCH_ROW_COST
+    return AccessPath(ACCESS_HASH, column, (node,), count, cost, fetch)
+
+
+def _sorted_path(nodes, column, buffer, spans):
+    count = sum(stop - start for start, stop in spans)
+
+    def fetch():
+        ids = set()
+        for start, stop in spans:
+            ids.update(buffer.ids[start:stop])
+        return ids
+
+    cost = count * PLAN_FETCH_ROW_COST
+    return AccessPath(ACCESS_SORTED, column, nodes, count, cost, fetch)
+
+
+def _plan_order(plan, table_name, schema, rows, where, order, limit, offset):
+    column = order[0]
+    plan.order = order
+    if column == ID_COL_NAME:
+        plan.order_method = ORDER_ID
+        return
+    estimated = max(1, plan.estimated_rows)
+    sort_cost = estimated * math.log2(estimated + 1) * PLAN_SORT_ROW_COST
+    plan.order_method = ORDER_SORT
+    plan.cost = plan.access.cost + sort_cost
+    if indexes.indexed_columns(schema).get(column) != INDEX_KIND_SORTED:
+        return
+    _, spans = indexes.sorted_spans(table_name, column, rows, where, force=True)
+    span_rows = sum(stop - start for start, stop in spans)
+    # Обход индекса останавливается, когда набрано limit + offset строк.
+    needed = estimated if limit is None else min(estimated, limit + offset)
+    index_cost = span_rows * (needed / estimated) * PLAN_FETCH_ROW_COST
+    if index_cost <= plan.cost:
+        plan.order_method = ORDER_INDEX
+        plan.cost = index_cost
+
+
+def plan_join(sides):
+    """
+    Выбрать сторону построения hash join.
+
+    sides — две пятёрки (таблица, схема, строки, where стороны, столбец
+    join). Хеш-таблица строится по стороне с меньшей оценкой строк после
+    where. Если у стороны есть hash-индекс по столбцу join, вместо
+    построения можно искать в нём: тогда читается только другая сторона,
+    а совпавшие строки берутся по ID.
+    """
+    infos = []
+    for table_name, schema, rows, where, column in sides:
+        stats = table_stats(table_name, schema, rows)
+        infos.append(
+            (
+                stats,
+                stats.rows * selectivity(stats, where),
+                _scan_path(stats, rows).cost,
+                indexes.indexed_columns(schema).get(column) == INDEX_KIND_HASH,
+                column,
+            )
+        )
+    options = []
+    for build in (0, 1):
+        stats, estimated, scan_cost, indexed, column = infos[build]
+        probe_estimated, probe_scan_cost = infos[1 - build][1:3]
+        build_cost = scan_cost + estimated * PLAN_HASH_BUILD_ROW_COST
+        options.append(JoinPlan(build, False, build_cost + probe_scan_cost))
+        if indexed:
+            per_value = stats.rows / max(1, stats.distinct.get(column, 1))
+            fetch_cost = probe_estimated * per_value * PLAN_FETCH_ROW_COST
+            options.append(JoinPlan(build, True, probe_scan_cost + fetch_cost))
+    return min(options, key=lambda plan: plan.cost)
@@ -0,0 +1,286 @@
+import operator
+import re
+
+# Узлы дерева условия where — кортежи:
+#   ("cmp", op, столбец, значение), op — один из COMPARE_OPS
+#   ("in", столбец, (значение, ...))
+#   ("like", столбец, шаблон)
+#   ("and", (узел, ...)), ("or", (узел, ...))
+# Кортежи неизменяемы, поэтому дерево можно разделять между запросами.
+NODE_CMP = "cmp"
+NODE_IN = "in"
+NODE_LIKE = "like"
+NODE_AND = "and"
+NODE_OR = "or"
+
+OP_EQ = "="
+COMPARE_OPS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def compare(op, column, value):
+    return (NODE_CMP, op, column, value)
+
+
+def in_list(column, values):
+    return (NODE_IN, column, tuple(values))
+
+
+def like(column, pattern):
+    return (NODE_LIKE, column, pattern)
+
+
+def combine(kind, children):
+    """Склеить узлы через and/or, раскрывая вложенные узлы того же вида."""
+    flat = []
+    for child in children:
+        if child[0] == kind:
+            flat.extend(child[1])
+        else:
+            flat.append(child)
+    if len(flat) == 1:
+        return flat[0]
+    return (kind, tuple(flat))
+
+
+def from_dict(where):
+    """
+    Привести условие к дереву.
+
+    Словарь {столбец: значение} (прежний формат where) — это равенства,
+    соединённые через and; дерево и None возвращаются как есть.
+    """
+    if not where:
+        return None
+    if isinstance(where, tuple):
+        return where
+    return combine(NODE_AND, [compare(OP_EQ, col, val) for col, val in where.items()])
+
+
+def leaves(tree):
+    """Перебрать листья условия (cmp, in, like) слева направо."""
+    if tree is None:
+        return
+    if tree[0] in (NODE_AND, NODE_OR):
+        for child in tree[1]:
+            yield from leaves(child)
+    else:
+        yield tree
+
+
+def leaf_column(node):
+    return node[2] if node[0] == NODE_CMP else node[1]
+
+
+def columns(tree):
+    """Столбцы, упомянутые в условии, в порядке первого упоминания."""
+    return list(dict.fromkeys(leaf_column(node) for node in leaves(tree)))
+
+
+def map_values(tree, func):
+    """Новое дерево, где каждое значение заменено на func(столбец, значение)."""
+    if tree is None:
+        return None
+    kind = tree[0]
+    if kind in (NODE_AND, NODE_OR):
+        return (kind, tuple(map_values(child, func) for child in tree[1]))
+    if kind == NODE_CMP:
+        return compare(tree[1], tree[2], func(tree[2], tree[3]))
+    if kind == NODE_IN:
+        return in_list(tree[1], [func(tree[1], value) for value in tree[2]])
+    return tree
+
+
+def rename_columns(tree, func):
+    """Новое дерево, где каждый столбец заменён на func(столбец)."""
+    if tree is None:
+        return None
+    kind = tree[0]
+    if kind in (NODE_AND, NODE_OR):
+        return (kind, tuple(rename_columns(child, func) for child in tree[1]))
+    if kind == NODE_CMP:
+        return compare(tree[1], func(tree[2]), tree[3])
+    if kind == NODE_IN:
+        return in_list(func(tree[1]), tree[2])
+    return like(func(tree[1]), tree[2])
+
+
+def conjuncts(tree):
+    """Узлы, соединённые через and на верхнем уровне (само дерево, если не and)."""
+    if tree is None:
+        return ()
+    if tree[0] == NODE_AND:
+        return tree[1]
+    return (tree,)
+
+
+def cache_key(tree):
+    """
+    Хешируемый ключ условия для кэша select.
+
+    Значения помечаются типом, чтобы true и 1 давали разные ключи.
+    """
+    if tree is None:
+        return None
+    kind = tree[0]
+    if kind in (NODE_AND, NODE_OR):
+        return (kind, tuple(cache_key(child) for child in tree[1]))
+    if kind == NODE_CMP:
+        return (kind, tree[1], tree[2], _tagged(tree[3]))
+    if kind == NODE_IN:
+        return (kind, tree[1], tuple(_tagged(value) for value in tree[2]))
+    return tree
+
+
+def _tagged(value):
+    return (type(value).__name__, value)
+
+
+def value_test(node):
+    """Проверка одного значения столбца для листа дерева (cmp, in, like)."""
+    kind = node[0]
+    if kind == NODE_CMP:
+        op, value = COMPARE_OPS[node[1]], node[3]
+
+        def test(x):
+            return op(x, value)
+
+        return test
+    if kind == NODE_IN:
+        return frozenset(node[2]).__contains__
+    return _like_test(node[2])
+
+
+def compile_where(tree):
+    """
+    Скомпилировать условие в функцию match(row) -> bool.
+
+    Дерево разбирается один раз на запрос; для каждой строки вызываются
+    только заранее собранные замыкания, без обхода дерева и словарей.
+    Пустое условие подходит под любую строку.
+    """
+    if tree is None:
+        return _always
+    kind = tree[0]
+    if kind == NODE_AND:
+        return _all_of([compile_where(child) for child in tree[1]])
+    if kind == NODE_OR:
+        return _any_of([compile_where(child) for child in tree[1]])
+    if kind == NODE_CMP and tree[1] == OP_EQ:
+        column, value = tree[2], tree[3]
+
+        def match_eq(row):
+            return row[column] == value
+
+        return match_eq
+    column, test = leaf_column(tree), value_test(tree)
+
+    def match(row):
+        return test(row[column])
+
+    return match
+
+
+def _always(row):
+    return True
+
+
+def _all_of(tests):
+    if len(tests) == 2:
+        first, second = tests
+
+        def match_both(row):
+            return first(row) and second(row)
+
+        return match_both
+
+    def match_all(row):
+        for test in tests:
+            if not test(row):
+                return False
+        return True
+
+    return match_all
+
+
+def _any_of(tests):
+    if len(tests) == 2:
+        first, second = tests
+
+        def match_either(row):
+            return first(row) or second(row)
+
+        return match_either
+
+    def match_any(row):
+        for test in tests:
+            if test(row):
+                return True
+        return False
+
+    return match_any
+
+
+def _like_test(pattern):
+    """
+    Проверка LIKE: % — любая последовательность, _ — один символ,
+    \\ экранирует следующий символ. Частые шаблоны без _ сводятся к
+    строковым методам, остальные — к регулярному выражению.
+    """
+    parts = []
+    literal = []
+    escape = False
+    for ch in pattern:
+        if escape:
+            literal.append(ch)
+            escape = False
+        elif ch == "\\":
+            escape = True
+        elif ch in "%_":
+            parts.append("".join(literal))
+            parts.append(ch)
+            literal = []
+        else:
+            literal.append(ch)
+    parts.append("".join(literal))
+    texts, wildcards = parts[::2], parts[1::2]
+
+    if not wildcards:
+        text = texts[0]
+
+        def test_equal(x):
+            return x == text
+
+        return test_equal
+    if wildcards == ["%"]:
+        prefix, suffix = texts
+        size = len(prefix) + len(suffix)
+
+        def test_edges(x):
+            return len(x) >= size and x.startswith(prefix) and x.endswith(suffix)
+
+        return test_edges
+    if wildcards == ["%", "%"] and not texts[0] and not texts[2]:
+        text = texts[1]
+
+        def test_contains(x):
+            return text in x
+
+        return test_contains
+
+    regex = "".join(
+        re.escape(part) if i % 2 == 0 else (".*" if part == "%" else ".")
+        for i, part in enumerate(parts)
+    )
+    fullmatch = re.compile(regex, re.DOTALL).fullmatch
+
+    def test_regex(x):
+        return fullmatch(x) is not None
+
+    return test_regex
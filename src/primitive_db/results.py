@@ -0,0 +1,126 @@
+import io
+from contextlib import contextmanager, redirect_stdout
+
+# Результат собираемой команды (CommandResult) или None. Команды выводят
+# сообщения через print и строки выборки таблицей; пока идёт сбор, вывод
+# перехватывается, а строки и ошибка сохраняются как данные, чтобы сервер
+# мог отправить их клиенту в машиночитаемом виде.
+_current = None
+
+
+class CommandResult:
+    """
+    Результат одной команды: сообщения (строки вывода), столбцы и строки
+    выборки (None, если команда их не выводила) и текст ошибки или None.
+    exception — исключение, вызвавшее ошибку, если оно было; rowcount и
+    lastrowid — число записанных строк и ID последней добавленной (None,
+    если команда строк не писала).
+    """
+
+    __slots__ = (
+        "messages",
+        "columns",
+        "rows",
+        "error",
+        "exception",
+        "rowcount",
+        "lastrowid",
+    )
+
+    def __init__(self):
+        self.messages = []
+        self.columns = None
+        self.rows = None
+        self.error = None
+        self.exception = None
+        self.rowcount = None
+        self.lastrowid = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_dict(self):
+        """
+        Словарь для JSON: ok, messages и, если есть, columns/rows, rowcount,
+        lastrowid и error.
+        """
+        data = {"ok": self.ok, "messages": self.messages}
+        if self.columns is not None:
+            data["columns"] = self.columns
+            data["rows"] = self.rows
+        if self.rowcount is not None:
+            data["rowcount"] = self.rowcount
+        if self.lastrowid is not None:
+            data["lastrowid"] = self.lastrowid
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class _MessageSink(io.TextIOBase):
+    """Поток для redirect_stdout: каждая непустая строка вывода — сообщение."""
+
+    def __init__(self, messages):
+        super().__init__()
+        self._messages = messages
+        self._tail = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        lines = (self._tail + text).split("\n")
+        self._tail = lines.pop()
+        self._messages.extend(line for line in lines if line)
+        return len(text)
+
+    def finish(self):
+        if self._tail:
+            self._messages.append(self._tail)
+            self._tail = ""
+
+
+@contextmanager
+def capture():
+    """Собрать результат команд внутри блока в CommandResult вместо вывода."""
+    global _current
+    result = CommandResult()
+    sink = _MessageSink(result.messages)
+    outer, _current = _current, result
+    try:
+        with redirect_stdout(sink):
+            yield result
+    finally:
+        sink.finish()
+        _current = outer
+
+
+def capturing():
+    """Идёт ли сбор результата (иначе вывод — в терминал)."""
+    return _current is not None
+
+
+def add_rows(names, rows):
+    """Сохранить строки выборки (словари) как кортежи значений столбцов names."""
+    _current.columns = list(names)
+    _current.rows = [tuple([row.get(name) for name in names]) for row in rows]
+
+
+def set_rowcount(count, last_id=None):
+    """Сохранить число записанных строк (и ID последней добавленной)."""
+    if _current is None:
+        return
+    _current.rowcount = count
+    if last_id is not None:
+        _current.lastrowid = last_id
+
+
+def error(message, exc=None):
+    """Сообщить об ошибке: при сборе — в результат, иначе вывести."""
+    if _current is None:
+        print(message)
+        return
+    if _current.error is None:
+        _current.error = message
+        _current.exception = exc
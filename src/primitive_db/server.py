@@ -0,0 +1,144 @@
+import asyncio
+import json
+import signal
+
+from primitive_db import engine, results
+from primitive_db.constants import (
+    MSG_LINE_TOO_LONG,
+    MSG_SERVER_STARTED,
+    MSG_SERVER_STOPPED,
+    SERVER_HOST,
+    SERVER_LINE_LIMIT,
+    SERVER_PORT,
+)
+from primitive_db.core import recover, rollback, shutdown
+from primitive_db.decorators import create_cacher, set_confirm_answer
+from primitive_db.utils import in_transaction
+
+# Протокол: клиент отправляет команды строками (та же грамматика, что в
+# интерактивном режиме), сервер отвечает на каждую строку по порядку одной
+# строкой JSON (см. results.CommandResult.to_dict). Клиент может слать
+# команды, не дожидаясь ответов (конвейер): они читаются из буфера
+# соединения и выполняются друг за другом. На строку длиннее
+# SERVER_LINE_LIMIT сервер отвечает ошибкой и читает следующую.
+_ENCODING = "utf-8"
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+class _Server:
+    """
+    Состояние сервера, общее для всех соединений: кэш select и соединение,
+    открывшее транзакцию.
+
+    Транзакция в процессе одна (см. utils), а кэш select видит её
+    незафиксированные изменения, поэтому, пока она открыта, команды других
+    соединений ждут её commit или rollback.
+    """
+
+    def __init__(self):
+        self.cacher = create_cacher()
+        self.owner = None
+        self.turn = asyncio.Condition()
+
+    async def handle(self, reader, writer):
+        conn = object()
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as exc:
+                    line = exc.partial
+                except asyncio.LimitOverrunError:
+                    await _skip_line(reader)
+                    writer.write(_encode(_too_long()))
+                    await writer.drain()
+                    continue
+                if not line:
+                    break
+                async with self.turn:
+                    await self.turn.wait_for(lambda: self.owner in (None, conn))
+                    result, keep = self._execute(line.decode(_ENCODING, "replace"))
+                    self._pass_turn(conn)
+                writer.write(_encode(result))
+                await writer.drain()
+                if not keep:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            if self.owner is conn:
+                # Соединение оборвалось посреди транзакции.
+                async with self.turn:
+                    with results.capture():
+                        rollback(self.cacher)
+                    self._pass_turn(conn)
+            writer.close()
+
+    def _execute(self, line):
+        with results.capture() as result:
+            keep = engine.execute_line(line.rstrip("\r\n"), self.cacher)
+        return result, keep
+
+    def _pass_turn(self, conn):
+        if in_transaction():
+            self.owner = conn
+        elif self.owner is conn:
+            self.owner = None
+            self.turn.notify_all()
+
+
+async def _skip_line(reader):
+    """Пропустить остаток строки, не уместившейся в буфер соединения."""
+    while True:
+        try:
+            await reader.readuntil(b"\n")
+            return
+        except asyncio.LimitOverrunError as exc:
+            await reader.readexactly(exc.consumed)
+        except asyncio.IncompleteReadError:
+            return
+
+
+def _too_long():
+    with results.capture() as result:
+        results.error(MSG_LINE_TOO_LONG.format(limit=SERVER_LINE_LIMIT))
+    return result
+
+
+def _encode(result):
+    return (_json_encoder.encode(result.to_dict()) + "\n").encode(_ENCODING)
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT):
+    """
+    Запустить сервер: один процесс с общими каталогом, буферами таблиц и
+    кэшем select обслуживает все соединения до Ctrl+C или SIGTERM.
+
+    Команды выполняются по одной, поэтому данные процесса не нужно
+    защищать от одновременного доступа; подтверждения опасных команд не
+    запрашиваются — клиент отправляет их явно.
+    """
+    recover()
+    set_confirm_answer("y")
+    try:
+        asyncio.run(_serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown()
+        print(MSG_SERVER_STOPPED)
+
+
+async def _serve(host, port):
+    server = _Server()
+    stopped = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    except NotImplementedError:  # Windows: остановка только по Ctrl+C.
+        pass
+    listener = await asyncio.start_server(
+        server.handle, host, port, limit=SERVER_LINE_LIMIT
+    )
+    print(MSG_SERVER_STARTED.format(host=host, port=port), flush=True)
+    async with listener:
+        await stopped.wait()
@@ -0,0 +1,125 @@
+import heapq
+import json
+import os
+import sys
+import tempfile
+from itertools import chain, islice
+
+from primitive_db.constants import (
+    SORT_MEMORY_BYTES,
+    SORT_MERGE_FAN_IN,
+    SORT_RUN_PREFIX,
+)
+from primitive_db.exceptions import StorageError
+from primitive_db.utils import storage_dir
+
+_budget = SORT_MEMORY_BYTES
+_END = object()
+
+
+def set_sort_budget(max_bytes):
+    """Задать бюджет памяти сортировки (примерный объём строк в байтах)."""
+    global _budget
+    _budget = max(1, int(max_bytes))
+
+
+def sort_rows(rows, key, reverse=False, limit=None):
+    """
+    Отсортировать поток строк (словарей) с ограниченной памятью.
+
+    Порядок такой же, как у sorted(rows, key=key, reverse=reverse)[:limit].
+    Число строк в памяти определяется бюджетом и размером первой строки.
+    Если limit умещается в бюджет, хранится только куча из limit лучших
+    строк (top-K). Иначе строки читаются сериями: если поток уместился в
+    одну серию, она сортируется в памяти, а иначе серии сортируются,
+    сбрасываются во временные файлы в директории таблиц и сливаются.
+    """
+    iterator = iter(rows)
+    first = next(iterator, _END)
+    if first is _END:
+        return iter(())
+    run_rows = max(1, _budget // _row_size(first))
+    iterator = chain((first,), iterator)
+    if limit is not None and limit <= run_rows:
+        pick = heapq.nlargest if reverse else heapq.nsmallest
+        return iter(pick(limit, iterator, key=key))
+
+    run = list(islice(iterator, run_rows))
+    run.sort(key=key, reverse=reverse)
+    following = next(iterator, _END)
+    if following is _END:
+        return iter(run[:limit])
+    rest = chain((following,), iterator)
+    return _external_sort(run, rest, run_rows, key, reverse, limit)
+
+
+def _external_sort(run, rows, run_rows, key, reverse, limit):
+    paths = []
+    try:
+        paths.append(_write_run(run))
+        del run[:]
+        while True:
+            chunk = list(islice(rows, run_rows))
+            if not chunk:
+                break
+            chunk.sort(key=key, reverse=reverse)
+            paths.append(_write_run(chunk))
+        # Слишком много серий сливаются проходами по SORT_MERGE_FAN_IN штук,
+        # чтобы не держать открытыми сотни файлов сразу. Порядок серий
+        # сохраняется: строки с равным ключом остаются в исходном порядке.
+        while len(paths) > SORT_MERGE_FAN_IN:
+            count = len(paths)
+            for start in range(0, count, SORT_MERGE_FAN_IN):
+                group = paths[start : min(start + SORT_MERGE_FAN_IN, count)]
+                paths.append(_write_run(_merge(group, key, reverse)))
+            _remove_runs(paths[:count])
+            del paths[:count]
+        yield from islice(_merge(paths, key, reverse), limit)
+    finally:
+        _remove_runs(paths)
+
+
+def _merge(paths, key, reverse):
+    readers = [_read_run(path) for path in paths]
+    try:
+        yield from heapq.merge(*readers, key=key, reverse=reverse)
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def _write_run(rows):
+    run_dir = storage_dir()
+    os.makedirs(run_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=SORT_RUN_PREFIX, suffix=".jsonl", dir=run_dir)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False))
+                file.write("\n")
+    except OSError as exc:
+        _remove_runs([path])
+        raise StorageError(f"Ошибка записи файла сортировки: {path}: {exc}") from exc
+    return path
+
+
+def _read_run(path):
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                yield json.loads(line)
+    except OSError as exc:
+        raise StorageError(f"Ошибка чтения файла сортировки: {path}: {exc}") from exc
+
+
+def _remove_runs(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _row_size(row):
+    """Примерный размер строки в памяти (словарь и значения)."""
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
@@ -1,15 +1,26 @@
 import json
+import mmap
 import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from itertools import accumulate, chain, islice
 
-from primitive_db.constants import META_FILE, STORAGE_DIR, TABLE_FILE_EXT
+from primitive_db import predicates
+from primitive_db.constants import (
+    COLUMNAR_FILE_EXT,
+    COLUMNAR_MAX_SEGMENTS,
+    COLUMNAR_SEGMENT_ROWS,
+    ID_COL_NAME,
+    LOG_FILE_EXT,
+    TABLE_FILE_EXT,
+)
 from primitive_db.exceptions import StorageError
 
 
-def ensure_storage_dir():
-    """Ensure storage directory exists."""
-    os.makedirs(STORAGE_DIR, exist_ok=True)
-
-
 def _read_json(path, default):
     try:
         with open(path, "r", encoding="utf-8") as f:
@@ -20,50 +31,585 @@ def _read_json(path, default):
         raise StorageError(f"Ошибка чтения JSON: {path}: {e}") from e
 
 
+# mkstemp creates files with mode 0600; replaced files get the usual mode.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_write(path, mode="w", **kwargs):
+    """
+    Open a uniquely named temp file next to path and replace path with it.
+
+    Every writer gets its own temp file, so concurrent writers never share
+    one; readers see either the old file or the new one. On error the temp
+    file is removed and path is left untouched.
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f"{name}.", suffix=".tmp", dir=directory or "."
+    )
+    try:
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 def _write_json_atomic(path, data):
     try:
-        tmp_path = f"{path}.tmp"
-        with open(tmp_path, "w", encoding="utf-8") as f:
+        with atomic_write(path, encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
-        os.replace(tmp_path, path)
     except OSError as e:
         raise StorageError(f"Ошибка записи JSON: {path}: {e}") from e
 
 
-def load_metadata():
-    """Load metadata from META_FILE. If missing, return empty dict."""
-    return _read_json(META_FILE, {})
+_line_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def _encode_line(row):
+    return _line_encoder.encode(row) + "\n"
+
+
+def _truncate_torn_tail(path):
+    """Cut off a partially written last line left by an interrupted append."""
+    try:
+        with open(path, "r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            pos = size
+            while pos > 0:
+                step = min(4096, pos)
+                pos -= step
+                f.seek(pos)
+                chunk = f.read(step)
+                nl = chunk.rfind(b"\n")
+                if nl != -1:
+                    f.truncate(pos + nl + 1)
+                    return
+            f.truncate(0)
+    except FileNotFoundError:
+        return
+
+
+class JsonBackend:
+    """Legacy format: the whole table is one JSON list, rewritten on every change."""
+
+    name = "json"
+    ext = TABLE_FILE_EXT
+
+    def load(self, path):
+        return _read_json(path, [])
+
+    def iter_rows(self, path):
+        return iter(self.load(path))
 
+    def save(self, path, rows, columns=None):
+        _write_json_atomic(path, rows)
 
-def save_metadata(metadata):
-    """Save metadata to META_FILE atomically."""
-    _write_json_atomic(META_FILE, metadata)
+    def append(self, path, rows):
+        data = self.load(path)
+        data.extend(rows)
+        self.save(path, data)
 
+    def check_rows(self, path, rows):
+        """Every value of a validated row (int, bool, str) encodes as JSON."""
 
-def _table_path(table_name):
-    ensure_storage_dir()
-    filename = f"{table_name}{TABLE_FILE_EXT}"
-    return os.path.join(STORAGE_DIR, filename)
 
+class LogBackend:
+    """
+    Append-only row log (JSON Lines): one row per line.
 
-def load_table_data(table_name):
-    """Load table data list from data/<table>.json. If missing, return empty list."""
-    path = _table_path(table_name)
-    return _read_json(path, [])
+    Inserts append lines to the end of the file; update/delete rewrite the
+    log atomically (compaction). A torn last line from an interrupted append
+    has no trailing newline, so it is ignored on load and cut off before the
+    next append.
+    """
 
+    name = "log"
+    ext = LOG_FILE_EXT
 
-def save_table_data(table_name, rows):
-    """Save table data list to data/<table>.json atomically."""
-    path = _table_path(table_name)
-    _write_json_atomic(path, rows)
+    def load(self, path):
+        return list(self.iter_rows(path))
 
+    def iter_rows(self, path):
+        """Lazily replay the log line by line."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    if not line.strip():
+                        continue
+                    yield json.loads(line)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            raise StorageError(f"Ошибка чтения журнала: {path}: {e}") from e
 
-def delete_table_file(table_name):
-    """Delete table data file if exists."""
-    path = _table_path(table_name)
+    def save(self, path, rows, columns=None):
+        try:
+            with atomic_write(path, encoding="utf-8") as f:
+                f.writelines(_encode_line(row) for row in rows)
+        except OSError as e:
+            raise StorageError(f"Ошибка записи журнала: {path}: {e}") from e
+
+    def append(self, path, rows, sync=False):
+        """Append rows as lines; with sync=True wait until they reach the disk."""
+        payload = "".join(_encode_line(row) for row in rows).encode("utf-8")
+        try:
+            _truncate_torn_tail(path)
+            with open(path, "ab") as f:
+                f.write(payload)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError as e:
+            raise StorageError(f"Ошибка записи журнала: {path}: {e}") from e
+
+    def check_rows(self, path, rows):
+        """Every value of a validated row (int, bool, str) encodes as JSON."""
+
+
+_COLUMNAR_MAGIC = b"PDBCOL1\n"
+_U32 = struct.Struct("<I")
+# Segment header: payload size in bytes, row count.
+_SEGMENT_HEAD = struct.Struct("<II")
+_LITTLE_ENDIAN = sys.byteorder == "little"
+_COPY_BLOCK = 1024 * 1024
+
+
+def _int_array(data=b""):
+    arr = array("q")
+    arr.frombytes(data)
+    if not _LITTLE_ENDIAN:
+        arr.byteswap()
+    return arr
+
+
+def _int_bytes(values):
+    arr = array("q", values)
+    if not _LITTLE_ENDIAN:
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _encode_column(kind, values):
+    """
+    Encode one column of a segment.
+
+    int: little-endian int64 array; bool: bitmap, bit i is row i;
+    str: int64 byte offsets (n + 1 of them) followed by the UTF-8 blob.
+    """
+    if kind == "int":
+        return _int_bytes(values)
+    if kind == "bool":
+        bits = bytearray((len(values) + 7) // 8)
+        for i, value in enumerate(values):
+            if value:
+                bits[i >> 3] |= 1 << (i & 7)
+        return bytes(bits)
+    parts = [value.encode("utf-8") for value in values]
+    offsets = _int_bytes(accumulate(map(len, parts), initial=0))
+    return offsets + b"".join(parts)
+
+
+def _decode_column(kind, block, count):
+    if kind == "int":
+        return _int_array(block).tolist()
+    if kind == "bool":
+        return [bool(block[i >> 3] >> (i & 7) & 1) for i in range(count)]
+    split = (count + 1) * 8
+    offsets = _int_array(block[:split])
+    blob = bytes(block[split:])
+    text = blob.decode("utf-8")
+    if len(text) == len(blob):
+        # Pure ASCII: byte offsets are character offsets, slice the text.
+        return [text[offsets[i] : offsets[i + 1]] for i in range(count)]
+    return [blob[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(count)]
+
+
+def _encode_segment(columns, rows):
+    blocks = [
+        _encode_column(col["type"], [row[col["name"]] for row in rows])
+        for col in columns
+    ]
+    directory = b"".join(_U32.pack(len(block)) for block in blocks)
+    payload = directory + b"".join(blocks)
+    return _SEGMENT_HEAD.pack(len(payload), len(rows)) + payload
+
+
+def _encode_header(columns):
+    header = json.dumps({"columns": columns}, ensure_ascii=False).encode("utf-8")
+    return _COLUMNAR_MAGIC + _U32.pack(len(header)) + header
+
+
+def _decode_header(data, path):
+    """Return (columns, offset of the first segment)."""
+    start = len(_COLUMNAR_MAGIC)
+    if data[:start] != _COLUMNAR_MAGIC or len(data) < start + _U32.size:
+        raise StorageError(f"Повреждён столбцовый файл: {path}")
+    (size,) = _U32.unpack_from(data, start)
+    start += _U32.size
     try:
-        os.remove(path)
-    except FileNotFoundError:
-        return
-    except OSError as e:
-        raise StorageError(f"Ошибка удаления файла таблицы: {path}: {e}") from e
+        header = json.loads(bytes(data[start : start + size]))
+    except ValueError as e:
+        raise StorageError(f"Повреждён столбцовый файл: {path}: {e}") from e
+    return header["columns"], start + size
+
+
+def _iter_segments(data, offset):
+    """
+    Yield (row count, payload start, payload size) for every complete segment.
+
+    A segment cut short by an interrupted append ends the file.
+    """
+    while offset + _SEGMENT_HEAD.size <= len(data):
+        size, count = _SEGMENT_HEAD.unpack_from(data, offset)
+        body = offset + _SEGMENT_HEAD.size
+        if body + size > len(data):
+            return
+        yield count, body, size
+        offset = body + size
+
+
+class _Segment:
+    __slots__ = ("first", "count", "blocks")
+
+    def __init__(self, first, count, blocks):
+        self.first = first
+        self.count = count
+        self.blocks = blocks
+
+
+class MappedTable:
+    """
+    Read-only view of a columnar table file through mmap.
+
+    Only the segment directory is parsed up front. A scan decodes just the
+    columns its predicate needs, narrows the rows, and then decodes the
+    remaining columns for the matching rows only; str predicates are
+    matched on the raw UTF-8 bytes. Pages come from the OS page cache, so
+    repeated scans share memory instead of re-reading the file.
+    """
+
+    def __init__(self, path):
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise StorageError(f"Ошибка чтения файла: {path}: {e}") from e
+        self.columns, offset = _decode_header(self._map, path)
+        self._types = {col["name"]: col["type"] for col in self.columns}
+        self._segments = []
+        total = 0
+        for count, body, _ in _iter_segments(self._map, offset):
+            pos = body + _U32.size * len(self.columns)
+            blocks = {}
+            for i, col in enumerate(self.columns):
+                (size,) = _U32.unpack_from(self._map, body + i * _U32.size)
+                blocks[col["name"]] = (pos, size)
+                pos += size
+            self._segments.append(_Segment(total, count, blocks))
+            total += count
+        self._length = total
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return self.scan()
+
+    def scan(self, where=None, names=None):
+        """
+        Yield rows (dicts) matching a where tree (see predicates).
+
+        Each segment is narrowed node by node: and-children shrink the
+        candidate positions, or-children are unioned. Equality is matched on
+        the raw column data; other comparisons decode only the candidates.
+        names limits the decoded columns (all columns by default).
+        """
+        if any(name not in self._types for name in predicates.columns(where)):
+            return
+        for seg in self._segments:
+            positions = None if where is None else self._filter(seg, where, None)
+            if positions is None or positions:
+                yield from self._rows(seg, positions, names)
+
+    def tail_rows(self, count):
+        """Yield the rows of the last count segments."""
+        for seg in self._segments[len(self._segments) - count :]:
+            yield from self._rows(seg, None)
+
+    def rows_by_ids(self, ids, names=None):
+        """Yield rows with the given IDs in ascending ID order."""
+        wanted = sorted(ids)
+        for seg in self._segments:
+            if not seg.count:
+                continue
+            row_ids = self._ints(*seg.blocks[ID_COL_NAME])
+            lo, hi = row_ids[0], row_ids[-1]
+            positions = []
+            for row_id in wanted[bisect_left(wanted, lo) : bisect_right(wanted, hi)]:
+                pos = bisect_left(row_ids, row_id)
+                if pos < seg.count and row_ids[pos] == row_id:
+                    positions.append(pos)
+            if positions:
+                yield from self._rows(seg, positions, names)
+
+    def _rows(self, seg, positions, names=None):
+        if names is None:
+            names = [col["name"] for col in self.columns]
+        values = [self._take(seg, name, positions) for name in names]
+        for row in zip(*values):
+            yield dict(zip(names, row))
+
+    def _ints(self, start, size):
+        if _LITTLE_ENDIAN:
+            return memoryview(self._map)[start : start + size].cast("q")
+        return _int_array(self._map[start : start + size])
+
+    def _take(self, seg, name, positions):
+        """Decode column values, for all rows or only at positions."""
+        kind = self._types[name]
+        start, size = seg.blocks[name]
+        if positions is None:
+            return _decode_column(kind, self._map[start : start + size], seg.count)
+        if kind == "int":
+            ints = self._ints(start, size)
+            return [ints[i] for i in positions]
+        if kind == "bool":
+            data = self._map
+            return [bool(data[start + (i >> 3)] >> (i & 7) & 1) for i in positions]
+        offsets = self._ints(start, (seg.count + 1) * 8)
+        blob = start + (seg.count + 1) * 8
+        data = self._map
+        return [
+            data[blob + offsets[i] : blob + offsets[i + 1]].decode("utf-8")
+            for i in positions
+        ]
+
+    def _filter(self, seg, node, positions):
+        """Positions (among all rows or the given ones) satisfying node."""
+        kind = node[0]
+        if kind == predicates.NODE_AND:
+            for child in sorted(node[1], key=self._cost):
+                positions = self._filter(seg, child, positions)
+                if not positions:
+                    return []
+            return positions
+        if kind == predicates.NODE_OR:
+            found = set()
+            for child in node[1]:
+                found.update(self._filter(seg, child, positions))
+            return sorted(found)
+        name = predicates.leaf_column(node)
+        if kind == predicates.NODE_CMP and node[1] == predicates.OP_EQ:
+            return self._match(seg, name, node[3], positions)
+        test = predicates.value_test(node)
+        values = self._take(seg, name, positions)
+        candidates = range(seg.count) if positions is None else positions
+        return [i for i, value in zip(candidates, values) if test(value)]
+
+    def _cost(self, node):
+        """Order and-children: raw equality first, bitmaps (least selective) last."""
+        if node[0] in (predicates.NODE_AND, predicates.NODE_OR):
+            return 2
+        if self._types[predicates.leaf_column(node)] == "bool":
+            return 3
+        if node[0] == predicates.NODE_CMP and node[1] == predicates.OP_EQ:
+            return 0
+        return 1
+
+    def _match(self, seg, name, value, positions):
+        """Positions (all rows or a subset) where the column equals value."""
+        kind = self._types[name]
+        start, size = seg.blocks[name]
+        if kind == "int":
+            if isinstance(value, bool) or not isinstance(value, int):
+                return []
+            if positions is None:
+                return _find_all(self._ints(start, size).tolist(), value)
+            ints = self._ints(start, size)
+            return [i for i in positions if ints[i] == value]
+        if kind == "bool":
+            if not isinstance(value, bool):
+                return []
+            bits = self._take(seg, name, positions)
+            candidates = range(seg.count) if positions is None else positions
+            return [i for i, bit in zip(candidates, bits) if bit == value]
+        if not isinstance(value, str):
+            return []
+        return self._match_str(seg, start, value.encode("utf-8"), positions)
+
+    def _match_str(self, seg, start, needle, positions):
+        offsets = self._ints(start, (seg.count + 1) * 8)
+        blob = start + (seg.count + 1) * 8
+        data = self._map
+        width = len(needle)
+        if positions is not None or not needle:
+            candidates = range(seg.count) if positions is None else positions
+            return [
+                i
+                for i in candidates
+                if offsets[i + 1] - offsets[i] == width
+                and data[blob + offsets[i] : blob + offsets[i + 1]] == needle
+            ]
+        # Search the blob in C and map every hit back to the row it starts.
+        found = []
+        end = blob + offsets[seg.count]
+        hit = data.find(needle, blob, end)
+        while hit != -1:
+            rel = hit - blob
+            row = bisect_left(offsets, rel)
+            while row < seg.count and offsets[row] == rel:
+                if offsets[row + 1] - rel == width:
+                    found.append(row)
+                    break
+                row += 1
+            hit = data.find(needle, hit + 1, end)
+        return found
+
+
+def _find_all(values, value):
+    found = []
+    pos = -1
+    try:
+        while True:
+            pos = values.index(value, pos + 1)
+            found.append(pos)
+    except ValueError:
+        return found
+
+
+def _scan_file(f, path):
+    """
+    Read the header and segment heads of an open columnar file by seeking.
+
+    Returns (columns, end of the last complete segment, offset of the
+    trailing run of partial segments, number of segments in that run).
+    """
+    data = f.read(len(_COLUMNAR_MAGIC) + _U32.size)
+    if len(data) == len(_COLUMNAR_MAGIC) + _U32.size:
+        data += f.read(_U32.unpack_from(data, len(_COLUMNAR_MAGIC))[0])
+    columns, offset = _decode_header(data, path)
+    file_size = f.seek(0, os.SEEK_END)
+    tail, partial = offset, 0
+    while offset + _SEGMENT_HEAD.size <= file_size:
+        f.seek(offset)
+        size, count = _SEGMENT_HEAD.unpack(f.read(_SEGMENT_HEAD.size))
+        if offset + _SEGMENT_HEAD.size + size > file_size:
+            break
+        offset += _SEGMENT_HEAD.size + size
+        if count < COLUMNAR_SEGMENT_ROWS:
+            partial += 1
+        else:
+            tail, partial = offset, 0
+    return columns, offset, tail, partial
+
+
+def _copy_bytes(src, dst, size):
+    """Copy the first size bytes of src to dst in blocks."""
+    src.seek(0)
+    while size > 0:
+        block = src.read(min(size, _COPY_BLOCK))
+        if not block:
+            break
+        dst.write(block)
+        size -= len(block)
+
+
+class ColumnarBackend:
+    """
+    Binary columnar format for strictly typed tables.
+
+    The file is a magic line, a JSON header with the column schema, then a
+    sequence of segments. Each segment stores its rows column by column
+    (int64 arrays, bool bitmaps, str offsets + UTF-8 blob), so column names
+    are written once per file and numbers are not kept as text. Inserts
+    append a segment; update/delete rewrite the file. A torn last segment
+    is ignored on load and cut off before the next append. Once appends
+    leave COLUMNAR_MAX_SEGMENTS partial segments at the end of the file,
+    they are merged into full ones: the full segments before them are
+    copied byte for byte, so the cost does not grow with the table. Reads
+    go through MappedTable.
+    """
+
+    name = "columnar"
+    ext = COLUMNAR_FILE_EXT
+
+    def load(self, path):
+        return list(self.iter_rows(path))
+
+    def iter_rows(self, path):
+        if not os.path.exists(path):
+            return iter(())
+        return iter(MappedTable(path))
+
+    def columns(self, path):
+        """Column schema stored in the file header."""
+        try:
+            with open(path, "rb") as f:
+                return _scan_file(f, path)[0]
+        except OSError as e:
+            raise StorageError(f"Ошибка чтения файла: {path}: {e}") from e
+
+    def save(self, path, rows, columns=None):
+        if columns is None:
+            columns = self.columns(path)
+        try:
+            with atomic_write(path, "wb") as f:
+                f.write(_encode_header(columns))
+                iterator = iter(rows)
+                while chunk := list(islice(iterator, COLUMNAR_SEGMENT_ROWS)):
+                    f.write(self._segment(columns, chunk, path))
+        except OSError as e:
+            raise StorageError(f"Ошибка записи файла: {path}: {e}") from e
+
+    def append(self, path, rows):
+        if not rows:
+            return
+        try:
+            with open(path, "r+b") as f:
+                columns, end, tail, partial = _scan_file(f, path)
+                if partial < COLUMNAR_MAX_SEGMENTS:
+                    segment = self._segment(columns, rows, path)
+                    f.truncate(end)
+                    f.seek(end)
+                    f.write(segment)
+                    return
+            merged = chain(MappedTable(path).tail_rows(partial), rows)
+            with open(path, "rb") as src, atomic_write(path, "wb") as f:
+                _copy_bytes(src, f, tail)
+                while chunk := list(islice(merged, COLUMNAR_SEGMENT_ROWS)):
+                    f.write(self._segment(columns, chunk, path))
+        except OSError as e:
+            raise StorageError(f"Ошибка записи файла: {path}: {e}") from e
+
+    def check_rows(self, path, rows):
+        """Raise StorageError if rows cannot be encoded into the table's columns."""
+        if rows:
+            self._segment(self.columns(path), rows, path)
+
+    def _segment(self, columns, rows, path):
+        try:
+            return _encode_segment(columns, rows)
+        except (KeyError, TypeError, AttributeError, OverflowError) as e:
+            raise StorageError(f"Значение не подходит к столбцу: {path}: {e}") from e
+
+
+BACKENDS = {
+    LogBackend.name: LogBackend(),
+    ColumnarBackend.name: ColumnarBackend(),
+    JsonBackend.name: JsonBackend(),
+}
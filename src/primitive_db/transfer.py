@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from primitive_db.constants import (
+    CSV_FILE_EXT,
+    JSONL_FILE_EXTS,
+    TRANSFER_FORMAT_CSV,
+    TRANSFER_FORMAT_JSONL,
+)
+from primitive_db.exceptions import StorageError, ValidationError
+from primitive_db.storage import atomic_write
+
+_line_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def detect_format(path):
+    """Определить формат файла обмена по расширению."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == CSV_FILE_EXT:
+        return TRANSFER_FORMAT_CSV
+    if ext in JSONL_FILE_EXTS:
+        return TRANSFER_FORMAT_JSONL
+    allowed = ", ".join((CSV_FILE_EXT,) + JSONL_FILE_EXTS)
+    raise ValidationError(f"Неизвестный формат файла: {path}. Допустимо: {allowed}")
+
+
+def chunked(iterable, size):
+    """Разбить поток на списки не длиннее size элементов."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_rows(path, names):
+    """
+    Лениво читать файл обмена и выдавать пары (номер строки, значения).
+
+    Значения идут в порядке столбцов names; лишние поля файла (например,
+    ID) игнорируются. Файл читается построчно и целиком в память не
+    загружается.
+    """
+    fmt = detect_format(path)
+    try:
+        if fmt == TRANSFER_FORMAT_CSV:
+            yield from _read_csv(path, names)
+        else:
+            yield from _read_jsonl(path, names)
+    except OSError as exc:
+        raise StorageError(f"Ошибка чтения файла: {path}: {exc}") from exc
+
+
+def _read_csv(path, names):
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [name.strip() for name in header]
+        missing = [name for name in names if name not in header]
+        if missing:
+            raise ValidationError(
+                f"В заголовке {path} нет столбцов: {', '.join(missing)}"
+            )
+        positions = [header.index(name) for name in names]
+        for record in reader:
+            if not record:
+                continue
+            if len(record) != len(header):
+                raise ValidationError(
+                    f"Строка {reader.line_num}: ожидается полей: {len(header)}, "
+                    f"получено: {len(record)}"
+                )
+            yield reader.line_num, [record[pos] for pos in positions]
+
+
+def _read_jsonl(path, names):
+    with open(path, "r", encoding="utf-8") as file:
+        for lineno, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError as exc:
+                raise ValidationError(f"Строка {lineno}: {exc}") from exc
+            if not isinstance(obj, dict):
+                raise ValidationError(f"Строка {lineno}: ожидается JSON-объект")
+            missing = [name for name in names if name not in obj]
+            if missing:
+                raise ValidationError(
+                    f"Строка {lineno}: нет столбцов: {', '.join(missing)}"
+                )
+            yield lineno, [obj[name] for name in names]
+
+
+def write_rows(path, names, rows, chunk_rows):
+    """
+    Записать поток строк в файл обмена пачками по chunk_rows.
+
+    Файл пишется во временный (своё имя у каждого процесса) и атомарно
+    заменяет целевой по завершении.
+    Возвращает число записанных строк.
+    """
+    fmt = detect_format(path)
+    count = 0
+    try:
+        with atomic_write(path, encoding="utf-8", newline="") as file:
+            if fmt == TRANSFER_FORMAT_CSV:
+                writer = csv.writer(file)
+                writer.writerow(names)
+                for chunk in chunked(rows, chunk_rows):
+                    writer.writerows(
+                        [_csv_value(row.get(name)) for name in names] for row in chunk
+                    )
+                    count += len(chunk)
+            else:
+                for chunk in chunked(rows, chunk_rows):
+                    file.write("".join(_jsonl_line(row, names) for row in chunk))
+                    count += len(chunk)
+    except OSError as exc:
+        raise StorageError(f"Ошибка записи файла: {path}: {exc}") from exc
+    return count
+
+
+def _jsonl_line(row, names):
+    return _line_encoder.encode({name: row.get(name) for name in names}) + "\n"
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
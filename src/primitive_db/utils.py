@@ -1,13 +1,121 @@
+import copy
+import itertools
 import json
 import os
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
 
-from primitive_db.constants import META_FILE, STORAGE_DIR, TABLE_FILE_EXT
+from primitive_db import locks
+from primitive_db.constants import (
+    CATALOG_LOCK_NAME,
+    ID_COL_NAME,
+    INDEX_FILE_EXT,
+    INDEX_KIND_HASH,
+    INDEX_KIND_SORTED,
+    LOCK_FILE_EXT,
+    META_FILE,
+    SORTED_INDEX_INSERT_MAX,
+    STORAGE_BACKEND,
+    STORAGE_DIR,
+    TABLE_CACHE_MAX_BYTES,
+    TABLE_FILE_EXT,
+    WAL_CHECKPOINT_BYTES,
+    WAL_FILE,
+    WAL_FSYNC,
+)
 from primitive_db.exceptions import StorageError
+from primitive_db.metrics import (
+    PHASE_META_LOAD,
+    PHASE_SAVE,
+    PHASE_TABLE_LOAD,
+    timed_phase,
+)
+from primitive_db.storage import (
+    BACKENDS,
+    ColumnarBackend,
+    JsonBackend,
+    LogBackend,
+    MappedTable,
+    atomic_write,
+)
+
+# Кэш разобранных файлов (таблиц и индексов) в памяти процесса:
+# путь -> [отметка файла, значение, размер файла]. Отметка (mtime, размер,
+# inode) сверяется через os.stat перед каждым использованием, поэтому
+# изменения файла другим процессом не остаются незамеченными. Порядок
+# записей — порядок использования (LRU), суммарный размер файлов ограничен
+# бюджетом _buffer_budget.
+_buffers = OrderedDict()
+_buffer_bytes = 0
+_buffer_budget = TABLE_CACHE_MAX_BYTES
+
+_meta_cache = {"stamp": None, "data": None}
+
+# Директория базы: файл метаданных, журнал и директория таблиц. По
+# умолчанию пути относительные — база в текущей директории.
+_storage_dir = STORAGE_DIR
+_meta_file = META_FILE
+_wal_file = WAL_FILE
+
+# Отображения (mmap) столбцовых таблиц: путь -> (отметка файла, MappedTable).
+# Сами данные живут в страничном кэше ОС и в бюджет _buffer_budget не входят.
+_mapped = {}
+
+# Открытая транзакция (_Transaction) или None. Пока она открыта, записи
+# таблиц, индексов и метаданных не доходят до файлов: новые значения
+# копятся в транзакции, и чтения видят их вместо содержимого файлов.
+_txn = None
+_versions = itertools.count(1)
+
+_OWNER_TABLE = "table"
+_OWNER_INDEX = "index"
+
+
+class _Pending:
+    """
+    Файл, изменённый в открытой транзакции.
+
+    owner — (_OWNER_TABLE, таблица) или (_OWNER_INDEX, таблица, столбец,
+    вид индекса); value — новое разобранное содержимое; base — содержимое
+    таблицы до транзакции; appended — дописанные в конец строки или пары
+    (None, если файл перезаписан целиком); stamp — отметка версии для
+    читателей. Пока в файл только дописывают, value и base — None:
+    сохранённое содержимое загружается, только когда его читают или
+    перезаписывают (см. _table_value, _index_value).
+    """
+
+    __slots__ = ("owner", "value", "base", "appended", "stamp")
+
+    def __init__(self, owner, base, value):
+        self.owner = owner
+        self.base = base
+        self.value = value
+        self.appended = []
+        self.stamp = None
+
+
+class _Transaction:
+    """
+    Изменённые файлы (путь -> _Pending), новые метаданные или None и
+    заблокированные транзакцией таблицы (блокировки держатся до её конца).
+    """
+
+    __slots__ = ("files", "metadata", "locked")
+
+    def __init__(self):
+        self.files = {}
+        self.metadata = None
+        self.locked = []
+
+    def tables(self):
+        return sorted({pending.owner[1] for pending in self.files.values()})
 
 
 def ensure_storage_dir():
     """Создать директорию хранения при необходимости."""
-    os.makedirs(STORAGE_DIR, exist_ok=True)
+    os.makedirs(_storage_dir, exist_ok=True)
 
 
 def _read_json(path, default):
@@ -22,48 +130,921 @@ def _read_json(path, default):
 
 def _write_json_atomic(path, data):
     try:
-        tmp_path = f"{path}.tmp"
-        with open(tmp_path, "w", encoding="utf-8") as file:
+        with atomic_write(path, encoding="utf-8") as file:
             json.dump(data, file, ensure_ascii=False, indent=2)
-        os.replace(tmp_path, path)
     except OSError as exc:
         raise StorageError(f"Ошибка записи JSON: {path}: {exc}") from exc
 
 
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    except OSError as exc:
+        raise StorageError(f"Ошибка доступа к файлу: {path}: {exc}") from exc
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def set_database_dir(path):
+    """
+    Перейти к базе в директории path. Кэши прежней базы сбрасываются;
+    внутри транзакции менять базу нельзя.
+    """
+    global _storage_dir, _meta_file, _wal_file
+    if _txn is not None:
+        raise StorageError("Нельзя сменить базу внутри транзакции.")
+    _storage_dir = os.path.join(path, STORAGE_DIR)
+    _meta_file = os.path.join(path, META_FILE)
+    _wal_file = os.path.join(path, WAL_FILE)
+    clear_caches()
+
+
+def storage_dir():
+    """Директория файлов таблиц текущей базы."""
+    return _storage_dir
+
+
+def set_table_cache_budget(max_bytes):
+    """Задать бюджет кэша таблиц (по размеру файлов) и вытеснить лишнее."""
+    global _buffer_budget
+    _buffer_budget = max(0, int(max_bytes))
+    _evict_buffers()
+
+
+def clear_caches():
+    """Сбросить кэш метаданных и разобранных файлов."""
+    global _buffer_bytes
+    _buffers.clear()
+    _buffer_bytes = 0
+    _mapped.clear()
+    _meta_cache["stamp"] = None
+    _meta_cache["data"] = None
+
+
+def _buffered(path, loader):
+    """Вернуть разобранный файл из кэша, если он не менялся, иначе загрузить."""
+    stamp = _file_stamp(path)
+    entry = _buffers.get(path)
+    if entry is not None and stamp is not None and entry[0] == stamp:
+        _buffers.move_to_end(path)
+        return entry[1]
+    value = loader(path)
+    if stamp is None:
+        _forget_buffer(path)
+    else:
+        _remember_buffer(path, stamp, value)
+    return value
+
+
+def _fresh_buffer(path, stamp):
+    """Значение из кэша, только если файл с тех пор не менялся."""
+    entry = _buffers.get(path)
+    if entry is not None and stamp is not None and entry[0] == stamp:
+        return entry[1]
+    return None
+
+
+def _remember_buffer(path, stamp, value):
+    global _buffer_bytes
+    _forget_buffer(path)
+    size = stamp[1]
+    if size > _buffer_budget:
+        return
+    _buffers[path] = [stamp, value, size]
+    _buffer_bytes += size
+    _evict_buffers()
+
+
+def _forget_buffer(path):
+    global _buffer_bytes
+    entry = _buffers.pop(path, None)
+    if entry is not None:
+        _buffer_bytes -= entry[2]
+
+
+def _evict_buffers():
+    global _buffer_bytes
+    while _buffers and _buffer_bytes > _buffer_budget:
+        _, entry = _buffers.popitem(last=False)
+        _buffer_bytes -= entry[2]
+
+
+@timed_phase(PHASE_META_LOAD)
 def load_metadata():
-    """Загрузить метаданные из META_FILE, вернуть {} если файла нет."""
-    return _read_json(META_FILE, {})
+    """
+    Загрузить метаданные из META_FILE, вернуть {} если файла нет.
+
+    Разобранные метаданные кэшируются и перечитываются только при изменении
+    файла; вызывающий получает собственную копию и может её менять.
+    """
+    if _txn is not None and _txn.metadata is not None:
+        return copy.deepcopy(_txn.metadata)
+    return copy.deepcopy(_stored_metadata())
+
 
+def _stored_metadata():
+    """Метаданные из файла (без учёта транзакции); результат не копируется."""
+    stamp = _file_stamp(_meta_file)
+    if stamp is None:
+        return {}
+    if _meta_cache["stamp"] != stamp:
+        _meta_cache["data"] = _read_json(_meta_file, {})
+        _meta_cache["stamp"] = stamp
+    return _meta_cache["data"]
 
+
+@timed_phase(PHASE_SAVE)
 def save_metadata(metadata):
-    """Сохранить метаданные атомарно."""
-    _write_json_atomic(META_FILE, metadata)
+    """Сохранить метаданные атомарно (в транзакции — до её фиксации)."""
+    if _txn is not None:
+        _txn.metadata = copy.deepcopy(metadata)
+        return
+    _write_json_atomic(_meta_file, metadata)
+    _meta_cache["data"] = copy.deepcopy(metadata)
+    _meta_cache["stamp"] = _file_stamp(_meta_file)
 
 
-def _table_path(table_name):
+def _table_path(table_name, ext=TABLE_FILE_EXT):
     ensure_storage_dir()
-    filename = f"{table_name}{TABLE_FILE_EXT}"
-    return os.path.join(STORAGE_DIR, filename)
+    filename = f"{table_name}{ext}"
+    return os.path.join(_storage_dir, filename)
+
 
+def _table_backend(table_name):
+    """Найти бэкенд по существующему файлу таблицы, иначе взять бэкенд по умолчанию."""
+    for backend in BACKENDS.values():
+        path = _table_path(table_name, backend.ext)
+        if os.path.exists(path):
+            return backend, path
+    backend = BACKENDS[STORAGE_BACKEND]
+    return backend, _table_path(table_name, backend.ext)
 
+
+@timed_phase(PHASE_TABLE_LOAD)
 def load_table_data(table_name):
-    """Загрузить список строк таблицы, вернуть [] если файла нет."""
-    path = _table_path(table_name)
-    return _read_json(path, [])
+    """
+    Загрузить список строк таблицы, вернуть [] если файла нет.
+
+    Список берётся из кэша и разделяется между вызовами: его нельзя менять
+    на месте, изменённая таблица сохраняется через save_table_data.
+    """
+    backend, path = _table_backend(table_name)
+    pending = _pending(path)
+    if pending is not None:
+        return _table_value(pending)
+    return _buffered(path, backend.load)
+
 
+@timed_phase(PHASE_TABLE_LOAD)
+def iter_table_rows(table_name):
+    """
+    Перебрать строки таблицы по порядку.
 
+    Если таблица есть в кэше, перебирается кэшированный список; иначе файл
+    читается потоково, без загрузки целиком и без помещения в кэш.
+    """
+    backend, path = _table_backend(table_name)
+    pending = _pending(path)
+    if pending is not None and pending.value is not None:
+        return iter(pending.value)
+    cached = _fresh_buffer(path, _file_stamp(path))
+    rows = iter(cached) if cached is not None else backend.iter_rows(path)
+    if pending is not None:
+        return itertools.chain(rows, pending.appended)
+    return rows
+
+
+@timed_phase(PHASE_SAVE)
 def save_table_data(table_name, rows):
-    """Сохранить список строк таблицы атомарно."""
-    path = _table_path(table_name)
-    _write_json_atomic(path, rows)
+    """
+    Сохранить список строк таблицы атомарно.
+
+    Таблица записывается в своём формате (журнал или столбцовый); файл в
+    устаревшем формате JSON после первой перезаписи заменяется журналом.
+    """
+    if _txn is not None:
+        pending = _staged_table(table_name)
+        if pending.base is None:
+            backend, path = _table_backend(table_name)
+            pending.base = _buffered(path, backend.load)
+        pending.value = rows
+        pending.appended = None
+        return
+    backend, old_path = _table_backend(table_name)
+    if backend.name == JsonBackend.name:
+        backend = BACKENDS[STORAGE_BACKEND]
+    path = _table_path(table_name, backend.ext)
+    backend.save(path, rows)
+    _remember_buffer(path, _file_stamp(path), rows)
+    if old_path != path:
+        _remove_file(old_path)
+
+
+@timed_phase(PHASE_SAVE)
+def append_table_rows(table_name, rows):
+    """Дописать строки в конец таблицы без перезаписи уже сохранённых."""
+    if _txn is not None:
+        pending = _staged_table(table_name)
+        if pending.value is not None:
+            pending.value.extend(rows)
+        if pending.appended is not None:
+            pending.appended.extend(rows)
+        return
+    backend, path = _table_backend(table_name)
+    if backend.name == JsonBackend.name:
+        data = list(backend.load(path))
+        data.extend(rows)
+        save_table_data(table_name, data)
+        return
+    cached = _fresh_buffer(path, _file_stamp(path))
+    backend.append(path, rows)
+    if cached is None:
+        _forget_buffer(path)
+        return
+    cached.extend(rows)
+    _remember_buffer(path, _file_stamp(path), cached)
+
+
+@timed_phase(PHASE_TABLE_LOAD)
+def mapped_table(table_name):
+    """
+    Отображение столбцовой таблицы в память только для чтения.
+
+    Возвращает MappedTable или None, если таблица хранится не в столбцовом
+    формате. Отображение переиспользуется, пока файл не изменился.
+    """
+    backend, path = _table_backend(table_name)
+    if backend.name != ColumnarBackend.name or _pending(path) is not None:
+        return None
+    stamp = _file_stamp(path)
+    if stamp is None:
+        return None
+    entry = _mapped.get(path)
+    if entry is None or entry[0] != stamp:
+        entry = (stamp, MappedTable(path))
+        _mapped[path] = entry
+    return entry[1]
+
+
+def table_stamp(table_name):
+    """Отметка версии файла таблицы (меняется при каждой записи) или None."""
+    path = _table_backend(table_name)[1]
+    pending = _pending(path)
+    if pending is not None:
+        return pending.stamp
+    return _file_stamp(path)
+
+
+def get_table_format(table_name):
+    """Формат хранения таблицы по её файлу (для новой таблицы — по умолчанию)."""
+    return _table_backend(table_name)[0].name
+
+
+def create_table_file(table_name, columns, table_format):
+    """Создать пустой файл таблицы в указанном формате (старые файлы удаляются)."""
+    delete_table_file(table_name)
+    backend = BACKENDS[table_format]
+    path = _table_path(table_name, backend.ext)
+    backend.save(path, [], columns)
+
+
+@timed_phase(PHASE_SAVE)
+def convert_table_file(table_name, columns, table_format):
+    """
+    Перезаписать таблицу в другой формат и удалить файл старого формата.
+
+    Строки и их порядок не меняются, поэтому индексы остаются верными.
+    """
+    rows = load_table_data(table_name)
+    _, old_path = _table_backend(table_name)
+    backend = BACKENDS[table_format]
+    path = _table_path(table_name, backend.ext)
+    backend.save(path, rows, columns)
+    _remember_buffer(path, _file_stamp(path), rows)
+    if old_path != path:
+        _remove_file(old_path)
 
 
 def delete_table_file(table_name):
-    """Удалить файл таблицы, если он существует."""
-    path = _table_path(table_name)
+    """Удалить файлы таблицы во всех форматах, если они существуют."""
+    for backend in BACKENDS.values():
+        _remove_file(_table_path(table_name, backend.ext))
+
+
+def _index_path(table_name, column):
+    return _table_path(f"{table_name}.{column}", INDEX_FILE_EXT)
+
+
+def _load_index_file(path):
+    entries = BACKENDS[LogBackend.name].load(path)
+    return _IndexBuffer(entries)
+
+
+def _load_sorted_index_file(path):
+    entries = BACKENDS[LogBackend.name].load(path)
+    return SortedIndexBuffer(entries)
+
+
+class _IndexBuffer:
+    """Разобранный hash-индекс: {значение: [ID, ...]} и число пар в файле."""
+
+    __slots__ = ("mapping", "count")
+
+    def __init__(self, entries):
+        self.mapping = {}
+        self.count = 0
+        self.add(entries)
+
+    def copy(self):
+        other = _IndexBuffer(())
+        other.mapping = {value: list(ids) for value, ids in self.mapping.items()}
+        other.count = self.count
+        return other
+
+    def entries(self):
+        return [
+            [value, row_id] for value, ids in self.mapping.items() for row_id in ids
+        ]
+
+    def add(self, entries):
+        for value, row_id in entries:
+            self.mapping.setdefault(value, []).append(row_id)
+        self.count += len(entries)
+
+    def remove(self, entries):
+        for value, row_id in entries:
+            ids = self.mapping.get(value)
+            if ids is None or row_id not in ids:
+                continue
+            ids.remove(row_id)
+            if not ids:
+                del self.mapping[value]
+            self.count -= 1
+
+
+class SortedIndexBuffer:
+    """
+    Разобранный sorted-индекс: параллельные списки values и ids,
+    упорядоченные по паре (значение, ID).
+
+    Файл хранит те же пары [значение, ID]; вставки дописываются в конец
+    файла без сортировки, а при загрузке timsort сливает отсортированную
+    основу с коротким хвостом почти за линейное время.
+    """
+
+    __slots__ = ("values", "ids")
+
+    def __init__(self, entries=(), presorted=False):
+        pairs = [tuple(entry) for entry in entries]
+        if not presorted:
+            pairs.sort()
+        self.values = [value for value, _ in pairs]
+        self.ids = [row_id for _, row_id in pairs]
+
+    @property
+    def count(self):
+        return len(self.ids)
+
+    def copy(self):
+        other = SortedIndexBuffer(presorted=True)
+        other.values = list(self.values)
+        other.ids = list(self.ids)
+        return other
+
+    def entries(self):
+        return [[value, row_id] for value, row_id in zip(self.values, self.ids)]
+
+    def add(self, entries):
+        if len(entries) > SORTED_INDEX_INSERT_MAX:
+            # Пачку дешевле слить: timsort объединит два упорядоченных куска.
+            pairs = list(zip(self.values, self.ids))
+            pairs.extend(tuple(entry) for entry in entries)
+            pairs.sort()
+            self.values = [value for value, _ in pairs]
+            self.ids = [row_id for _, row_id in pairs]
+            return
+        for value, row_id in entries:
+            pos = self._position(value, row_id)
+            self.values.insert(pos, value)
+            self.ids.insert(pos, row_id)
+
+    def remove(self, entries):
+        for value, row_id in entries:
+            pos = self._position(value, row_id)
+            found = pos < len(self.ids) and self.ids[pos] == row_id
+            if found and self.values[pos] == value:
+                del self.values[pos]
+                del self.ids[pos]
+
+    def bounds(self, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        """Срез [start, stop) пар, значения которых лежат в заданных границах."""
+        start, stop = 0, len(self.values)
+        if low is not None:
+            find = bisect_left if low_inclusive else bisect_right
+            start = find(self.values, low)
+        if high is not None:
+            find = bisect_right if high_inclusive else bisect_left
+            stop = find(self.values, high)
+        return start, max(start, stop)
+
+    def _position(self, value, row_id):
+        lo = bisect_left(self.values, value)
+        hi = bisect_right(self.values, value, lo)
+        return bisect_left(self.ids, row_id, lo, hi)
+
+
+_INDEX_BUFFERS = {
+    INDEX_KIND_HASH: _IndexBuffer,
+    INDEX_KIND_SORTED: SortedIndexBuffer,
+}
+_INDEX_LOADERS = {
+    INDEX_KIND_HASH: _load_index_file,
+    INDEX_KIND_SORTED: _load_sorted_index_file,
+}
+
+
+@timed_phase(PHASE_TABLE_LOAD)
+def load_index(table_name, column):
+    """
+    Загрузить hash-индекс столбца из кэша или с диска.
+
+    Возвращает (словарь {значение: [ID, ...]}, число пар) или None, если
+    файла индекса нет. Словарь разделяется между вызовами и не должен
+    изменяться вызывающим.
+    """
+    path = _index_path(table_name, column)
+    pending = _pending(path)
+    if pending is not None:
+        buffer = _index_value(pending, path)
+        return buffer.mapping, buffer.count
+    if not os.path.exists(path):
+        return None
+    buffer = _buffered(path, _load_index_file)
+    return buffer.mapping, buffer.count
+
+
+@timed_phase(PHASE_TABLE_LOAD)
+def load_hash_buffer(table_name, column):
+    """
+    Загрузить буфер hash-индекса столбца (mapping и count) или None, если
+    файла нет. Буфер разделяется между вызовами: для изменения нужна copy().
+    """
+    path = _index_path(table_name, column)
+    pending = _pending(path)
+    if pending is not None:
+        return _index_value(pending, path)
+    if not os.path.exists(path):
+        return None
+    return _buffered(path, _load_index_file)
+
+
+@timed_phase(PHASE_TABLE_LOAD)
+def load_sorted_buffer(table_name, column):
+    """
+    Загрузить sorted-индекс столбца (SortedIndexBuffer) или None, если
+    файла нет. Буфер разделяется между вызовами: для изменения нужна copy().
+    """
+    path = _index_path(table_name, column)
+    pending = _pending(path)
+    if pending is not None:
+        return _index_value(pending, path)
+    if not os.path.exists(path):
+        return None
+    return _buffered(path, _load_sorted_index_file)
+
+
+@timed_phase(PHASE_SAVE)
+def save_index_entries(table_name, column, entries, kind=INDEX_KIND_HASH):
+    """Перезаписать файл индекса атомарно (entries — пары или буфер индекса)."""
+    path = _index_path(table_name, column)
+    if isinstance(entries, SortedIndexBuffer):
+        kind = INDEX_KIND_SORTED
+    if isinstance(entries, (SortedIndexBuffer, _IndexBuffer)):
+        buffer, entries = entries, entries.entries()
+    else:
+        buffer = _INDEX_BUFFERS[kind](entries)
+    if _txn is not None:
+        pending = _staged_index(table_name, column, kind, buffer)
+        pending.appended = None
+        return
+    BACKENDS[LogBackend.name].save(path, entries)
+    _remember_buffer(path, _file_stamp(path), buffer)
+
+
+@timed_phase(PHASE_SAVE)
+def append_index_entries(table_name, column, entries, kind=INDEX_KIND_HASH):
+    """Дописать пары [значение, ID] в конец файла индекса."""
+    if _txn is not None:
+        pending = _staged_index(table_name, column, kind)
+        if pending.value is not None:
+            pending.value.add(entries)
+        if pending.appended is not None:
+            pending.appended.extend(entries)
+        return
+    path = _index_path(table_name, column)
+    cached = _fresh_buffer(path, _file_stamp(path))
+    BACKENDS[LogBackend.name].append(path, entries)
+    if cached is None:
+        _forget_buffer(path)
+        return
+    cached.add(entries)
+    _remember_buffer(path, _file_stamp(path), cached)
+
+
+def delete_index_file(table_name, column):
+    """Удалить файл индекса, если он существует."""
+    _remove_file(_index_path(table_name, column))
+
+
+def _remove_file(path):
+    _forget_buffer(path)
+    _mapped.pop(path, None)
     try:
         os.remove(path)
     except FileNotFoundError:
         return
     except OSError as exc:
-        raise StorageError(f"Ошибка удаления файла таблицы: {path}: {exc}") from exc
+        raise StorageError(f"Ошибка удаления файла: {path}: {exc}") from exc
+
+
+def in_transaction():
+    """Открыта ли транзакция."""
+    return _txn is not None
+
+
+def begin_transaction():
+    """Начать транзакцию: дальнейшие записи копятся в памяти до фиксации."""
+    global _txn
+    _txn = _Transaction()
+
+
+def transaction_tables():
+    """Имена таблиц, изменённых в открытой транзакции."""
+    return _txn.tables()
+
+
+def lock_table(table_name):
+    """
+    Заблокировать таблицу для других процессов до конца открытой транзакции.
+
+    Возвращает True, если таблица заблокирована только что (False — уже
+    была). Пока другой процесс пишет в таблицу, вызов ждёт; по истечении
+    LOCK_TIMEOUT_SECONDS — StorageError. Схема и last_id таблицы в
+    метаданных транзакции перечитываются: до блокировки их мог изменить
+    другой процесс.
+    """
+    if table_name in _txn.locked:
+        return False
+    if not locks.acquire(_lock_path(table_name)):
+        raise StorageError(f'Таблица "{table_name}" занята другим процессом.')
+    _txn.locked.append(table_name)
+    if _txn.metadata is not None:
+        schema = _stored_metadata().get(table_name)
+        if schema is None:
+            _txn.metadata.pop(table_name, None)
+        else:
+            _txn.metadata[table_name] = copy.deepcopy(schema)
+    return True
+
+
+def table_locked(table_name):
+    """Держит ли этот процесс блокировку записи таблицы."""
+    return locks.is_held(_lock_path(table_name))
+
+
+@contextmanager
+def table_lock(table_name):
+    """
+    Блокировка таблицы и каталога на время изменения схемы (create, drop,
+    convert, create index): ни запись в таблицу, ни фиксация метаданных
+    другим процессом не пересекаются с ним.
+    """
+    with locks.hold(_lock_path(table_name)), locks.hold(_catalog_lock_path()):
+        yield
+
+
+def rollback_transaction():
+    """Отменить открытую транзакцию и вернуть имена изменённых в ней таблиц."""
+    global _txn
+    txn, _txn = _txn, None
+    _release_tables(txn)
+    return txn.tables()
+
+
+def commit_transaction():
+    """
+    Зафиксировать открытую транзакцию и вернуть {таблица: отметка файла}
+    для изменённых таблиц.
+
+    Новые и изменённые строки сначала проверяются форматом их таблицы:
+    значение, которое нельзя записать в файл, отменяет транзакцию до
+    журнала. Затем изменения строк (строки целиком, ID удалённых) и
+    last_id каждой таблицы пишутся в журнал одной записью с одним fsync —
+    это момент фиксации. После этого каждый файл таблицы и индекса
+    записывается один раз, сколько бы операторов их ни меняли: только
+    дописанное — дозаписью, остальное — перезаписью файла. Схемы
+    заблокированных таблиц переносятся в метаданные, перечитанные под
+    блокировкой каталога, поэтому записи других процессов в другие таблицы
+    не теряются. Последней в журнал добавляется отметка о том, что запись
+    перенесена в файлы: без неё контрольная точка журнал не очищает.
+    Отметки файлов снимаются до снятия блокировок таблиц.
+    """
+    global _txn
+    txn, _txn = _txn, None
+    try:
+        changes = {}
+        for pending in txn.files.values():
+            if pending.owner[0] != _OWNER_TABLE:
+                continue
+            put, deleted = _row_changes(pending)
+            if put or deleted:
+                backend, path = _table_backend(pending.owner[1])
+                backend.check_rows(path, put)
+                changes[pending.owner[1]] = {"put": put, "delete": deleted}
+        if txn.metadata is not None:
+            for table_name, change in changes.items():
+                change["last_id"] = txn.metadata[table_name]["last_id"]
+        record_id = uuid.uuid4().hex
+        if changes:
+            with locks.hold(_catalog_lock_path()):
+                _append_wal({"id": record_id, "tables": changes})
+
+        try:
+            _apply_transaction(txn, changes)
+            if txn.metadata is not None or changes:
+                with locks.hold(_catalog_lock_path()):
+                    if txn.metadata is not None:
+                        metadata = copy.deepcopy(_stored_metadata())
+                        for table_name in txn.locked:
+                            if table_name in txn.metadata:
+                                metadata[table_name] = txn.metadata[table_name]
+                        save_metadata(metadata)
+                    if changes:
+                        _append_wal({"applied": [record_id]}, sync=False)
+        except StorageError as exc:
+            if not changes:
+                raise
+            raise StorageError(
+                f"Транзакция записана в журнал, но не перенесена в файлы: {exc}. "
+                "Она будет повторена при следующем запуске."
+            ) from exc
+        stamps = {name: table_stamp(name) for name in sorted(changes)}
+    finally:
+        _release_tables(txn)
+
+    stamp = _file_stamp(_wal_file)
+    if stamp is not None and stamp[1] > WAL_CHECKPOINT_BYTES:
+        checkpoint()
+    return stamps
+
+
+def _apply_transaction(txn, changes):
+    """
+    Записать файлы транзакции. Таблицы пишутся раньше индексов: индекс,
+    который не успели обновить, перестраивается по числу пар, а журнал
+    повторяется при запуске. Таблица без изменений строк не перезаписывается.
+    """
+    for pending in sorted(
+        txn.files.values(), key=lambda item: item.owner[0] != _OWNER_TABLE
+    ):
+        if pending.owner[0] == _OWNER_TABLE and pending.owner[1] not in changes:
+            continue
+        _apply_pending(pending)
+
+
+def read_wal():
+    """
+    Перебрать записи журнала по порядку.
+
+    Запись — зафиксированная транзакция {"id": ..., "tables": {таблица:
+    изменения}}, отметка {"applied": [id, ...]} о том, что транзакции
+    перенесены в файлы, или {"dropped": таблица} (граница: более ранние
+    записи о таблице относятся к удалённой). Строка, оборванная сбоем до
+    конца записи, не считается фиксацией и пропускается.
+    """
+    return BACKENDS[LogBackend.name].iter_rows(_wal_file)
+
+
+def lock_wal_tables():
+    """
+    Заблокировать в открытой транзакции все таблицы из журнала и вернуть
+    его записи.
+
+    Пока таблицы заблокированы, никто не дописывает о них новые записи и не
+    очищает журнал, так что возвращённые записи о них полны.
+    """
+    while True:
+        records = list(read_wal())
+        names = _wal_tables(records)
+        if names.issubset(_txn.locked):
+            return records
+        for table_name in sorted(names):
+            lock_table(table_name)
+
+
+def mark_applied(records):
+    """Отметить транзакции records как перенесённые в файлы (после повтора)."""
+    ids = [record["id"] for record in records if "id" in record]
+    if ids:
+        with locks.hold(_catalog_lock_path()):
+            _append_wal({"applied": ids}, sync=False)
+
+
+def log_dropped_table(table_name):
+    """Записать в журнал границу: прежние записи о таблице не повторяются."""
+    with locks.hold(_catalog_lock_path()):
+        _append_wal({"dropped": table_name})
+
+
+def checkpoint():
+    """
+    Контрольная точка: сбросить на диск файлы таблиц из журнала, их индексы
+    и метаданные и очистить журнал — всё описанное в нём уже есть в файлах.
+
+    Если какая-то транзакция журнала ещё не отмечена как перенесённая в
+    файлы (её пишет другой процесс, запись файлов не удалась или процесс
+    упал), или какую-то из таблиц журнала сейчас пишет другой процесс,
+    точка пропускается и возвращается False: такие записи повторит
+    recover при следующем запуске.
+    """
+    with locks.hold(_catalog_lock_path()):
+        records = list(read_wal())
+        if _unapplied(records):
+            return False
+        names = sorted(_wal_tables(records))
+        held = []
+        try:
+            for table_name in names:
+                if not locks.acquire(_lock_path(table_name), timeout=0):
+                    return False
+                held.append(table_name)
+            if WAL_FSYNC and names:
+                for path in _table_files(names):
+                    _fsync_path(path)
+                _fsync_path(_meta_file)
+                _fsync_path(_storage_dir)
+            _remove_file(_wal_file)
+        finally:
+            for table_name in held:
+                locks.release(_lock_path(table_name))
+    return True
+
+
+def _lock_path(table_name):
+    return _table_path(table_name, LOCK_FILE_EXT)
+
+
+def _catalog_lock_path():
+    return _table_path(CATALOG_LOCK_NAME, LOCK_FILE_EXT)
+
+
+def _release_tables(txn):
+    for table_name in txn.locked:
+        locks.release(_lock_path(table_name))
+
+
+def _wal_tables(records):
+    names = set()
+    for record in records:
+        if "dropped" in record:
+            names.add(record["dropped"])
+        elif "tables" in record:
+            names.update(record["tables"])
+    return names
+
+
+def _unapplied(records):
+    """ID транзакций журнала без отметки о переносе в файлы."""
+    ids = set()
+    for record in records:
+        if "applied" in record:
+            ids.difference_update(record["applied"])
+        elif "id" in record:
+            ids.add(record["id"])
+    return ids
+
+
+def _table_files(names):
+    """Файлы таблиц names во всех форматах и файлы их индексов."""
+    prefixes = tuple(f"{name}." for name in names)
+    try:
+        filenames = os.listdir(_storage_dir)
+    except FileNotFoundError:
+        return []
+    return [
+        os.path.join(_storage_dir, filename)
+        for filename in sorted(filenames)
+        if filename.startswith(prefixes) and not filename.endswith(LOCK_FILE_EXT)
+    ]
+
+
+def _pending(path):
+    if _txn is None:
+        return None
+    return _txn.files.get(path)
+
+
+def _staged_table(table_name):
+    """
+    Таблица в открытой транзакции. Вставки только копят новые строки:
+    сохранённые строки загружаются при первом чтении или перезаписи.
+    """
+    _, path = _table_backend(table_name)
+    pending = _txn.files.get(path)
+    if pending is None:
+        pending = _Pending((_OWNER_TABLE, table_name), None, None)
+        _txn.files[path] = pending
+    pending.stamp = ("txn", next(_versions))
+    return pending
+
+
+def _table_value(pending):
+    """Строки таблицы в транзакции: сохранённые и дописанные после них."""
+    if pending.value is None:
+        backend, path = _table_backend(pending.owner[1])
+        pending.base = _buffered(path, backend.load)
+        pending.value = list(pending.base)
+        pending.value.extend(pending.appended)
+    return pending.value
+
+
+def _staged_index(table_name, column, kind, value=None):
+    """
+    Индекс в открытой транзакции: value заменяет его содержимое. Вставки
+    только копят новые пары: сохранённый индекс копируется при первом
+    чтении или правке на месте.
+    """
+    path = _index_path(table_name, column)
+    pending = _txn.files.get(path)
+    if pending is None:
+        pending = _Pending((_OWNER_INDEX, table_name, column, kind), None, value)
+        _txn.files[path] = pending
+    elif value is not None:
+        pending.value = value
+    return pending
+
+
+def _index_value(pending, path):
+    """Индекс в транзакции: сохранённые пары и дописанные после них."""
+    if pending.value is None:
+        kind = pending.owner[3]
+        value = _INDEX_BUFFERS[kind](())
+        if os.path.exists(path):
+            value = _buffered(path, _INDEX_LOADERS[kind]).copy()
+        value.add(pending.appended)
+        pending.value = value
+    return pending.value
+
+
+def _row_changes(pending):
+    """
+    Строки таблицы, добавленные или изменённые в транзакции, и ID удалённых.
+
+    Строки сравниваются по значению: основа могла быть загружена заново
+    (таблица вне кэша), и тогда неизменённые строки — другие объекты.
+    """
+    if pending.appended is not None:
+        return pending.appended, []
+    before = {row[ID_COL_NAME]: row for row in pending.base}
+    put = []
+    for row in pending.value:
+        old = before.pop(row[ID_COL_NAME], None)
+        if old is not row and old != row:
+            put.append(row)
+    return put, list(before)
+
+
+def _apply_pending(pending):
+    kind, table_name = pending.owner[:2]
+    if kind == _OWNER_TABLE:
+        if pending.appended is None:
+            save_table_data(table_name, pending.value)
+        elif pending.appended:
+            append_table_rows(table_name, pending.appended)
+        return
+    column, index_kind = pending.owner[2:]
+    if pending.appended is None:
+        save_index_entries(table_name, column, pending.value, index_kind)
+    elif pending.appended:
+        append_index_entries(table_name, column, pending.appended, index_kind)
+
+
+@timed_phase(PHASE_SAVE)
+def _append_wal(record, sync=WAL_FSYNC):
+    BACKENDS[LogBackend.name].append(_wal_file, [record], sync=sync)
+
+
+def _fsync_path(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    except OSError as exc:
+        raise StorageError(f"Ошибка доступа к файлу: {path}: {exc}") from exc
+    try:
+        os.fsync(fd)
+    except OSError as exc:
+        raise StorageError(f"Ошибка сброса на диск: {path}: {exc}") from exc
+    finally:
+        os.close(fd)